@@ -0,0 +1,61 @@
+"""
+Benchmark: C++ pattern analysis (tokenizer + rule registry) on growing inputs.
+
+Concatenates the C++ sources under evaluation/ 1, 4, 16 and 64 times and times a cold
+analysis (no memoization) and a cached lookup of the same source. Cold time per KB should
+stay flat as the input grows, i.e. the analysis scales linearly.
+
+    python benchmarks/bench_cpp_patterns.py [--repeat 5] [--factors 1 4 16 64]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "docker", "translation_worker"))
+
+from profiles.cpp_patterns import _analyze, extract_cpp_features  # noqa: E402
+
+
+def load_corpus() -> str:
+    paths = sorted(glob.glob(os.path.join(ROOT, "evaluation", "**", "*.cpp"), recursive=True)
+                   + glob.glob(os.path.join(ROOT, "evaluation", "**", "*.h"), recursive=True))
+    if not paths:
+        raise SystemExit("No C++ sources found under evaluation/.")
+    parts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            parts.append(f.read())
+    return "\n".join(parts)
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"{'size (KB)':>9} | {'cold (ms)':>9} | {'ms / KB':>7} | {'cached (ms)':>11}")
+    print("-" * 46)
+    for factor in args.factors:
+        source = "\n".join([corpus] * factor)
+        size_kb = len(source.encode("utf-8")) / 1024
+        cold = statistics.median(timed(_analyze, source) for _ in range(args.repeat))
+        extract_cpp_features(source)
+        cached = statistics.median(timed(extract_cpp_features, source) for _ in range(args.repeat))
+        print(f"{size_kb:>9.0f} | {cold * 1000:>9.1f} | {cold * 1000 / size_kb:>7.3f} | {cached * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: per-file javac vs. one batched javac invocation.
+
+Generates synthetic classes (each in its own package, like the translation worker does),
+then compiles N of them once per file and once as a single batch, for N in 1, 8 and 32.
+
+    python benchmarks/bench_javac_batch.py [--repeat 3] [--sizes 1 8 32]
+
+Needs a JDK 17+ `javac` on PATH (e.g. run inside the translation_worker container).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker"))
+
+from translation_worker.javac_batch import compile_batch, run_javac  # noqa: E402
+
+CLASS_TEMPLATE = """package bench{index};
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Bench{index} {{
+    private final List<Double> values = new ArrayList<>();
+
+    public void add(double value) {{
+        values.add(value);
+    }}
+
+    public double mean() {{
+        return values.stream().mapToDouble(Double::doubleValue).average().orElse(0.0);
+    }}
+
+    public static void main(String[] args) {{
+        Bench{index} bench = new Bench{index}();
+        for (int i = 0; i < 100; i++) {{
+            bench.add(i * {index});
+        }}
+        System.out.println(bench.mean());
+    }}
+}}
+"""
+
+
+def write_sources(root: str, count: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = os.path.join(root, f"Bench{index}.java")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(CLASS_TEMPLATE.format(index=index))
+        paths.append(path)
+    return paths
+
+
+def time_per_file(paths: list[str], root: str) -> float:
+    started = time.perf_counter()
+    for path in paths:
+        rc, log = run_javac([path], os.path.join(root, "out_single"))
+        if rc != 0:
+            raise RuntimeError(log)
+    return time.perf_counter() - started
+
+
+def time_batch(paths: list[str], root: str) -> float:
+    started = time.perf_counter()
+    results = compile_batch(paths, root)
+    elapsed = time.perf_counter() - started
+    failed = [p for p, (ok, _) in results.items() if not ok]
+    if failed:
+        raise RuntimeError(f"Batch compile failed for {failed}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'files':>5} | {'per-file (s)':>12} | {'batch (s)':>9} | {'speed-up':>8}")
+    print("-" * 44)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as root:
+            paths = write_sources(root, size)
+            single = statistics.median(time_per_file(paths, root) for _ in range(args.repeat))
+            batch = statistics.median(time_batch(paths, root) for _ in range(args.repeat))
+        print(f"{size:>5} | {single:>12.2f} | {batch:>9.2f} | {single / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
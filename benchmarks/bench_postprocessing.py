@@ -0,0 +1,89 @@
+"""
+Benchmark: fence extraction and Java normalization on multi-megabyte LLM responses.
+
+Compares the shared single-pass extractor (common/postprocessing.py) with the regex it
+replaced, r"```(?:java)?\\s*(.*?)```" with re.DOTALL, on synthetic responses:
+
+  fenced       prose + one large ```java block
+  multi        many small fenced blocks
+  unterminated a large block whose closing fence is missing
+  padded       unterminated block starting with a long run of blank lines; the old
+               regex backtracks through the whitespace and scans the rest each time
+
+    python benchmarks/bench_postprocessing.py [--mb 4] [--padding 4000] [--repeat 3]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker"))
+
+from common.postprocessing import extract_code, normalize_java  # noqa: E402
+
+LEGACY_FENCE = re.compile(r"```(?:java)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+METHOD = """    public static double compute{index}(double value) {{
+        // Synthetic method {index}
+        return value * {index} + Math.sqrt(value);
+    }}
+"""
+
+
+def legacy_extract(text: str) -> str:
+    match = LEGACY_FENCE.search(text)
+    return match.group(1).strip() if match else text
+
+
+def java_source(size_bytes: int) -> str:
+    parts, size, index = ["package old.pkg;\n\nimport java.util.*;\n\npublic class Synthetic {\n"], 0, 0
+    while size < size_bytes:
+        method = METHOD.format(index=index)
+        parts.append(method)
+        size += len(method)
+        index += 1
+    parts.append("}\n")
+    return "".join(parts)
+
+
+def responses(size_bytes: int, padding: int) -> dict[str, str]:
+    code = java_source(size_bytes)
+    block = METHOD.format(index=0)
+    return {
+        "fenced": f"Here is the translation:\n\n```java\n{code}```\n\nThe class keeps all methods.",
+        "multi": "".join(f"Part {i}:\n```java\n{block}```\n" for i in range(size_bytes // (len(block) + 20))),
+        "unterminated": f"Here is the translation:\n\n```java\n{code}",
+        "padded": "```java" + "\n" * padding + java_source(size_bytes // 16),
+    }
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=4)
+    parser.add_argument("--padding", type=int, default=4000, help="blank lines in the padded case (legacy time grows with padding x size)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'case':>12} | {'size (MB)':>9} | {'legacy (ms)':>11} | {'extract (ms)':>12} | {'normalize (ms)':>14}")
+    print("-" * 72)
+    for name, text in responses(int(args.mb * 1024 * 1024), args.padding).items():
+        legacy = statistics.median(timed(legacy_extract, text) for _ in range(args.repeat))
+        extract = statistics.median(timed(extract_code, text) for _ in range(args.repeat))
+        code = extract_code(text)
+        normalize = statistics.median(
+            timed(normalize_java, code, "Synthetic", "Synthetic") for _ in range(args.repeat)
+        )
+        print(f"{name:>12} | {len(text) / 1024 / 1024:>9.2f} | {legacy * 1000:>11.1f} | {extract * 1000:>12.1f} | {normalize * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
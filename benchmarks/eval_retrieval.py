@@ -0,0 +1,185 @@
+"""
+Evaluation: attempts-to-compile and latency with and without few-shot retrieval.
+
+Translates every program of the evaluation corpus (evaluation/*/*.cpp, without tests) with
+the LLM and fixes it against javac, like the translation worker does, in two passes:
+
+  baseline   generic guidelines only
+  retrieval  plus the top-k most similar pairs from an example index (translation_worker/retrieval.py)
+
+The index is filled with the pairs that compiled in the baseline pass (and, with --index, an
+existing examples.sqlite, e.g. the worker's state). A file never sees its own pair
+(leave-one-out), so the retrieval pass measures transfer between programs, not recall.
+Prompts are condensed versions of the worker's.
+
+    python benchmarks/eval_retrieval.py --model qwen2.5-coder:7b [--ollama http://localhost:11434]
+        [--max-attempts 5] [--k 2] [--budget 3000] [--index state/examples.sqlite] [--report report.json]
+
+Needs a reachable Ollama and a JDK 17+ `javac` on PATH (e.g. run inside the translation_worker container).
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker"))
+
+from common.postprocessing import extract_code, normalize_java  # noqa: E402
+from translation_worker.retrieval import ExampleIndex, example_hash, few_shot_section  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaluation")
+
+
+def estimate_token_count(text: str) -> int:
+    return int(len(text.split()) * 2.8) # Same estimate as the worker
+
+
+def pascal_case(filename: str) -> str:
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return base[:1].upper() + base[1:]
+
+
+def corpus_files(root: str) -> list[str]:
+    return sorted(
+        path for path in glob.glob(os.path.join(root, "**", "*.cpp"), recursive=True)
+        if os.sep + "test" + os.sep not in path and not os.path.basename(path).startswith("test_")
+    )
+
+
+def initial_prompt(name: str, cpp_code: str, examples: str) -> str:
+    return (
+        f"Translate the following C++ source file into idiomatic, fully compilable Java 17 code.\n\n"
+        f"===== C++ SOURCE FILE =====\n{cpp_code}\n\n{examples}"
+        f"Translation Guidelines:\n"
+        f"- Translate all logic with strict one-to-one functional fidelity.\n"
+        f"- The main public class must be named exactly \"{name}\".\n"
+        f"- Output only the Java source code."
+    )
+
+
+def fix_prompt(name: str, java_code: str, errors: str) -> str:
+    return (
+        f"The following Java code, intended to be saved as \"{name}.java\", failed compilation.\n\n"
+        f"===== CURRENT JAVA CODE =====\n{java_code}\n\n"
+        f"===== CURRENT COMPILATION ERRORS =====\n{errors[:5000]}\n\n"
+        f"Correct the code to fix all compilation errors. Keep exactly one top-level public class named \"{name}\". "
+        f"Output only the corrected, complete Java source code."
+    )
+
+
+def generate(args, prompt: str) -> str:
+    response = requests.post(f"{args.ollama}/api/generate", json={
+        "model": args.model, "prompt": prompt, "stream": False,
+        "options": {"temperature": 0.0, "num_ctx": 16384},
+    }, timeout=1000)
+    response.raise_for_status()
+    return response.json().get("response", "")
+
+
+def compile_java(work_dir: str, name: str, code: str) -> tuple[bool, str]:
+    path = os.path.join(work_dir, f"{name}.java")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(code)
+    result = subprocess.run(["javac", "-d", os.path.join(work_dir, "classes"), path],
+                            capture_output=True, text=True, timeout=120)
+    return result.returncode == 0, result.stderr
+
+
+def translate(args, path: str, index: ExampleIndex = None) -> dict:
+    """One file through generate → compile → fix. Returns attempts, latency and the final code."""
+    name = pascal_case(path)
+    with open(path, "r", encoding="utf-8") as f:
+        cpp_code = f.read()
+    examples = []
+    if index is not None:
+        examples = index.select(cpp_code, args.k, args.budget, estimate_token_count,
+                                exclude=frozenset([example_hash(cpp_code)]))
+    started = time.perf_counter()
+    prompt = initial_prompt(name, cpp_code, few_shot_section(examples) + ("\n\n" if examples else ""))
+    code, compiled, attempts = "", False, 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        while attempts < args.max_attempts:
+            answer = extract_code(generate(args, prompt))
+            code = normalize_java(answer, package="", class_name=name) if answer else code
+            attempts += 1
+            compiled, errors = compile_java(work_dir, name, code)
+            if compiled:
+                break
+            prompt = fix_prompt(name, code, errors)
+    return {
+        "file": os.path.relpath(path, args.corpus), "name": name, "cpp_code": cpp_code, "java_code": code,
+        "compiled": compiled, "attempts": attempts, "latency": time.perf_counter() - started,
+        "examples": [example.name for example in examples],
+    }
+
+
+def summary(results: list[dict]) -> dict:
+    compiled = [r for r in results if r["compiled"]]
+    return {
+        "compiled": f"{len(compiled)}/{len(results)}",
+        "mean_attempts": statistics.mean(r["attempts"] for r in results) if results else 0.0,
+        "median_latency": statistics.median(r["latency"] for r in results) if results else 0.0,
+        "total_latency": sum(r["latency"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--ollama", default="http://localhost:11434")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--k", type=int, default=2, help="examples per prompt")
+    parser.add_argument("--budget", type=int, default=3000, help="estimated tokens for examples")
+    parser.add_argument("--index", help="existing examples.sqlite to start from (copied, not modified)")
+    parser.add_argument("--report", help="write per-file results as JSON")
+    args = parser.parse_args()
+    if shutil.which("javac") is None:
+        sys.exit("javac not found on PATH")
+
+    files = corpus_files(args.corpus)
+    with tempfile.TemporaryDirectory() as state_dir:
+        index_path = os.path.join(state_dir, "examples.sqlite")
+        if args.index:
+            shutil.copy(args.index, index_path)
+        index = ExampleIndex(index_path)
+
+        passes = {"baseline": [], "retrieval": []}
+        for path in files:
+            result = translate(args, path)
+            passes["baseline"].append(result)
+            if result["compiled"]:
+                index.add(result["name"], result["cpp_code"], result["java_code"], result["attempts"])
+            print(f"baseline  {result['file']:<60} attempts={result['attempts']} compiled={result['compiled']} {result['latency']:.1f}s")
+        print(f"Example index: {len(index)} pair(s)")
+        for path in files:
+            result = translate(args, path, index)
+            passes["retrieval"].append(result)
+            print(f"retrieval {result['file']:<60} attempts={result['attempts']} compiled={result['compiled']} "
+                  f"{result['latency']:.1f}s examples={', '.join(result['examples']) or '-'}")
+
+    print()
+    print(f"{'pass':>10} | {'compiled':>8} | {'mean attempts':>13} | {'median latency (s)':>18} | {'total latency (s)':>17}")
+    print("-" * 79)
+    for name, results in passes.items():
+        s = summary(results)
+        print(f"{name:>10} | {s['compiled']:>8} | {s['mean_attempts']:>13.2f} | {s['median_latency']:>18.1f} | {s['total_latency']:>17.1f}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({name: {"summary": summary(results),
+                              "files": [{k: v for k, v in r.items() if k not in ("cpp_code", "java_code")} for r in results]}
+                       for name, results in passes.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
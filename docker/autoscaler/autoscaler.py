@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import logging
+import http.client
+import socket
+import urllib.parse
+
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import requests
+
+from common.readiness import configured_models
+from common.scaling import publish_scaling
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+# --- Configuration ---
+RABBITMQ_API = os.getenv("RABBITMQ_API", "http://rabbitmq:15672/api")
+RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
+RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
+QUEUE = os.getenv("AUTOSCALER_QUEUE", "translation_queue")           # Queue whose depth drives scaling
+WORKER_SERVICE = os.getenv("WORKER_SERVICE", "translation_worker")   # docker-compose service to scale
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
+MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", ",".join(configured_models())).split(",") if m.strip()]
+
+MIN_REPLICAS = max(1, int(os.getenv("MIN_REPLICAS", 1)))
+MAX_REPLICAS = int(os.getenv("MAX_REPLICAS", 2))
+MIN_LLM_SLOTS = int(os.getenv("MIN_LLM_SLOTS", 1))                   # Per-worker concurrent LLM requests; prefetch follows
+MAX_LLM_SLOTS = int(os.getenv("MAX_LLM_SLOTS", 4))                   # Keep OLLAMA_NUM_PARALLEL >= this, or Ollama queues the extra requests
+START_LLM_SLOTS = int(os.getenv("LLM_WORKERS", 1))                   # What the workers start with
+SCALE_UP_BACKLOG = float(os.getenv("SCALE_UP_BACKLOG", 2))          # Waiting jobs per busy slot that count as pressure
+SATURATED_UTILISATION = float(os.getenv("SATURATED_UTILISATION", 0.5)) # Consumer utilisation below this: consumers cannot keep up
+SCALE_UP_AFTER = float(os.getenv("SCALE_UP_AFTER_SECONDS", 60))     # Pressure must last this long before adding capacity
+SCALE_DOWN_AFTER = float(os.getenv("SCALE_DOWN_AFTER_SECONDS", 600)) # Spare capacity must last this long before removing it
+COOLDOWN = float(os.getenv("SCALE_COOLDOWN_SECONDS", 120))          # Minimum time between two scaling steps
+IDLE_UNLOAD_AFTER = float(os.getenv("IDLE_UNLOAD_AFTER_SECONDS", 1800)) # Empty queue this long: unload the models, 0 disables
+POLL_INTERVAL = float(os.getenv("AUTOSCALER_POLL_SECONDS", 15))
+STOP_TIMEOUT = int(os.getenv("WORKER_STOP_TIMEOUT", 60))             # Seconds a removed replica gets to exit; unfinished jobs are redelivered
+DRY_RUN = os.getenv("AUTOSCALER_DRY_RUN", "false").lower() == "true" # Log decisions without touching containers or models
+
+MANAGED_LABEL = "autoscaler.managed" # Replicas started by the autoscaler; the compose-created one is never removed
+
+
+# --- Queue metrics ---
+@dataclass(frozen=True)
+class QueueSample:
+    ready: int                       # Waiting for a consumer
+    unacked: int                     # Delivered, being processed
+    consumers: int
+    utilisation: Optional[float]     # Fraction of time consumers could take new messages, None when unknown
+    publish_rate: float
+    ack_rate: float
+
+
+def sample_queue(queue: str = QUEUE) -> QueueSample:
+    """Reads depth and consumer utilisation of a queue from the RabbitMQ management API."""
+    response = requests.get(
+        f"{RABBITMQ_API}/queues/{urllib.parse.quote('/', safe='')}/{urllib.parse.quote(queue, safe='')}",
+        auth=(RABBITMQ_USER, RABBITMQ_PASSWORD), timeout=10,
+    )
+    response.raise_for_status()
+    data = response.json()
+    stats = data.get("message_stats") or {}
+    return QueueSample(
+        ready=int(data.get("messages_ready", 0)),
+        unacked=int(data.get("messages_unacknowledged", 0)),
+        consumers=int(data.get("consumers", 0)),
+        utilisation=data.get("consumer_utilisation"),
+        publish_rate=float((stats.get("publish_details") or {}).get("rate", 0.0)),
+        ack_rate=float((stats.get("ack_details") or {}).get("rate", 0.0)),
+    )
+
+
+# --- Scaling policy ---
+@dataclass(frozen=True)
+class Capacity:
+    replicas: int
+    llm_slots: int                   # Concurrent LLM requests of each replica
+
+    @property
+    def slots(self) -> int:
+        return self.replicas * self.llm_slots
+
+
+class ScalingPolicy:
+    """
+    Decides capacity from queue samples, with hysteresis.
+
+    Pressure (a backlog of SCALE_UP_BACKLOG jobs per slot while all slots are busy or the
+    consumers' utilisation is low) must hold for SCALE_UP_AFTER, spare capacity (empty queue,
+    at least one replica's worth of idle slots) for SCALE_DOWN_AFTER, and two steps are at
+    least COOLDOWN apart. Scaling up first raises the per-worker LLM slots (cheap, uses GPU
+    headroom left by OLLAMA_NUM_PARALLEL), then adds replicas; scaling down removes replicas first.
+    """
+
+    def __init__(self, min_replicas=MIN_REPLICAS, max_replicas=MAX_REPLICAS, min_llm_slots=MIN_LLM_SLOTS,
+                 max_llm_slots=MAX_LLM_SLOTS, backlog=SCALE_UP_BACKLOG, saturated_utilisation=SATURATED_UTILISATION,
+                 up_after=SCALE_UP_AFTER, down_after=SCALE_DOWN_AFTER, cooldown=COOLDOWN, idle_unload_after=IDLE_UNLOAD_AFTER):
+        self.min_replicas, self.max_replicas = min_replicas, max(min_replicas, max_replicas)
+        self.min_llm_slots, self.max_llm_slots = min_llm_slots, max(min_llm_slots, max_llm_slots)
+        self.backlog = backlog
+        self.saturated_utilisation = saturated_utilisation
+        self.up_after, self.down_after, self.cooldown = up_after, down_after, cooldown
+        self.idle_unload_after = idle_unload_after
+        self._pressure_since = None
+        self._spare_since = None
+        self._idle_since = None
+        self._last_step = float("-inf")
+
+    def pressure(self, sample: QueueSample, capacity: Capacity) -> bool:
+        busy = sample.unacked >= capacity.slots or (
+            sample.utilisation is not None and sample.consumers > 0 and sample.utilisation < self.saturated_utilisation
+        )
+        return busy and sample.ready >= self.backlog * capacity.slots
+
+    def spare(self, sample: QueueSample, capacity: Capacity) -> bool:
+        return sample.ready == 0 and sample.unacked <= capacity.slots - capacity.llm_slots
+
+    def decide(self, sample: QueueSample, capacity: Capacity, now: float) -> Capacity:
+        pressure, spare = self.pressure(sample, capacity), self.spare(sample, capacity)
+        self._pressure_since = _since(self._pressure_since, now) if pressure else None
+        self._spare_since = _since(self._spare_since, now) if spare else None
+        self._idle_since = _since(self._idle_since, now) if sample.ready == 0 and sample.unacked == 0 else None
+        if now - self._last_step < self.cooldown:
+            return capacity
+
+        target = capacity
+        if pressure and now - self._pressure_since >= self.up_after:
+            if capacity.llm_slots < self.max_llm_slots:
+                target = replace(capacity, llm_slots=capacity.llm_slots + 1)
+            elif capacity.replicas < self.max_replicas:
+                target = replace(capacity, replicas=capacity.replicas + 1)
+        elif spare and now - self._spare_since >= self.down_after:
+            if capacity.replicas > self.min_replicas:
+                target = replace(capacity, replicas=capacity.replicas - 1)
+            elif capacity.llm_slots > self.min_llm_slots:
+                target = replace(capacity, llm_slots=capacity.llm_slots - 1)
+        if target != capacity:
+            self._last_step = now
+            self._pressure_since = self._spare_since = None # The condition has to build up again at the new capacity
+        return target
+
+    def idle_for(self, now: float) -> float:
+        return now - self._idle_since if self._idle_since is not None else 0.0
+
+    def unload_due(self, now: float) -> bool:
+        return self.idle_unload_after > 0 and self.idle_for(now) >= self.idle_unload_after
+
+
+def _since(started: Optional[float], now: float) -> float:
+    return started if started is not None else now
+
+
+# --- Docker Engine API (unix socket, no client library needed) ---
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class DockerScaler:
+    """
+    Scales a docker-compose service by cloning its first container through the Engine API.
+
+    Clones keep the compose project labels (so `docker compose down` removes them) and carry
+    MANAGED_LABEL; only those are ever stopped. A stopped replica's unfinished jobs are
+    redelivered by RabbitMQ and resume from their checkpoints on another replica.
+    """
+
+    def __init__(self, service: str = WORKER_SERVICE, socket_path: str = DOCKER_SOCKET):
+        self.service = service
+        self.socket_path = socket_path
+
+    def _request(self, method: str, path: str, body=None, timeout: float = 30):
+        connection = _UnixConnection(self.socket_path, timeout)
+        try:
+            payload = json.dumps(body) if body is not None else None
+            connection.request(method, f"/v1.41{path}", body=payload,
+                               headers={"Content-Type": "application/json"} if payload else {})
+            response = connection.getresponse()
+            data = response.read()
+            if response.status >= 400:
+                raise RuntimeError(f"Docker API {method} {path}: HTTP {response.status} {data[:300]!r}")
+            return json.loads(data) if data else None
+        finally:
+            connection.close()
+
+    def containers(self) -> list:
+        filters = json.dumps({"label": [f"com.docker.compose.service={self.service}"], "status": ["running"]})
+        return self._request("GET", f"/containers/json?filters={urllib.parse.quote(filters)}")
+
+    def replicas(self) -> int:
+        return len(self.containers())
+
+    def scale_to(self, replicas: int):
+        running = sorted(self.containers(), key=lambda c: c.get("Created", 0))
+        if not running:
+            raise RuntimeError(f"No running container of service '{self.service}' to clone.")
+        for _ in range(replicas - len(running)):
+            self._start_clone(running[0]["Id"], len(running) + 1)
+            running.append(None)
+        managed = [c for c in running if c and c.get("Labels", {}).get(MANAGED_LABEL) == "true"]
+        surplus = min(len(managed), max(0, len(running) - replicas))
+        for container in reversed(managed[len(managed) - surplus:]): # Newest first
+            logging.info(f"⬇️ Stopping replica {container['Names'][0]} (up to {STOP_TIMEOUT}s for running jobs)...")
+            self._request("POST", f"/containers/{container['Id']}/stop?t={STOP_TIMEOUT}", timeout=STOP_TIMEOUT + 30)
+            self._request("DELETE", f"/containers/{container['Id']}")
+
+    def _start_clone(self, template_id: str, number: int):
+        template = self._request("GET", f"/containers/{template_id}/json")
+        config = dict(template["Config"])
+        config.pop("Hostname", None) # Otherwise every replica shares the template's hostname (and temp dir)
+        labels = dict(config.get("Labels") or {})
+        labels.update({"com.docker.compose.container-number": str(number), MANAGED_LABEL: "true"})
+        config["Labels"] = labels
+        host_config = dict(template["HostConfig"])
+        host_config["PortBindings"] = {} # Published ports cannot be shared
+        networks = template["NetworkSettings"]["Networks"]
+        config["HostConfig"] = host_config
+        config["NetworkingConfig"] = {"EndpointsConfig": {
+            name: {"Aliases": [self.service]} for name in networks
+        }}
+        project = labels.get("com.docker.compose.project", "app")
+        name = f"{project}-{self.service}-auto-{number}-{int(time.time())}"
+        created = self._request("POST", f"/containers/create?name={name}", config)
+        self._request("POST", f"/containers/{created['Id']}/start")
+        logging.info(f"⬆️ Started replica {name}.")
+
+
+# --- Model residency ---
+def unload_models():
+    for model in MODELS:
+        try:
+            response = requests.post(f"{OLLAMA_URL}/api/generate", json={"model": model, "keep_alive": 0}, timeout=30)
+            response.raise_for_status()
+            logging.info(f"🧹 Unloaded model {model}.")
+        except requests.RequestException as e:
+            logging.warning(f"⚠️ Could not unload model {model}: {e}")
+
+
+def load_models():
+    """Loads the models again before work resumes, so the first job does not pay for it."""
+    for model in MODELS:
+        try:
+            response = requests.post(f"{OLLAMA_URL}/api/generate", json={"model": model, "keep_alive": -1}, timeout=600)
+            response.raise_for_status()
+            logging.info(f"🔥 Reloaded model {model}.")
+        except requests.RequestException as e:
+            logging.warning(f"⚠️ Could not reload model {model}: {e}")
+
+
+def run():
+    """Control loop: sample the queue, decide, apply, publish the per-worker settings."""
+    policy = ScalingPolicy()
+    scaler = DockerScaler()
+    capacity = Capacity(replicas=MIN_REPLICAS if DRY_RUN else max(1, scaler.replicas()),
+                        llm_slots=min(max(START_LLM_SLOTS, MIN_LLM_SLOTS), MAX_LLM_SLOTS))
+    models_loaded = True
+    logging.info(f"Autoscaler watching '{QUEUE}': replicas {MIN_REPLICAS}-{MAX_REPLICAS}, "
+                 f"LLM slots per worker {MIN_LLM_SLOTS}-{MAX_LLM_SLOTS}{' (dry run)' if DRY_RUN else ''}.")
+    publish_scaling(capacity.llm_slots, allow_unload=capacity.replicas == 1, replicas=capacity.replicas)
+
+    while True:
+        try:
+            sample = sample_queue()
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Could not read queue metrics: {e}")
+            time.sleep(POLL_INTERVAL)
+            continue
+        now = time.monotonic()
+        utilisation = f"{sample.utilisation:.2f}" if sample.utilisation is not None else "n/a"
+        logging.info(f"Queue '{QUEUE}': {sample.ready} ready, {sample.unacked} unacked, {sample.consumers} consumer(s), "
+                     f"utilisation {utilisation}, in {sample.publish_rate:.2f}/s, out {sample.ack_rate:.2f}/s "
+                     f"| {capacity.replicas} replica(s) x {capacity.llm_slots} LLM slot(s)")
+
+        if not models_loaded and (sample.ready or sample.unacked):
+            if not DRY_RUN:
+                load_models()
+            models_loaded = True
+        elif models_loaded and policy.unload_due(now):
+            logging.info(f"Queue idle for {policy.idle_for(now):.0f}s. Unloading models.")
+            if not DRY_RUN:
+                unload_models()
+            models_loaded = False
+
+        target = policy.decide(sample, capacity, now)
+        if target != capacity:
+            logging.info(f"📈 Scaling {capacity.replicas}x{capacity.llm_slots} → {target.replicas}x{target.llm_slots}")
+            try:
+                if not DRY_RUN:
+                    if target.replicas > capacity.replicas and not models_loaded:
+                        load_models()
+                        models_loaded = True
+                    if target.replicas != capacity.replicas:
+                        scaler.scale_to(target.replicas)
+                capacity = target
+                # Several replicas must not unload a model under each other's feet; the autoscaler does it when idle
+                publish_scaling(capacity.llm_slots, allow_unload=capacity.replicas == 1, replicas=capacity.replicas)
+            except Exception as e:
+                logging.error(f"Scaling to {target.replicas}x{target.llm_slots} failed: {e}")
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    run()
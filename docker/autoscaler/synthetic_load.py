@@ -0,0 +1,101 @@
+"""
+Synthetic load for trying the autoscaler against a local RabbitMQ.
+
+Publishes dummy jobs to a scratch queue in bursts and consumes them with simulated workers
+(LLM slots, prefetch and a fixed service time per job), so queue depth and consumer utilisation
+behave like the real pipeline without an LLM. Point the autoscaler at the same queue in dry-run mode:
+
+    docker compose up -d rabbitmq
+    AUTOSCALER_QUEUE=autoscaler_test AUTOSCALER_DRY_RUN=true RABBITMQ_API=http://localhost:15672/api \
+        SCALING_FILE=/tmp/scaling.json SCALE_UP_AFTER_SECONDS=20 SCALE_DOWN_AFTER_SECONDS=60 \
+        AUTOSCALER_POLL_SECONDS=5 PYTHONPATH=.. python autoscaler.py
+    SCALING_FILE=/tmp/scaling.json python synthetic_load.py --host localhost --burst 200 --every 300 --workers 2 --follow-scaling
+
+With --follow-scaling the simulated workers apply the LLM slots the autoscaler publishes, and
+their prefetch with it, as the translation worker does.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import pika
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.scaling import read_scaling  # noqa: E402
+
+
+def publisher(args):
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.host))
+    channel = connection.channel()
+    channel.queue_declare(queue=args.queue, durable=False, auto_delete=False)
+    sent = 0
+    while True:
+        for _ in range(args.burst):
+            channel.basic_publish(exchange="", routing_key=args.queue,
+                                  body=json.dumps({"file_id": f"synthetic-{sent}", "cpp_filename": "synthetic.cpp"}))
+            sent += 1
+        print(f"published burst of {args.burst} (total {sent})", flush=True)
+        if args.every <= 0:
+            break
+        connection.sleep(args.every)
+    connection.close()
+
+
+def worker(args, index: int):
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.host, heartbeat=600))
+    channel = connection.channel()
+    channel.queue_declare(queue=args.queue, durable=False, auto_delete=False)
+    slots = args.llm_slots
+    # Channel-wide, like the worker: a per-consumer limit would not reach the running consumer
+    channel.basic_qos(prefetch_count=slots * args.jobs_per_slot, global_qos=True)
+    waiting, in_progress = [], []
+
+    def on_message(ch, method, properties, body):
+        waiting.append(method.delivery_tag)
+
+    channel.basic_consume(queue=args.queue, on_message_callback=on_message)
+    while True:
+        connection.process_data_events(time_limit=0.2)
+        now = time.monotonic()
+        # Jobs of one worker finish independently, like the pipeline's stage threads
+        for entry in [e for e in in_progress if e[0] <= now]:
+            channel.basic_ack(delivery_tag=entry[1])
+            in_progress.remove(entry)
+        # Only as many jobs as LLM slots are processed at once, the rest waits in the prefetch
+        while waiting and len(in_progress) < slots:
+            in_progress.append((now + args.service_seconds, waiting.pop(0)))
+        if args.follow_scaling:
+            wanted = int(read_scaling().get("llm_slots", slots))
+            if wanted > 0 and wanted != slots:
+                slots = wanted
+                channel.basic_qos(prefetch_count=slots * args.jobs_per_slot, global_qos=True)
+                print(f"worker {index}: LLM slots → {slots}, prefetch → {slots * args.jobs_per_slot}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="rabbitmq")
+    parser.add_argument("--queue", default="autoscaler_test")
+    parser.add_argument("--burst", type=int, default=100, help="jobs per burst")
+    parser.add_argument("--every", type=float, default=0, help="seconds between bursts, 0 publishes one burst")
+    parser.add_argument("--workers", type=int, default=1, help="simulated worker replicas")
+    parser.add_argument("--llm-slots", type=int, default=1, help="jobs a worker processes at once")
+    parser.add_argument("--jobs-per-slot", type=int, default=2, help="prefetch per LLM slot")
+    parser.add_argument("--service-seconds", type=float, default=2.0, help="processing time per job")
+    parser.add_argument("--follow-scaling", action="store_true", help="apply llm_slots from the scaling file")
+    args = parser.parse_args()
+
+    for index in range(args.workers):
+        threading.Thread(target=worker, args=(args, index), daemon=True).start()
+    publisher(args)
+    while True:
+        time.sleep(60)
+
+
+if __name__ == "__main__":
+    main()
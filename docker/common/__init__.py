@@ -0,0 +1,2 @@
+# common/__init__.py
+# Code shared by several service containers (copied into each image).
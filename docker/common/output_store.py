@@ -0,0 +1,244 @@
+##################################################################
+### Output store: atomic, versioned translation results + index ###
+##################################################################
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+INDEX_DIR = ".index"       # Below the output root, hidden from the per-class folders
+VERSIONS_DIR = "versions"  # Below each class folder: <source hash>-<file_id>/ per job
+
+
+def atomic_write(path: str, data: bytes):
+    """Writes to a temp file in the target directory, then renames it over `path`.
+    Readers see the old or the new file, never a partial one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class ResultRecord:
+    """Index entry of one finished job."""
+    file_id: str
+    name: str                   # PascalCase class name, also the output folder
+    source_hash: str            # SHA-256 of the C++ source
+    status: str                 # "success", "failed" or "error"
+    attempts: int = 0
+    model: str = ""
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    error: Optional[str] = None
+    version_dir: str = ""       # Relative to the output root
+    artifacts: dict = field(default_factory=dict) # {filename: {"sha256": ..., "size": ...}}
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.finished_at - self.started_at)
+
+    @property
+    def etag(self) -> str:
+        """Changes whenever the record or any of its artifacts changes."""
+        digest = hashlib.sha256(json.dumps(asdict(self), sort_keys=True).encode("utf-8")).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "duration": round(self.duration, 3)}
+
+
+_COLUMNS = ("file_id", "name", "source_hash", "status", "attempts", "model",
+            "started_at", "finished_at", "error", "version_dir", "artifacts")
+
+
+def _record(row) -> ResultRecord:
+    values = dict(zip(_COLUMNS, row))
+    values["artifacts"] = json.loads(values["artifacts"] or "{}")
+    return ResultRecord(**values)
+
+
+class OutputStore:
+    """
+    Translation results below `root`, indexed in SQLite (`<root>/.index/results.sqlite`).
+
+    Every job writes its artifacts into its own version folder,
+    `<root>/<Name>/versions/<source hash>-<file_id>/`, so concurrent jobs for the same
+    file never touch each other's files. The newest finished job of a name is then
+    published to `<root>/<Name>/` (the files users look at): each file is replaced
+    atomically and files of the previous version that the new one does not have (e.g.
+    `<Name>_failed.java` after a success) are removed. Publishing runs inside a SQLite
+    write transaction, which serializes it across threads and processes; an older job
+    that finishes late is indexed but never overwrites a newer result.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, INDEX_DIR), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, INDEX_DIR, "results.sqlite"),
+                                   check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " file_id TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " source_hash TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " model TEXT,"
+            " started_at REAL NOT NULL,"
+            " finished_at REAL NOT NULL,"
+            " error TEXT,"
+            " version_dir TEXT NOT NULL,"
+            " artifacts TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS results_finished ON results (finished_at DESC);"
+            "CREATE INDEX IF NOT EXISTS results_name ON results (name, finished_at DESC);"
+            "CREATE INDEX IF NOT EXISTS results_status ON results (status, finished_at DESC);"
+            "CREATE INDEX IF NOT EXISTS results_source ON results (source_hash);"
+            "CREATE TABLE IF NOT EXISTS published ("
+            " name TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " finished_at REAL NOT NULL);"
+        )
+
+    # --- Writing ---
+    def save(self, record: ResultRecord, artifacts: dict) -> bool:
+        """
+        Writes `artifacts` ({filename: str | bytes}) into the record's version folder, indexes
+        the record and publishes it as the current result of its name if it is the newest.
+        Returns True if it was published. Saving the same file_id again (a redelivered job)
+        replaces its version.
+        """
+        record.version_dir = os.path.join(record.name, VERSIONS_DIR, f"{record.source_hash[:12]}-{record.file_id}")
+        record.artifacts = {}
+        for filename, data in artifacts.items():
+            data = data.encode("utf-8") if isinstance(data, str) else data
+            atomic_write(os.path.join(self.root, record.version_dir, filename), data)
+            record.artifacts[filename] = {"sha256": content_hash(data), "size": len(data)}
+
+        values = asdict(record)
+        values["artifacts"] = json.dumps(record.artifacts, sort_keys=True)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE") # Holds the write lock while the current files are replaced
+            try:
+                published = self._db.execute(
+                    "SELECT file_id, finished_at FROM published WHERE name = ?", (record.name,)
+                ).fetchone()
+                previous = self._get(published[0]) if published else None
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO results ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    tuple(values[c] for c in _COLUMNS),
+                )
+                newest = published is None or published[0] == record.file_id or record.finished_at >= published[1]
+                if newest:
+                    self._publish(record, previous)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO published (name, file_id, finished_at) VALUES (?, ?, ?)",
+                        (record.name, record.file_id, record.finished_at),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return newest
+
+    def _publish(self, record: ResultRecord, previous: Optional[ResultRecord]):
+        folder = os.path.join(self.root, record.name)
+        for filename in record.artifacts:
+            with open(os.path.join(self.root, record.version_dir, filename), "rb") as f:
+                atomic_write(os.path.join(folder, filename), f.read())
+        for filename in (previous.artifacts if previous else {}):
+            if filename not in record.artifacts:
+                try:
+                    os.remove(os.path.join(folder, filename))
+                except FileNotFoundError:
+                    pass
+
+    # --- Reading ---
+    def _get(self, file_id: str) -> Optional[ResultRecord]:
+        row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM results WHERE file_id = ?", (file_id,)).fetchone()
+        return _record(row) if row else None
+
+    def get(self, file_id: str) -> Optional[ResultRecord]:
+        with self._lock:
+            return self._get(file_id)
+
+    def current(self, name: str) -> Optional[ResultRecord]:
+        """The published result of a class name."""
+        with self._lock:
+            row = self._db.execute("SELECT file_id FROM published WHERE name = ?", (name,)).fetchone()
+            return self._get(row[0]) if row else None
+
+    def list(self, name: Optional[str] = None, status: Optional[str] = None,
+             since: Optional[float] = None, limit: int = 100, offset: int = 0) -> list:
+        """Newest first; every filter is served by an index."""
+        clauses, params = [], []
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("finished_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM results {where} ORDER BY finished_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [_record(row) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        with self._lock:
+            if status:
+                return self._db.execute("SELECT COUNT(*) FROM results WHERE status = ?", (status,)).fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def artifact_path(self, record: ResultRecord, filename: str) -> Optional[str]:
+        """Path of an artifact inside the record's (immutable) version folder."""
+        if filename not in record.artifacts:
+            return None
+        return os.path.join(self.root, record.version_dir, filename)
+
+    def prune(self, keep_per_name: int) -> int:
+        """Drops index entries and version folders beyond the newest `keep_per_name` per name.
+        Published versions are always kept."""
+        removed = 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT file_id, version_dir FROM ("
+                " SELECT file_id, version_dir, ROW_NUMBER() OVER (PARTITION BY name ORDER BY finished_at DESC) AS rank"
+                " FROM results) WHERE rank > ? AND file_id NOT IN (SELECT file_id FROM published)",
+                (keep_per_name,),
+            ).fetchall()
+            for file_id, version_dir in rows:
+                self._db.execute("DELETE FROM results WHERE file_id = ?", (file_id,))
+                shutil.rmtree(os.path.join(self.root, version_dir), ignore_errors=True)
+                removed += 1
+        return removed
+
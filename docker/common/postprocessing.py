@@ -0,0 +1,153 @@
+############################################################
+### Post-processing of LLM responses (shared by workers) ###
+############################################################
+
+import re
+
+FENCES = ("```", "~~~")
+PACKAGE_LINE = re.compile(r"^\s*package\s+([\w.]+)\s*;")
+PUBLIC_CLASS = re.compile(r"\bpublic\s+(?:final\s+|abstract\s+)?class\s+\w+\b")
+# Words that are a language tag when code follows on the opening fence line (```java public class ...)
+INLINE_TAGS = {"java", "cpp", "c++", "c", "python", "bash", "sh", "shell", "json", "xml", "text", "kotlin"}
+
+
+def _fence_of(line: str):
+    """Returns the fence marker a line opens or closes with, or None."""
+    stripped = line.lstrip()
+    for fence in FENCES:
+        if stripped.startswith(fence):
+            return fence
+    return None
+
+
+def _opening_fence(line: str):
+    """
+    Returns (fence, rest of the line after it) for a line that opens a block, or (None, "").
+    The fence may follow text on the same line ("Here it is: ```java"), unless it closes
+    there again (inline ```code```).
+    """
+    fence = _fence_of(line)
+    if fence:
+        return fence, line.lstrip()[len(fence):]
+    for fence in FENCES:
+        start = line.find(fence)
+        if start > 0 and fence not in line[start + len(fence):].lstrip(fence[0]):
+            return fence, line[start + len(fence):]
+    return None, ""
+
+
+def code_blocks(text: str) -> list[tuple[str, str]]:
+    """
+    Splits a response into fenced code blocks in one pass over its lines and returns
+    [(language tag, code)]. An unterminated last fence runs to the end of the text;
+    code written on the opening fence line (```java public class ...) is kept.
+    """
+    blocks = []
+    open_fence, tag, lines = None, "", []
+    for line in text.splitlines():
+        if open_fence is None:
+            fence, rest = _opening_fence(line)
+            if fence:
+                words = rest.lstrip("`~").strip().split(None, 1)
+                tag, inline = "", ""
+                if len(words) == 1:
+                    tag = words[0].lower()
+                elif words:
+                    # Anything but a known tag on the opening line is already code
+                    if words[0].lower() in INLINE_TAGS:
+                        tag, inline = words[0].lower(), words[1]
+                    else:
+                        inline = " ".join(words)
+                open_fence, lines = fence, [inline] if inline else []
+        elif _fence_of(line) == open_fence and not line.strip()[len(open_fence):].strip("`~").strip():
+            blocks.append((tag, "\n".join(lines).strip()))
+            open_fence = None
+        else:
+            lines.append(line)
+    if open_fence is not None:
+        blocks.append((tag, "\n".join(lines).strip()))
+    return blocks
+
+
+def extract_code(text: str, language: str = "java") -> str:
+    """
+    Returns the code from an LLM response: the longest block tagged `language`, else the
+    longest untagged block, else the longest block of any language. Empty blocks do not
+    count; responses without a non-empty block are returned stripped, minus stray fence lines.
+    """
+    blocks = [(tag, code) for tag, code in code_blocks(text) if code]
+    if not blocks:
+        return "\n".join(line for line in text.splitlines() if not _fence_of(line)).strip()
+    for wanted in (language, ""):
+        candidates = [code for tag, code in blocks if tag == wanted]
+        if candidates:
+            return max(candidates, key=len)
+    return max((code for _, code in blocks), key=len)
+
+
+def package_of(code: str):
+    """Returns the package declared in Java source, or None."""
+    for line in code.splitlines():
+        match = PACKAGE_LINE.match(line)
+        if match:
+            return match.group(1)
+    return None
+
+
+def leading_comment(line: str, in_comment: bool):
+    """Splits a line into its leading comments and the code after them. Returns (comments, code, in_comment)."""
+    pos = 0
+    while True:
+        if in_comment:
+            close = line.find("*/", pos)
+            if close < 0:
+                return line, "", True
+            pos, in_comment = close + 2, False
+        rest = line[pos:].lstrip()
+        if rest.startswith("//"):
+            return line, "", False
+        if not rest.startswith("/*"):
+            break
+        pos, in_comment = len(line) - len(rest) + 2, True
+    return line[:pos], line[pos:], False
+
+
+def normalize_java(code: str, package: str = None, class_name: str = None) -> str:
+    """
+    Rewrites Java source in one pass over its lines: removes existing package declarations,
+    inserts `package <package>;` before the first line of code (after leading comments and
+    blank lines) and renames the first public class to `class_name`. Either step is skipped
+    when its argument is None; package="" only removes existing declarations.
+    Code that follows a closed comment on the same line ("/* x */ public class A") counts as code.
+    """
+    out = []
+    in_comment = False
+    package_done = not package
+    class_done = class_name is None
+    for line in code.splitlines():
+        if in_comment or "/" in line:
+            comments, rest, in_comment = leading_comment(line, in_comment)
+        else:
+            comments, rest = "", line # Most lines, no comment to split off
+        if not rest.strip():
+            out.append(line)
+            continue
+        if package is not None and PACKAGE_LINE.match(rest):
+            if comments.strip():
+                out.append(comments.rstrip())
+            continue
+        if not package_done:
+            # Leading blank lines and comments stay above the declaration, also a comment that ends on this line
+            if comments.strip():
+                out.append(comments.rstrip())
+                comments, rest = "", rest.lstrip()
+            out.append(f"package {package};")
+            out.append("")
+            package_done = True
+        if not class_done:
+            rest, renamed = PUBLIC_CLASS.subn(f"public class {class_name}", rest, count=1)
+            class_done = renamed > 0
+        out.append(comments + rest)
+    if not package_done:
+        out.append(f"package {package};") # Only comments: nothing can follow it
+    return "\n".join(out)
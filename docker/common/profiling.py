@@ -0,0 +1,180 @@
+########################################################
+### Opt-in live profiling endpoint for every service ###
+########################################################
+
+import gc
+import ipaddress
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+import urllib.parse
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFILING_PORT = int(os.getenv("PROFILING_PORT", 0))        # 0 disables the endpoint
+PROFILING_HOST = os.getenv("PROFILING_HOST", "127.0.0.1")  # Other interfaces only with PROFILING_TOKEN
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")              # Required as "X-Profiling-Token" header when set
+MAX_PROFILE_SECONDS = 300
+
+_SKIP_THREAD_PREFIX = "profiling-" # The endpoint's own threads never show up in profiles
+_profile_lock = threading.Lock()   # One sampling profile at a time
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_names() -> dict:
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter:
+    """
+    Samples the stacks of all threads for `seconds` and counts identical stacks.
+    Keys are collapsed stacks, "thread;outer;...;inner", as flamegraph.pl and speedscope read them.
+    Costs nothing while no profile runs: there is no tracing hook, only this loop.
+    """
+    counts = Counter()
+    own = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    names = _thread_names()
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident)
+            if name is None:
+                names = _thread_names()
+                name = names.get(ident, f"thread-{ident}")
+            if ident == own or name.startswith(_SKIP_THREAD_PREFIX):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(name.replace(";", ":"))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def thread_dump() -> str:
+    """Current stack of every thread, innermost call last."""
+    names = _thread_names()
+    parts = []
+    for ident, frame in sys._current_frames().items():
+        parts.append(f"--- Thread {names.get(ident, ident)} ({ident}) ---\n" + "".join(traceback.format_stack(frame)))
+    return "\n".join(parts)
+
+
+def memory_report(top: int = 25) -> dict:
+    """Process memory, GC state and, while tracemalloc runs, the largest allocation sites."""
+    report = {"gc_counts": gc.get_count(), "gc_objects": len(gc.get_objects()), "tracemalloc": tracemalloc.is_tracing()}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS", "VmHWM", "VmSize", "Threads")):
+                    key, value = line.split(":", 1)
+                    report[key] = value.strip()
+    except OSError:
+        pass
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["traced_current_bytes"], report["traced_peak_bytes"] = current, peak
+        report["top_allocations"] = [
+            {"where": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:top]
+        ]
+    return report
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = "service"
+    log = staticmethod(logging.info)
+
+    def log_message(self, format, *args):
+        self.log(f"🔬 Profiling endpoint ({self.service}): {format % args}")
+
+    def _send(self, status: int, body, content_type="text/plain; charset=utf-8"):
+        data = (json.dumps(body, indent=2) if content_type == "application/json" else body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if PROFILING_TOKEN and self.headers.get("X-Profiling-Token") != PROFILING_TOKEN:
+            return self._send(403, "Missing or wrong X-Profiling-Token\n")
+        url = urllib.parse.urlparse(self.path)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        try:
+            if url.path == "/profile":
+                seconds = min(float(query.get("seconds", 10)), MAX_PROFILE_SECONDS)
+                interval = max(float(query.get("interval_ms", 10)), 1) / 1000
+                if not _profile_lock.acquire(blocking=False):
+                    return self._send(409, "A profile is already running\n")
+                try:
+                    counts = sample_stacks(seconds, interval)
+                finally:
+                    _profile_lock.release()
+                return self._send(200, collapsed(counts))
+            if url.path == "/threads":
+                return self._send(200, thread_dump())
+            if url.path == "/memory":
+                return self._send(200, memory_report(int(query.get("top", 25))), "application/json")
+            if url.path == "/memory/start":
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(int(query.get("frames", 1)))
+                return self._send(200, {"tracemalloc": True}, "application/json")
+            if url.path == "/memory/stop":
+                tracemalloc.stop()
+                return self._send(200, {"tracemalloc": False}, "application/json")
+            return self._send(404, "Endpoints: /profile?seconds=N&interval_ms=M, /threads, /memory?top=N, /memory/start?frames=N, /memory/stop\n")
+        except ValueError as e:
+            return self._send(400, f"Bad parameter: {e}\n")
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def start_profiling_server(service: str, port: int = PROFILING_PORT, log=logging.info):
+    """
+    Serves the profiling endpoints on a daemon thread if `port` is set (PROFILING_PORT).
+    While nobody calls it, the only cost is one thread waiting for a connection.
+    Stacks and allocation sites are not for the whole network: binding anything but a
+    loopback address needs PROFILING_TOKEN.
+    """
+    if not port:
+        return None
+    if not PROFILING_TOKEN and not _is_loopback(PROFILING_HOST):
+        log(f"⚠️ Not starting profiling endpoint on {PROFILING_HOST}:{port}: set PROFILING_TOKEN to bind beyond loopback.")
+        return None
+    handler = type("ProfilingHandler", (_Handler,), {"service": service, "log": staticmethod(log)})
+    try:
+        server = ThreadingHTTPServer((PROFILING_HOST, port), handler)
+    except OSError as e:
+        log(f"⚠️ Could not start profiling endpoint on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    # The long poll interval only delays shutdown(), which is never called; requests are served at once
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 60},
+                              name=f"{_SKIP_THREAD_PREFIX}{service}", daemon=True)
+    thread.start()
+    log(f"🔬 Profiling endpoint for {service} listening on {PROFILING_HOST}:{port}")
+    return server
@@ -0,0 +1,101 @@
+######################################################################
+### RabbitMQ topology: translation queue, delayed retries, parking ###
+######################################################################
+
+import json
+import logging
+
+import pika
+
+TRANSLATION_QUEUE = "translation_queue"
+RETRY_EXCHANGE = "translation.retry"      # Routes failed jobs into the retry queue of their delay
+PARKING_QUEUE = "translation_queue.parked" # Poison messages, kept for inspection and manual replay
+
+RETRY_COUNT_HEADER = "x-retry-count"
+FAILURE_REASON_HEADER = "x-failure-reason"
+
+
+def declare_translation_queue(channel):
+    """Declares the main job queue. Its arguments must stay the same for every publisher and consumer."""
+    channel.queue_declare(queue=TRANSLATION_QUEUE, durable=True, auto_delete=False)
+
+
+def retry_queue_name(delay_ms: int) -> str:
+    return f"{TRANSLATION_QUEUE}.retry.{delay_ms}ms"
+
+
+def declare_retry_topology(channel, delays_ms):
+    """
+    Declares one delay queue per backoff step and the parking queue.
+
+    A delay queue has no consumers: messages wait for its TTL, then the queue dead-letters
+    them through the default exchange back into the translation queue.
+    """
+    declare_translation_queue(channel)
+    channel.exchange_declare(exchange=RETRY_EXCHANGE, exchange_type="direct", durable=True)
+    for delay_ms in delays_ms:
+        name = retry_queue_name(delay_ms)
+        channel.queue_declare(queue=name, durable=True, arguments={
+            "x-message-ttl": int(delay_ms),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": TRANSLATION_QUEUE,
+        })
+        channel.queue_bind(queue=name, exchange=RETRY_EXCHANGE, routing_key=name)
+    channel.queue_declare(queue=PARKING_QUEUE, durable=True)
+
+
+def retry_count(properties) -> int:
+    headers = (properties.headers if properties else None) or {}
+    try:
+        return int(headers.get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _properties(properties, headers):
+    return pika.BasicProperties(
+        delivery_mode=2,
+        content_type=getattr(properties, "content_type", None) or "application/json",
+        headers={**((properties.headers if properties else None) or {}), **headers},
+    )
+
+
+def publish_retry(channel, body, properties, delays_ms, reason: str) -> bool:
+    """
+    Re-publishes a message into the delay queue for its next retry (exponential backoff
+    following `delays_ms`). Returns False when all retries are used up.
+    """
+    count = retry_count(properties)
+    if count >= len(delays_ms):
+        return False
+    queue = retry_queue_name(delays_ms[count])
+    channel.basic_publish(
+        exchange=RETRY_EXCHANGE,
+        routing_key=queue,
+        body=body,
+        properties=_properties(properties, {RETRY_COUNT_HEADER: count + 1, FAILURE_REASON_HEADER: reason[:500]}),
+        mandatory=True,
+    )
+    logging.info(f"↩️ Scheduled retry {count + 1}/{len(delays_ms)} in {delays_ms[count] / 1000:.0f}s ({reason[:200]})")
+    return True
+
+
+def park(channel, body, properties, reason: str):
+    """Moves a message that can never succeed (or ran out of retries) to the parking queue."""
+    channel.basic_publish(
+        exchange="",
+        routing_key=PARKING_QUEUE,
+        body=body,
+        properties=_properties(properties, {FAILURE_REASON_HEADER: reason[:500]}),
+        mandatory=True,
+    )
+    logging.warning(f"🅿️ Parked message in '{PARKING_QUEUE}': {reason[:200]}")
+
+
+def describe(body) -> str:
+    """Short identification of a message body for logs."""
+    try:
+        message = json.loads(body)
+        return f"file_id={message.get('file_id')}, filename={message.get('cpp_filename')}"
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return f"{len(body or b'')} byte(s) of unparseable body"
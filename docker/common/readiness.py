@@ -0,0 +1,107 @@
+################################################################
+### Model readiness signal between preloader and the workers ###
+################################################################
+
+import json
+import logging
+import os
+import time
+import urllib.request
+
+READINESS_FILE = os.getenv("READINESS_FILE", "/model_state/ready.json")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
+
+
+def configured_models() -> list[str]:
+    """LLM_MODEL followed by the optional router tiers LLM_MODEL_SMALL and LLM_MODEL_LARGE."""
+    models = [os.getenv(name) for name in ("LLM_MODEL", "LLM_MODEL_SMALL", "LLM_MODEL_LARGE")]
+    return list(dict.fromkeys(m for m in models if m))
+
+
+def clear_ready():
+    """Removes the readiness signal of a previous run, e.g. from before an Ollama restart."""
+    try:
+        os.remove(READINESS_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def publish_ready(models: list[str]):
+    """Atomically writes the readiness file listing the models that are resident in Ollama."""
+    os.makedirs(os.path.dirname(READINESS_FILE), exist_ok=True)
+    tmp_path = f"{READINESS_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"models": models, "ready_at": time.time()}, f)
+    os.replace(tmp_path, READINESS_FILE)
+
+
+def read_ready_models() -> list[str]:
+    """Returns the models listed in the readiness file, or an empty list if there is none yet."""
+    try:
+        with open(READINESS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("models", [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def _tagged(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+def resident_models(ollama_url: str = OLLAMA_URL):
+    """Models Ollama holds in memory right now (/api/ps), or None if Ollama cannot be reached."""
+    try:
+        with urllib.request.urlopen(f"{ollama_url}/api/ps", timeout=5) as response:
+            return {_tagged(m.get("name", "")) for m in json.load(response).get("models", [])}
+    except (OSError, ValueError):
+        return None
+
+
+def load_model(model: str, ollama_url: str = OLLAMA_URL) -> bool:
+    """Asks Ollama to load a model and keep it, like the preloader does. Blocks until it is resident."""
+    request = urllib.request.Request(
+        f"{ollama_url}/api/generate", data=json.dumps({"model": model, "keep_alive": -1}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+        return True
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not load model {model}: {e}")
+        return False
+
+
+def wait_for_model_ready(models=None, timeout: float = 900, poll_interval: float = 2, stale_after: float = 60) -> bool:
+    """
+    Blocks until the preloader has published readiness for all given models (any model if None)
+    and Ollama confirms they are resident (/api/ps). The file alone can be stale: it outlives
+    Ollama restarts and unloads, and a worker may read the previous run's file before the
+    preloader clears it. If the file stays stale for `stale_after` seconds, no preloader is
+    coming, so the missing models are loaded here.
+    Gives up after `timeout` seconds and returns False, so a missing preloader never blocks a worker forever.
+    """
+    wanted = {_tagged(m) for m in (models or []) if m}
+    deadline = time.monotonic() + timeout
+    stale_since = None
+    logging.info(f"Waiting for model readiness signal at {READINESS_FILE}...")
+    while time.monotonic() < deadline:
+        listed = {_tagged(m) for m in read_ready_models()}
+        resident = resident_models() if listed else None
+        if resident is None:
+            stale_since = None # No signal yet (the preloader is still warming) or Ollama is down
+        else:
+            missing = (wanted or listed) - resident
+            if not missing if wanted else listed & resident:
+                logging.info(f"Models ready: {', '.join(sorted(wanted or listed & resident))}")
+                return True
+            stale_since = stale_since if stale_since is not None else time.monotonic()
+            if time.monotonic() - stale_since >= stale_after:
+                logging.warning(f"Readiness signal is stale, Ollama does not hold {', '.join(sorted(missing))}. Loading now.")
+                for model in sorted(missing):
+                    load_model(model)
+                stale_since = None
+                continue
+        time.sleep(poll_interval)
+    logging.warning(f"No readiness signal after {timeout:.0f}s. Starting anyway (first jobs may pay the model load time).")
+    return False
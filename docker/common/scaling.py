@@ -0,0 +1,41 @@
+#################################################################
+### Scaling signal from the autoscaler to the worker replicas ###
+#################################################################
+
+import json
+import os
+import time
+
+SCALING_FILE = os.getenv("SCALING_FILE", "/model_state/scaling.json")
+
+_cached = (None, {}) # (mtime, settings) of the last read
+
+
+def publish_scaling(llm_slots: int, allow_unload: bool, replicas: int):
+    """Atomically writes the settings every worker replica applies at runtime."""
+    os.makedirs(os.path.dirname(SCALING_FILE), exist_ok=True)
+    tmp_path = f"{SCALING_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "llm_slots": llm_slots,
+            "allow_unload": allow_unload,
+            "replicas": replicas,
+            "updated_at": time.time(),
+        }, f)
+    os.replace(tmp_path, SCALING_FILE)
+
+
+def read_scaling() -> dict:
+    """Returns the current settings, or {} without an autoscaler. Re-reads the file only when it changed."""
+    global _cached
+    try:
+        mtime = os.stat(SCALING_FILE).st_mtime
+    except OSError:
+        return {}
+    if mtime != _cached[0]:
+        try:
+            with open(SCALING_FILE, "r", encoding="utf-8") as f:
+                _cached = (mtime, json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return _cached[1]
+    return _cached[1]
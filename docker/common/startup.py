@@ -0,0 +1,42 @@
+###########################################################
+### Cold-start timing: process start → ready to consume ###
+###########################################################
+
+import logging
+import os
+import threading
+import time
+
+_IMPORTED_AT = time.monotonic()
+
+
+def process_uptime() -> float:
+    """
+    Seconds since the kernel started this process, so interpreter start-up and imports count too.
+    Falls back to the time since this module was imported where /proc is not available.
+    """
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19]) # Field 22: starttime
+        with open("/proc/uptime", "r") as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+class StartupTimer:
+    """Logs a service's start-up milestones (each only once) relative to process start."""
+
+    def __init__(self, service: str, log=logging.info):
+        self.service = service
+        self.log = log
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def mark(self, milestone: str):
+        with self._lock:
+            if milestone in self._seen:
+                return
+            self._seen.add(milestone)
+        self.log(f"⏱️ {self.service} startup: {milestone} after {process_uptime():.2f}s")
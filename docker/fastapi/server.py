@@ -1,24 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Header, Query
+from fastapi.responses import JSONResponse, FileResponse, Response
 from typing import List, Optional
 import uuid
-import pika
 import shutil
 import os
 import json
+import shlex
+import hashlib
+
+from common.startup import StartupTimer
+from common.output_store import OutputStore
+from common.profiling import start_profiling_server
 
 fastapi = FastAPI()
+startup = StartupTimer("fastapi", log=print)
 
 UPLOAD_DIR = "/fastapi/uploads/"
+OUTPUT_DIR = "/output/" # Written by the translation worker, read here through the result index
+INPUT_EXTENSIONS = (".csv", ".txt", ".json") # Uploads passed on as program inputs, anything else besides .cpp/.h is ignored
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+output_store = OutputStore(OUTPUT_DIR)
+
 RABBITMQ_HOST = 'rabbitmq'
-TRANSLATION_QUEUE = 'translation_queue'
+TRANSLATION_QUEUE = 'translation_queue' # Same as common.queues.TRANSLATION_QUEUE
 
-def send_to_queue(file_id, cpp_filename, cpp_test_file=None, custom_prompt=None, header_files=None):
+def send_to_queue(file_id, cpp_filename, cpp_path, cpp_test_file=None, custom_prompt=None, header_files=None, input_files=None, diff_cases=None):
     """
     Send translation job with full context to RabbitMQ.
-    Includes file_id, file name, optional prompt, and full header content.
+    Includes file_id, file name, optional prompt, full header content
+    and the program inputs used for differential testing.
+    Returns True only once the broker confirmed that it has stored the job.
     """
+    import pika # Deferred to the first job, so the API starts serving without it
+    from common.queues import declare_translation_queue
+
+    connection = None
     try:
         print(f"🔄  Connecting to {RABBITMQ_HOST} to send job {file_id}...")
 
@@ -26,7 +43,9 @@ def send_to_queue(file_id, cpp_filename, cpp_test_file=None, custom_prompt=None,
         connection = pika.BlockingConnection(parameters)
         channel = connection.channel()
 
-        channel.queue_declare(queue="translation_queue", durable=True, auto_delete=False)
+        declare_translation_queue(channel)
+        # Publisher confirms: basic_publish returns once the broker took the message, or raises
+        channel.confirm_delivery()
 
         # Read the content of header files and include them in the message
         headers_payload = {}
@@ -41,42 +60,65 @@ def send_to_queue(file_id, cpp_filename, cpp_test_file=None, custom_prompt=None,
         job = {
             "file_id": file_id,
             "cpp_filename": cpp_filename,
+            "cpp_path": cpp_path,
             "cpp_test_file": cpp_test_file,
             "custom_prompt": custom_prompt,
-            "headers": headers_payload
+            "headers": headers_payload,
+            "input_files": input_files or {},
+            "diff_cases": diff_cases or []
         }
 
         channel.basic_publish(
             exchange="",
             routing_key=TRANSLATION_QUEUE,
             body=json.dumps(job),
-            properties=pika.BasicProperties(delivery_mode=2),
+            properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+            mandatory=True,
         )
 
-        print(f"✅ Sent job {file_id} to RabbitMQ")
-        connection.close()
+        print(f"✅ Sent job {file_id} to RabbitMQ (confirmed)")
+        return True
 
+    except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+        print(f"❌ ERROR: RabbitMQ did not accept job {file_id}: {str(e)}")
     except pika.exceptions.AMQPConnectionError as e:
         print(f"❌ ERROR: RabbitMQ connection failed: {str(e)}")
     except Exception as e:
         print(f"❌ ERROR: Failed to send job {file_id} to RabbitMQ: {str(e)}")
+    finally:
+        if connection and connection.is_open:
+            connection.close()
+    return False
+
+@fastapi.on_event("startup")
+def report_startup():
+    start_profiling_server("fastapi", log=print)
+    startup.mark("accepting requests")
 
 @fastapi.post("/translate/")
 async def translate_file(
     files: List[UploadFile] = File(...),
-    custom_prompt: Optional[str] = Form(None)
+    custom_prompt: Optional[str] = Form(None),
+    diff_args: Optional[str] = Form(None),
+    diff_test: bool = Form(False)
 ):
     """
-    Receives a list of files (.cpp and .h), stores them,
+    Receives a list of files (.cpp, .h and program inputs: .csv, .txt, .json), stores them,
     and sends metadata to the translation worker.
+    The differential C++ vs. Java check is opt-in: it runs once per line of `diff_args`
+    (e.g. "clients.csv"), or once without arguments when only `diff_test` is set.
     """
+    startup.mark("first request received")
     file_id = str(uuid.uuid4())
     uploaded_file_map = {}
     cpp_filename = None
     cpp_test_filename = None
 
+    # One directory per job: concurrent jobs may upload files of the same name (e.g. input.csv)
+    job_dir = os.path.join(UPLOAD_DIR, file_id)
+    os.makedirs(job_dir, exist_ok=True)
     for file in files:
-        save_path = os.path.join(UPLOAD_DIR, file.filename)
+        save_path = os.path.join(job_dir, os.path.basename(file.filename))
         with open(save_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         uploaded_file_map[file.filename] = save_path
@@ -87,6 +129,7 @@ async def translate_file(
             cpp_filename = file.filename
 
     if not cpp_filename:
+        shutil.rmtree(job_dir, ignore_errors=True)
         return {"error": "No .cpp file found in upload. Please include one."}
 
     # Filter out .h files for header content
@@ -94,6 +137,16 @@ async def translate_file(
         name: path for name, path in uploaded_file_map.items()
         if name.endswith(".h")
     }
+
+    # Data files are program inputs for the differential C++ vs. Java check
+    input_files = {
+        name: path for name, path in uploaded_file_map.items()
+        if name.lower().endswith(INPUT_EXTENSIONS)
+    }
+    ignored_files = [name for name in uploaded_file_map if not name.endswith((".cpp", ".h")) and name not in input_files]
+    diff_cases = [shlex.split(line) for line in (diff_args or "").splitlines() if line.strip()]
+    if diff_test and not diff_cases:
+        diff_cases = [[]]  # Programs that read fixed file names (e.g. input.csv) need no arguments
     
     # Read cpp test file content if provided
     test_file_content = None
@@ -103,13 +156,23 @@ async def translate_file(
             with open(test_path, "r", encoding="utf-8") as tf:
                 test_file_content = tf.read()
 
-    send_to_queue(
+    queued = send_to_queue(
         file_id=file_id,
         cpp_filename=cpp_filename,
+        cpp_path=uploaded_file_map[cpp_filename],
         cpp_test_file=test_file_content,
         custom_prompt=custom_prompt,
-        header_files=headers
+        header_files=headers,
+        input_files=input_files,
+        diff_cases=diff_cases
     )
+    if not queued:
+        # Nobody will ever pick these files up
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Translation queue unavailable, the job was not accepted. Please retry.", "file_id": file_id},
+        )
 
     return {
         "message": "Translation started",
@@ -117,5 +180,60 @@ async def translate_file(
         "cpp_filename": cpp_filename,
         "headers_sent": list(headers.keys()),
         "cpp_test_filename": cpp_test_filename,
+        "input_files": list(input_files.keys()),
+        "ignored_files": ignored_files,
+        "diff_cases": diff_cases,
         "custom_prompt": custom_prompt
     }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return bool(if_none_match) and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")])
+
+# Results can be replaced when a redelivered job finishes again, so clients revalidate with their ETag
+REVALIDATE = {"Cache-Control": "no-cache"}
+
+@fastapi.get("/results/")
+def list_results(
+    name: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Lists finished jobs from the result index, newest first.
+    Filter by class `name` (PascalCase), `status` (success, failed, error) or `since` (finished at or after, epoch seconds).
+    """
+    records = output_store.list(name=name, status=status, since=since, limit=limit, offset=offset)
+    etag = '"' + hashlib.sha256("".join(r.etag for r in records).encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, **REVALIDATE}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content={"results": [r.to_dict() for r in records], "limit": limit, "offset": offset}, headers=headers)
+
+@fastapi.get("/results/{file_id}")
+def get_result(file_id: str, if_none_match: Optional[str] = Header(None)):
+    """Status, attempts, timings and artifact list of one job."""
+    record = output_store.get(file_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": f"No result for job {file_id} (yet)."})
+    headers = {"ETag": record.etag, **REVALIDATE}
+    if etag_matches(if_none_match, record.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=record.to_dict(), headers=headers)
+
+@fastapi.get("/results/{file_id}/{artifact}")
+def get_artifact(file_id: str, artifact: str, if_none_match: Optional[str] = Header(None)):
+    """Downloads one artifact (e.g. <Name>.java, <Name>_failed.java, <Name>_diff.json) of a job."""
+    record = output_store.get(file_id)
+    path = output_store.artifact_path(record, artifact) if record else None
+    if path is None or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": f"Job {file_id} has no artifact {artifact}."})
+    etag = '"' + record.artifacts[artifact]["sha256"][:32] + '"'
+    headers = {"ETag": etag, **REVALIDATE}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = "application/json" if artifact.endswith(".json") else "text/x-java-source"
+    return FileResponse(path, media_type=media_type, filename=artifact, headers=headers)
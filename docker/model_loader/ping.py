@@ -1,12 +1,21 @@
 import os
+import json
 import requests
 import time
 import logging
 
+from common.readiness import clear_ready, configured_models, publish_ready
+
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
-MODEL = os.getenv("LLM_MODEL")
+# Comma-separated list of models to warm, defaults to every configured tier (LLM_MODEL, LLM_MODEL_SMALL, LLM_MODEL_LARGE)
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", ",".join(configured_models())).split(",") if m.strip()]
+SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT", "")
+WARMUP_NUM_CTX = os.getenv("WARMUP_NUM_CTX")  # Load with the context size the worker uses, avoids a reload on the first job
+
+# Start of every translation prompt, so Ollama's prompt cache holds system prompt + prefix
+WARMUP_PROMPT = "Translate the following C++ source file into idiomatic, fully compilable Java 17 code."
 
 def wait_for_ollama(max_attempts=60):
     for attempt in range(max_attempts):
@@ -21,23 +30,63 @@ def wait_for_ollama(max_attempts=60):
     logging.error("Ollama failed to start in time.")
     return False
 
-def warm_model():
-    logging.info(f"Sending preload request for model '{MODEL}'...")
+def loaded_models():
+    """Returns the names of the models Ollama currently holds in memory (/api/ps)."""
     try:
-        with requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={"model": MODEL, "prompt": "say ready", "stream": True},
-            stream=True,
-            timeout=None
-        ) as response:
-            if response.status_code == 200:
-                logging.info("Waiting for model to finish loading tensors...")
-                logging.info(f"Model '{MODEL}' is now loaded into memory.")
-            else:
-                logging.error(f"Failed to preload model: HTTP {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error preloading model: {e}")
+        res = requests.get(f"{OLLAMA_URL}/api/ps", timeout=5)
+        res.raise_for_status()
+        return {m.get("name") for m in res.json().get("models", [])}
+    except (requests.RequestException, ValueError) as e:
+        logging.warning(f"Could not query loaded models: {e}")
+        return set()
+
+def warm_model(model):
+    """Loads the model with the real system prompt and waits until generation has finished."""
+    logging.info(f"Sending preload request for model '{model}'...")
+    payload = {
+        "model": model,
+        "system": SYSTEM_PROMPT,
+        "prompt": WARMUP_PROMPT,
+        "keep_alive": -1,
+        "options": {"num_predict": 1},
+        "stream": True,
+    }
+    if WARMUP_NUM_CTX:
+        payload["options"]["num_ctx"] = int(WARMUP_NUM_CTX)
+    started = time.time()
+    try:
+        with requests.post(f"{OLLAMA_URL}/api/generate", json=payload, stream=True, timeout=None) as response:
+            if response.status_code != 200:
+                logging.error(f"Failed to preload model '{model}': HTTP {response.status_code}")
+                return False
+            logging.info("Waiting for model to finish loading tensors...")
+            # The first chunk only arrives once the tensors are resident; read until the final one
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    logging.error(f"Failed to preload model '{model}': {chunk['error']}")
+                    return False
+                if chunk.get("done"):
+                    break
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"Error preloading model '{model}': {e}")
+        return False
+
+    loaded = loaded_models()
+    if model not in loaded and f"{model}:latest" not in loaded:
+        logging.error(f"Model '{model}' finished warm-up but is not listed in /api/ps.")
+        return False
+    logging.info(f"Model '{model}' is now loaded into memory ({time.time() - started:.1f}s).")
+    return True
 
 if __name__ == "__main__":
+    clear_ready()
     if wait_for_ollama():
-        warm_model()
+        ready = [model for model in PRELOAD_MODELS if warm_model(model)]
+        if ready:
+            publish_ready(ready)
+            logging.info(f"Published readiness for: {', '.join(ready)}")
+        else:
+            logging.error("No model could be preloaded. Workers will start after their readiness timeout.")
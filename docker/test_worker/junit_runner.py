@@ -0,0 +1,103 @@
+#####################################################################
+### Client for the long-running JUnit runner JVM (runner/*.java) ###
+#####################################################################
+
+import base64
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import uuid
+
+
+class JUnitRunner:
+    """
+    Keeps one warm JVM running JUnitRunnerServer and sends it compile-and-run requests.
+
+    The JVM is started on first use and restarted whenever it dies or a request times out
+    (a test stuck in an endless loop cannot be stopped any other way). Requests are
+    serialized; start several runners for parallel test execution.
+    """
+
+    def __init__(self, lib_dir: str, runner_dir: str, test_timeout_ms: int = 5000, request_timeout: float = 120):
+        self.classpath = os.pathsep.join([runner_dir, os.path.join(lib_dir, "*")])
+        self.test_timeout_ms = test_timeout_ms
+        self.request_timeout = request_timeout
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        logging.info("Starting JUnit runner JVM...")
+        self._process = subprocess.Popen(
+            ["java", f"-Drunner.requestTimeoutMs={int(self.request_timeout * 1000)}", "-cp", self.classpath, "JUnitRunnerServer"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self._process, self._lines), daemon=True).start()
+        ready = self._next_line(timeout=60)
+        if not ready or not json.loads(ready).get("ready"):
+            self._stop()
+            raise RuntimeError("JUnit runner JVM did not start.")
+        logging.info("JUnit runner JVM is ready.")
+
+    @staticmethod
+    def _read_lines(process, lines):
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None) # EOF: the JVM exited
+
+    def _next_line(self, timeout):
+        try:
+            return self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _stop(self):
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def run(self, sources: dict[str, str], test_class: str) -> dict:
+        """
+        Compiles `sources` ({fully qualified class name: source}) in memory and runs `test_class`.
+        Returns the runner's structured result: compiled, diagnostics, passed/failed/aborted/skipped and per-test entries.
+        """
+        request_id = uuid.uuid4().hex
+        fields = ["RUN", request_id, str(self.test_timeout_ms), test_class] + [
+            f"{name}={base64.b64encode(code.encode('utf-8')).decode('ascii')}" for name, code in sources.items()
+        ]
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            try:
+                self._process.stdin.write("\t".join(fields) + "\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self._stop()
+                return {"compiled": False, "error": f"JUnit runner JVM unavailable: {e}"}
+
+            # Allow the JVM's own request timeout to fire first
+            line = self._next_line(timeout=self.request_timeout + 10)
+            if line is None:
+                logging.warning("JUnit runner JVM died or hung. Restarting on next request.")
+                self._stop()
+                return {"compiled": True, "timed_out": True, "error": "JUnit runner JVM did not answer"}
+
+            result = json.loads(line)
+            if result.get("timed_out"):
+                # The stuck test thread keeps running inside the JVM; only a restart frees it
+                self._stop()
+            return result
+
+    def close(self):
+        with self._lock:
+            self._stop()
@@ -0,0 +1,300 @@
+import java.io.ByteArrayOutputStream;
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Base64;
+import java.util.Collections;
+import java.util.HashMap;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
+
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+import org.junit.platform.engine.TestExecutionResult;
+import org.junit.platform.engine.discovery.DiscoverySelectors;
+import org.junit.platform.launcher.Launcher;
+import org.junit.platform.launcher.LauncherDiscoveryRequest;
+import org.junit.platform.launcher.TestExecutionListener;
+import org.junit.platform.launcher.TestIdentifier;
+import org.junit.platform.launcher.core.LauncherDiscoveryRequestBuilder;
+import org.junit.platform.launcher.core.LauncherFactory;
+
+/**
+ * Long-running JUnit 5 runner used by the test worker.
+ *
+ * Reads one request per line from stdin:
+ *   RUN \t id \t perTestTimeoutMs \t testClass \t fqcn=base64(source) [\t fqcn=base64(source) ...]
+ * compiles the sources in memory, runs the test class through the JUnit Platform launcher and
+ * writes one JSON result per line to stdout. The JVM, compiler and launcher stay warm between requests.
+ */
+public class JUnitRunnerServer {
+
+    private static final JavaCompiler COMPILER = ToolProvider.getSystemJavaCompiler();
+    private static final Launcher LAUNCHER = LauncherFactory.create();
+    private static final ExecutorService EXECUTOR = Executors.newCachedThreadPool(r -> {
+        Thread t = new Thread(r, "junit-run");
+        t.setDaemon(true);
+        return t;
+    });
+    private static final long REQUEST_TIMEOUT_MS = Long.getLong("runner.requestTimeoutMs", 120_000L);
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, StandardCharsets.UTF_8);
+        // Output of the code under test must never end up in the protocol stream
+        System.setOut(new PrintStream(OutputStream.nullOutputStream()));
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+
+        protocol.println("{\"ready\":true}");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isBlank()) {
+                continue;
+            }
+            protocol.println(handle(line));
+        }
+    }
+
+    private static String handle(String line) {
+        String[] parts = line.split("\t");
+        if (parts.length < 5 || !parts[0].equals("RUN")) {
+            return "{\"error\":" + json("Malformed request") + "}";
+        }
+        String id = parts[1];
+        long perTestTimeoutMs = Long.parseLong(parts[2]);
+        String testClassName = parts[3];
+        Map<String, String> sources = new LinkedHashMap<>();
+        for (int i = 4; i < parts.length; i++) {
+            int eq = parts[i].indexOf('=');
+            sources.put(parts[i].substring(0, eq),
+                new String(Base64.getDecoder().decode(parts[i].substring(eq + 1)), StandardCharsets.UTF_8));
+        }
+
+        StringBuilder diagnostics = new StringBuilder();
+        Map<String, byte[]> classes = compile(sources, diagnostics);
+        if (classes == null) {
+            return "{\"id\":" + json(id) + ",\"compiled\":false,\"diagnostics\":" + json(diagnostics.toString()) + "}";
+        }
+
+        ClassLoader loader = new MemoryClassLoader(classes, JUnitRunnerServer.class.getClassLoader());
+        ResultListener listener = new ResultListener();
+        Future<?> run = EXECUTOR.submit(() -> {
+            Thread.currentThread().setContextClassLoader(loader);
+            Class<?> testClass;
+            try {
+                testClass = loader.loadClass(testClassName);
+            } catch (ClassNotFoundException e) {
+                throw new IllegalStateException("Test class not found: " + testClassName, e);
+            }
+            LauncherDiscoveryRequest request = LauncherDiscoveryRequestBuilder.request()
+                .selectors(DiscoverySelectors.selectClass(testClass))
+                .configurationParameter("junit.jupiter.execution.timeout.default", perTestTimeoutMs + " ms")
+                .build();
+            LAUNCHER.execute(request, listener);
+            return null;
+        });
+
+        boolean timedOut = false;
+        String error = null;
+        try {
+            run.get(REQUEST_TIMEOUT_MS, TimeUnit.MILLISECONDS);
+        } catch (TimeoutException e) {
+            run.cancel(true);
+            timedOut = true;
+        } catch (Exception e) {
+            Throwable cause = e.getCause() != null ? e.getCause() : e;
+            error = cause.getClass().getSimpleName() + ": " + cause.getMessage();
+        }
+
+        return "{\"id\":" + json(id)
+            + ",\"compiled\":true"
+            + ",\"timed_out\":" + timedOut
+            + ",\"error\":" + (error == null ? "null" : json(error))
+            + ",\"passed\":" + listener.passed
+            + ",\"failed\":" + listener.failed
+            + ",\"aborted\":" + listener.aborted
+            + ",\"skipped\":" + listener.skipped
+            + ",\"tests\":[" + String.join(",", listener.results) + "]}";
+    }
+
+    private static Map<String, byte[]> compile(Map<String, String> sources, StringBuilder diagnosticsOut) {
+        DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<>();
+        StandardJavaFileManager standard = COMPILER.getStandardFileManager(diagnostics, null, StandardCharsets.UTF_8);
+        MemoryFileManager fileManager = new MemoryFileManager(standard);
+        List<JavaFileObject> units = new ArrayList<>();
+        for (Map.Entry<String, String> source : sources.entrySet()) {
+            units.add(new SourceFile(source.getKey(), source.getValue()));
+        }
+        List<String> options = List.of("--release", "17", "-classpath", System.getProperty("java.class.path"));
+        boolean ok = COMPILER.getTask(null, fileManager, diagnostics, options, null, units).call();
+        for (Diagnostic<? extends JavaFileObject> d : diagnostics.getDiagnostics()) {
+            if (d.getKind() == Diagnostic.Kind.ERROR) {
+                String source = d.getSource() != null ? d.getSource().getName() : "";
+                diagnosticsOut.append(source).append(':').append(d.getLineNumber())
+                    .append(": error: ").append(d.getMessage(null)).append('\n');
+            }
+        }
+        return ok ? fileManager.classes : null;
+    }
+
+    private static String json(String value) {
+        StringBuilder sb = new StringBuilder("\"");
+        for (char c : value.toCharArray()) {
+            switch (c) {
+                case '"': sb.append("\\\""); break;
+                case '\\': sb.append("\\\\"); break;
+                case '\n': sb.append("\\n"); break;
+                case '\r': sb.append("\\r"); break;
+                case '\t': sb.append("\\t"); break;
+                default:
+                    if (c < 0x20) {
+                        sb.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        sb.append(c);
+                    }
+            }
+        }
+        return sb.append('"').toString();
+    }
+
+    private static final class SourceFile extends SimpleJavaFileObject {
+        private final String code;
+
+        SourceFile(String className, String code) {
+            super(URI.create("string:///" + className.replace('.', '/') + Kind.SOURCE.extension), Kind.SOURCE);
+            this.code = code;
+        }
+
+        @Override
+        public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+            return code;
+        }
+    }
+
+    private static final class ClassFile extends SimpleJavaFileObject {
+        private final String className;
+        private final Map<String, byte[]> classes;
+
+        ClassFile(String className, Map<String, byte[]> classes) {
+            super(URI.create("mem:///" + className.replace('.', '/') + Kind.CLASS.extension), Kind.CLASS);
+            this.className = className;
+            this.classes = classes;
+        }
+
+        @Override
+        public OutputStream openOutputStream() {
+            return new ByteArrayOutputStream() {
+                @Override
+                public void close() {
+                    classes.put(className, toByteArray());
+                }
+            };
+        }
+    }
+
+    private static final class MemoryFileManager extends ForwardingJavaFileManager<StandardJavaFileManager> {
+        final Map<String, byte[]> classes = new HashMap<>();
+
+        MemoryFileManager(StandardJavaFileManager standard) {
+            super(standard);
+        }
+
+        @Override
+        public JavaFileObject getJavaFileForOutput(Location location, String className, JavaFileObject.Kind kind, FileObject sibling) {
+            return new ClassFile(className, classes);
+        }
+    }
+
+    private static final class MemoryClassLoader extends ClassLoader {
+        private final Map<String, byte[]> classes;
+
+        MemoryClassLoader(Map<String, byte[]> classes, ClassLoader parent) {
+            super(parent);
+            this.classes = classes;
+        }
+
+        @Override
+        protected Class<?> findClass(String name) throws ClassNotFoundException {
+            byte[] bytes = classes.get(name);
+            if (bytes == null) {
+                throw new ClassNotFoundException(name);
+            }
+            return defineClass(name, bytes, 0, bytes.length);
+        }
+    }
+
+    private static final class ResultListener implements TestExecutionListener {
+        final List<String> results = Collections.synchronizedList(new ArrayList<>());
+        final Map<String, Long> started = new ConcurrentHashMap<>();
+        volatile int passed;
+        volatile int failed;
+        volatile int aborted;
+        volatile int skipped;
+
+        @Override
+        public void executionStarted(TestIdentifier id) {
+            started.put(id.getUniqueId(), System.nanoTime());
+        }
+
+        @Override
+        public void executionSkipped(TestIdentifier id, String reason) {
+            if (id.isTest()) {
+                skipped++;
+                results.add(result(id, "SKIPPED", reason == null ? "" : reason, 0));
+            }
+        }
+
+        @Override
+        public void executionFinished(TestIdentifier id, TestExecutionResult result) {
+            Long start = started.remove(id.getUniqueId());
+            long durationMs = start == null ? 0 : (System.nanoTime() - start) / 1_000_000;
+            String message = result.getThrowable()
+                .map(t -> t.getClass().getSimpleName() + (t.getMessage() == null ? "" : ": " + t.getMessage()))
+                .orElse("");
+            TestExecutionResult.Status status = result.getStatus();
+            if (!id.isTest()) {
+                // Failing containers (e.g. @BeforeAll, constructor) would otherwise go unreported
+                if (status != TestExecutionResult.Status.SUCCESSFUL) {
+                    failed++;
+                    results.add(result(id, "FAILED", message, durationMs));
+                }
+                return;
+            }
+            if (status == TestExecutionResult.Status.SUCCESSFUL) {
+                passed++;
+            } else if (status == TestExecutionResult.Status.ABORTED) {
+                aborted++;
+            } else {
+                failed++;
+            }
+            results.add(result(id, status.name(), message, durationMs));
+        }
+
+        private static String result(TestIdentifier id, String status, String message, long durationMs) {
+            return "{\"name\":" + json(id.getDisplayName())
+                + ",\"status\":" + json(status)
+                + ",\"message\":" + json(message)
+                + ",\"duration_ms\":" + durationMs + "}";
+        }
+    }
+}
@@ -6,11 +6,20 @@ import pika
 import json
 import logging
 import requests
-import re
 import os
+import time
+import hashlib
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from common.readiness import wait_for_model_ready
+from common.profiling import start_profiling_server
+from common.postprocessing import extract_code, normalize_java, package_of
+from junit_runner import JUnitRunner
+
 # Load environment variables
 load_dotenv()
 
@@ -22,15 +31,45 @@ MODEL_NAME = os.getenv("LLM_MODEL")
 SYSTEM_PROMPT = os.getenv("TEST_SYSTEM_PROMPT")
 OLLAMA_URL = "http://ollama:11434/api/generate"
 TESTS_DIR = "/test_worker/tests/"
+MODEL_READY_TIMEOUT = int(os.getenv("MODEL_READY_TIMEOUT", 900))
+RUN_GENERATED_TESTS = os.getenv("RUN_GENERATED_TESTS", "true").lower() == "true"
+JUNIT_LIB_DIR = os.getenv("JUNIT_LIB_DIR", "/app/libs")
+JUNIT_RUNNER_DIR = os.getenv("JUNIT_RUNNER_DIR", "/test_worker/runner")
+TEST_TIMEOUT_MS = int(os.getenv("TEST_TIMEOUT_MS", 5000))           # Per-test timeout inside the runner JVM
+MAX_INFLIGHT_TESTS = int(os.getenv("MAX_INFLIGHT_TESTS", 2))        # Concurrent generations, match the LLM backend's parallel slots
+GENERATION_TIMEOUT = int(os.getenv("TEST_GENERATION_TIMEOUT", 600))
+GENERATED_INDEX_PATH = os.path.join(TESTS_DIR, ".generated_index.json")
 
 # Ensure the directory for tests exists
 os.makedirs(TESTS_DIR, exist_ok=True)
 
+# Pooled HTTP connections to the LLM backend, shared by all generation threads
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_INFLIGHT_TESTS))
+
+# Warm JVM that compiles and runs generated tests, started on first use
+junit_runner = JUnitRunner(JUNIT_LIB_DIR, JUNIT_RUNNER_DIR, test_timeout_ms=TEST_TIMEOUT_MS)
+
+def run_generated_test(java_code, java_test_code, class_name):
+    """
+    Compiles the translated class together with its generated test in the warm runner JVM
+    and runs the test. Returns the structured result (see JUnitRunner.run).
+    The test is moved into the translated class's package so it can reference the class.
+    """
+    package = package_of(java_code) or ""
+    java_test_code = normalize_java(java_test_code, package=package)
+    prefix = f"{package}." if package else ""
+
+    return junit_runner.run(
+        {f"{prefix}{class_name}": java_code, f"{prefix}{class_name}Test": java_test_code},
+        f"{prefix}{class_name}Test",
+    )
+
 def generate_integration_test(java_file, cpp_test_reference=None):
     """
     Function to send a request to the LLM to generate a JUnit test for the provided Java file.
     """
-    pascal_case_name = java_file.replace(".java", "")
+    pascal_case_name = os.path.basename(java_file).replace(".java", "")
     temp_test_file_path = os.path.join(TESTS_DIR, f"{pascal_case_name}Test.java")
 
     # Read the content of the Java file
@@ -79,7 +118,7 @@ def generate_integration_test(java_file, cpp_test_reference=None):
     try:
         # Send the request to the LLM (Ollama)
         logging.info(f"Sending request to Ollama to generate JUnit test for {java_file}")
-        response = requests.post(OLLAMA_URL, json=payload)
+        response = http.post(OLLAMA_URL, json=payload, timeout=GENERATION_TIMEOUT)
         response.raise_for_status()
 
         # Extract the generated Java test code from the LLM response
@@ -90,76 +129,196 @@ def generate_integration_test(java_file, cpp_test_reference=None):
         ### POST PROCESSING ###
         #######################
         
-        # Extract only the Java code from the response
-        retry_match = re.search(r"```(?:java)?\s*(.*?)```", generated_test_code, re.DOTALL)
-        if retry_match:
-            java_test_code = retry_match.group(1).strip()
-        else:
-            java_test_code = generated_test_code  # If no match, use the entire response
+        # Extract only the Java code from the response (the entire response if it has no fences)
+        java_test_code = extract_code(generated_test_code)
         
         # Save the processed Java test code into a test file
         with open(temp_test_file_path, "w") as output_file:
             output_file.write(java_test_code)
 
         logging.info(f"Generated test file saved to {temp_test_file_path}")
+
+        if RUN_GENERATED_TESTS:
+            results = run_generated_test(java_code, java_test_code, pascal_case_name)
+            results_path = os.path.join(TESTS_DIR, f"{pascal_case_name}TestResult.json")
+            with open(results_path, "w") as results_file:
+                json.dump(results, results_file, indent=2)
+            if not results.get("compiled"):
+                logging.warning(f"Generated test for {pascal_case_name} did not compile:\n{results.get('diagnostics', '')}")
+            else:
+                logging.info(
+                    f"Test results for {pascal_case_name}: {results.get('passed', 0)} passed, {results.get('failed', 0)} failed, "
+                    f"{results.get('aborted', 0)} aborted, {results.get('skipped', 0)} skipped"
+                    f"{' (timed out)' if results.get('timed_out') else ''}. Saved to {results_path}"
+                )
         return temp_test_file_path
     except Exception as e:
         logging.error(f"Error generating test for {java_file}: {e}")
         return None
 
 
-def start_test_worker():
+class GeneratedIndex:
+    """Remembers which Java source and C++ test reference each class's test was generated from."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                self._keys = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._keys = {}
+
+    @staticmethod
+    def key(java_code, cpp_test_reference):
+        return hashlib.sha256(f"{java_code}\0{cpp_test_reference or ''}".encode("utf-8")).hexdigest()
+
+    def is_current(self, class_name, key):
+        with self._lock:
+            return self._keys.get(class_name) == key
+
+    def record(self, class_name, key):
+        with self._lock:
+            self._keys[class_name] = key
+            with open(f"{self.path}.tmp", "w") as f:
+                json.dump(self._keys, f)
+            os.replace(f"{self.path}.tmp", self.path)
+
+
+generated_index = GeneratedIndex(GENERATED_INDEX_PATH)
+
+
+def process_message(message):
+    """Generates (and runs) the test requested by one message, unless an identical one exists already."""
+    action = message.get('action')
+    if action != 'generate_test':
+        logging.warning(f"Unknown action: {action}")
+        return
+
+    java_file = message.get('java_file_path')
+    cpp_test_reference = message.get('cpp_test_reference')
+    if not java_file:
+        logging.warning(f"No Java file provided in the message.")
+        return
+
+    class_name = os.path.basename(java_file).replace(".java", "")
+    with open(java_file, "r") as file:
+        key = GeneratedIndex.key(file.read(), cpp_test_reference)
+    test_file_path = os.path.join(TESTS_DIR, f"{class_name}Test.java")
+    if generated_index.is_current(class_name, key) and os.path.exists(test_file_path):
+        logging.info(f"Test for {class_name} is up to date (same Java source and C++ test reference). Skipping.")
+        return
+
+    logging.info(f"Received request to generate test for: {java_file}")
+    test_file = generate_integration_test(java_file, cpp_test_reference)
+    if test_file:
+        generated_index.record(class_name, key)
+        logging.info(f"Generated test file: {test_file}")
+    else:
+        logging.warning(f"Failed to generate test for {java_file}")
+
+
+class ClassBatcher:
     """
-    Worker function to listen for messages from RabbitMQ and generate tests for Java files.
+    Runs messages on the thread pool, but never two for the same translated class at once.
+
+    Messages for a class that is already being processed are coalesced: only the newest one
+    is processed afterwards, and all of them are acknowledged together.
     """
-    try:
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host='rabbitmq'))
-        channel = connection.channel()
 
-        # Declare the queue that will receive messages
-        channel.queue_declare(queue='test_generation_queue', durable=True)
+    def __init__(self, executor, process):
+        self._executor = executor
+        self._process = process
+        self._lock = threading.Lock()
+        self._running = {}  # class name -> {"pending": newest waiting message, "acks": its ack callbacks}
 
-        def callback(ch, method, properties, body):
-            """
-            Callback function to process the message from the Translation Worker.
-            """
-            try:
-                # Parse the incoming message
-                message = json.loads(body.decode())
-                action = message.get('action')
-
-                if action == 'generate_test':
-                    java_file = message.get('java_file_path')
-                    cpp_test_reference = message.get('cpp_test_reference')
-                    if java_file:
-                        logging.info(f"Received request to generate test for: {java_file}")
-                        test_file = generate_integration_test(java_file, cpp_test_reference)
-                        if test_file:
-                            logging.info(f"Generated test file: {test_file}")
-                        else:
-                            logging.warning(f"Failed to generate test for {java_file}")
-                    else:
-                        logging.warning(f"No Java file provided in the message.")
-
-                else:
-                    logging.warning(f"Unknown action: {action}")
-
-                # Acknowledge the message after processing
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+    def submit(self, class_name, message, ack):
+        with self._lock:
+            state = self._running.get(class_name)
+            if state is not None:
+                state["pending"] = message
+                state["acks"].append(ack)
+                return
+            self._running[class_name] = {"pending": None, "acks": []}
+        self._executor.submit(self._run, class_name, message, [ack])
 
+    def _run(self, class_name, message, acks):
+        while True:
+            try:
+                self._process(message)
             except Exception as e:
                 logging.error(f"Error processing message: {e}")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+            for ack in acks:
+                ack()
+            with self._lock:
+                state = self._running[class_name]
+                if state["pending"] is None:
+                    del self._running[class_name]
+                    return
+                message, acks = state["pending"], state["acks"]
+                state["pending"], state["acks"] = None, []
+
+
+def start_test_worker():
+    """
+    Worker function to listen for messages from RabbitMQ and generate tests for Java files.
+    Up to MAX_INFLIGHT_TESTS generations run concurrently; the worker reconnects whenever the connection drops.
+    """
+    executor = ThreadPoolExecutor(max_workers=MAX_INFLIGHT_TESTS, thread_name_prefix="testgen")
+    batcher = ClassBatcher(executor, process_message)
+
+    while True:
+        connection = None
+        try:
+            # Connect to RabbitMQ
+            connection = pika.BlockingConnection(pika.ConnectionParameters(host='rabbitmq', heartbeat=600, blocked_connection_timeout=300))
+            channel = connection.channel()
+
+            # Declare the queue that will receive messages
+            channel.queue_declare(queue='test_generation_queue', durable=True)
+            channel.basic_qos(prefetch_count=MAX_INFLIGHT_TESTS)
+
+            def make_ack(ch, delivery_tag):
+                """Generation threads must hand the ACK to the connection thread."""
+                def ack():
+                    try:
+                        connection.add_callback_threadsafe(lambda: ch.basic_ack(delivery_tag=delivery_tag))
+                    except Exception as e:
+                        # Connection is gone; RabbitMQ redelivers and the index makes the retry cheap
+                        logging.warning(f"Could not acknowledge message: {e}")
+                return ack
+
+            def callback(ch, method, properties, body):
+                """
+                Callback function to hand the message from the Translation Worker to the thread pool.
+                """
+                try:
+                    message = json.loads(body.decode())
+                except json.JSONDecodeError as e:
+                    logging.error(f"Error processing message: {e}")
+                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    return
+                class_name = os.path.basename(message.get('java_file_path') or "") or message.get('pascal_case_name') or ""
+                batcher.submit(class_name, message, make_ack(ch, method.delivery_tag))
 
-        # Start consuming messages from the queue
-        logging.info("Test Generation Worker is waiting for tasks...")
-        channel.basic_consume(queue='test_generation_queue', on_message_callback=callback)
-        channel.start_consuming()
+            # Start consuming messages from the queue
+            logging.info("Test Generation Worker is waiting for tasks...")
+            channel.basic_consume(queue='test_generation_queue', on_message_callback=callback)
+            channel.start_consuming()
 
-    except pika.exceptions.AMQPConnectionError:
-        logging.warning("Connection to RabbitMQ lost. Retrying...")
-        time.sleep(5)
+        except pika.exceptions.AMQPConnectionError:
+            logging.warning("Connection to RabbitMQ lost. Retrying in 5s...")
+        except Exception as e:
+            logging.exception(f"Unexpected error in test worker loop: {e}. Restarting in 5s...")
+        finally:
+            if connection and not connection.is_closed:
+                try:
+                    connection.close()
+                except Exception as ce:
+                    logging.error(f"Error closing RabbitMQ connection: {ce}")
+            time.sleep(5)
 
 if __name__ == "__main__":
+    start_profiling_server("test_worker")
+    wait_for_model_ready([MODEL_NAME], timeout=MODEL_READY_TIMEOUT)
     start_test_worker()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the packages the way the containers do (common.*, translation_worker.*)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,18 @@
+import pytest
+
+from translation_worker.chunking import stitch
+
+
+def test_stitch_keeps_sibling_types_top_level_once():
+    first = "import java.util.List;\n\npublic class A {\n    static void a() { new Helper(); }\n}\n\nclass Helper {\n    int x;\n}\n"
+    second = "public class A {\n    public static void main(String[] args) { new Helper(); }\n}\nclass Helper {\n    int x;\n}\n"
+    code = stitch("Program", [first, second])
+    class_end = code.index("\n}\n")
+    assert code.count("class Helper") == 1
+    assert code.index("class Helper") > class_end
+    assert code.startswith("import java.util.List;\n\npublic class Program {")
+
+
+def test_stitch_rejects_an_empty_chunk():
+    with pytest.raises(ValueError):
+        stitch("Program", ["public class A {\n    void a() {}\n}", "public class A {\n}"])
@@ -0,0 +1,8 @@
+from translation_worker.compile_cache import CompileCache
+
+
+def test_leading_blank_lines_change_the_key():
+    cache = CompileCache(["-Xlint"])
+    cache.put("public class A { int x = y; }", "/tmp/a/A.java", False, "/tmp/a/A.java:1: error: cannot find symbol")
+    assert cache.get("\n\npublic class A { int x = y; }", "/tmp/b/A.java") is None
+    assert cache.get("public class A { int x = y; }  \n\n", "/tmp/b/A.java") == (False, "/tmp/b/A.java:1: error: cannot find symbol")
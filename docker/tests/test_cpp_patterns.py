@@ -0,0 +1,19 @@
+from translation_worker.profiles.cpp_patterns import extract_cpp_features
+
+
+def raw_pointers(code):
+    return extract_cpp_features(code)["raw_pointers"]
+
+
+def test_arrow_member_access_is_not_a_raw_pointer():
+    assert raw_pointers("for (auto it = m.begin(); it != m.end(); ++it) total += it->second;") == 0
+
+
+def test_cli_main_argv_is_not_a_raw_pointer():
+    assert raw_pointers("int main(int argc, char* argv[]) { return 0; }") == 0
+    assert raw_pointers("int main(int argc, char** argv) { return 0; }") == 0
+
+
+def test_multiplication_is_not_a_pointer_declaration():
+    assert raw_pointers("int f(int a, int b) { return g(a * b, a); }") == 0
+    assert raw_pointers("Node* head = nullptr;") == 2
@@ -0,0 +1,13 @@
+from common.postprocessing import extract_code
+
+
+def test_stray_closing_fence_is_dropped():
+    assert extract_code("public class A {}\n```") == "public class A {}"
+
+
+def test_fence_opening_after_text_on_the_same_line():
+    assert extract_code("Sure, here it is: ```java\npublic class A {}\n```") == "public class A {}"
+
+
+def test_empty_block_before_the_code_is_skipped():
+    assert extract_code("```java\n```\npublic class A {}") == "public class A {}"
@@ -0,0 +1,11 @@
+from translation_worker.retrieval import compact
+
+
+def test_compact_keeps_lines_starting_with_an_operator():
+    code = "double x = a\n    * b;\n*p = 3;\nint y;"
+    assert compact(code) == code
+
+
+def test_compact_drops_comment_lines():
+    code = "/*\n * Header\n */\n// note\nint x; // kept\n/* a */ int y;\n\n"
+    assert compact(code) == "int x; // kept\n/* a */ int y;"
@@ -0,0 +1,92 @@
+#############################################################
+### Durable job checkpoints for resuming redelivered jobs ###
+#############################################################
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Attempt state persisted after every stage; everything else is rebuilt from the message
+CHECKPOINT_FIELDS = (
+    "pascal_case_name", "cpp_code", "prompt", "estimated_tokens", "model", "tier", "tier_started_attempt",
+    "num_ctx", "chunk_prompts", "attempt", "current_java_code", "code_with_declaration", "sanitized_log",
+    "pmd_findings", "previous_sanitized_log", "temperature", "repeat_escalations", "success", "output_file_path",
+    "diff_results", "examples",
+)
+
+
+class CheckpointedError(Exception):
+    """Error a job ended with before its redelivery, restored from the checkpoint as "Type: message"."""
+
+
+class CheckpointStore:
+    """
+    SQLite store of per-job attempt state, keyed by file_id.
+
+    A job is checkpointed with the stage it moves to after every pipeline stage. When
+    RabbitMQ redelivers a message (worker crash, OOM kill, lost connection), the job
+    resumes from that stage instead of repeating its LLM calls. Checkpoints are deleted
+    once the job's message has been acknowledged.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " file_id TEXT PRIMARY KEY,"
+            " stage TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def save(self, job, stage: str):
+        state = {name: getattr(job, name) for name in CHECKPOINT_FIELDS}
+        state["seen_code_hashes"] = sorted(job.seen_code_hashes)
+        if job.error is not None:
+            state["error"] = f"{type(job.error).__name__}: {job.error}"
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO checkpoints (file_id, stage, state, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(file_id) DO UPDATE SET stage=excluded.stage, state=excluded.state, updated_at=excluded.updated_at",
+                (job.file_id, stage, json.dumps(state), time.time()),
+            )
+
+    def restore(self, job):
+        """Loads the job's checkpoint into it and returns the stage to resume at, or None if there is none."""
+        with self._lock:
+            row = self._db.execute("SELECT stage, state FROM checkpoints WHERE file_id = ?", (job.file_id,)).fetchone()
+        if row is None:
+            return None
+        stage, state = row
+        try:
+            state = json.loads(state)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Discarding unreadable checkpoint of job {job.file_id}: {e}")
+            self.delete(job.file_id)
+            return None
+        job.seen_code_hashes = set(state.pop("seen_code_hashes", []))
+        error = state.pop("error", None)
+        if error is not None:
+            job.error = CheckpointedError(error) # Parked again instead of being ACKed as a success
+        for name, value in state.items():
+            if name in CHECKPOINT_FIELDS:
+                setattr(job, name, value)
+        return stage
+
+    def delete(self, file_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE file_id = ?", (file_id,))
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Removes checkpoints of jobs that were never redelivered (e.g. ACKed right before a crash)."""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM checkpoints WHERE updated_at < ?", (time.time() - max_age_seconds,))
+        return cursor.rowcount
@@ -0,0 +1,286 @@
+##########################################################
+### Chunked translation of large C++ translation units ###
+##########################################################
+
+import re
+
+from dataclasses import dataclass, field
+
+_CLASS_HEAD = re.compile(r"^\s*(?:template\s*<[^{;]*>\s*)?(?:class|struct|union|enum(?:\s+class)?)\s+(?:\[\[[^\]]*\]\]\s*)?(\w+)[^;{]*\{")
+_NAMESPACE_HEAD = re.compile(r"^\s*(?:inline\s+)?namespace\b")
+_FUNCTION_NAME = re.compile(r"((?:\w+::)*)(~?\w+|operator\s*[^\s(]+)\s*\($")
+_PUBLIC_CLASS = re.compile(r"\bpublic\s+(?:final\s+|abstract\s+)?class\s+\w+[^{]*\{")
+_TYPE_HEAD = re.compile(r"\b(?:class|interface|enum|record)\s+(\w+)")
+_IMPORT_OR_PACKAGE = re.compile(r"^\s*(import|package)\s+[\w.*\s]+;\s*$")
+
+
+@dataclass
+class Declaration:
+    """One top-level piece of a C++ translation unit."""
+    kind: str       # "class", "function", "namespace" or "preamble" (includes, usings, globals, forward declarations)
+    name: str       # Class, function or namespace name
+    text: str
+    owner: str = "" # Owning class of an out-of-line member definition (Owner::method)
+
+
+@dataclass
+class Chunk:
+    """Declarations translated together in one LLM request."""
+    declarations: list = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(d.text for d in self.declarations)
+
+    @property
+    def names(self) -> list:
+        return list(dict.fromkeys(d.owner or d.name for d in self.declarations))
+
+
+def structural_chars(code: str):
+    """
+    Yields (position, char) for every '{', '}' and ';' that is real code, i.e. not inside a
+    comment, string or character literal, and every newline ending a preprocessor directive
+    (as char '#').
+    """
+    i, n = 0, len(code)
+    line_start = True
+    while i < n:
+        c = code[i]
+        if c == "\n":
+            line_start = True
+            i += 1
+            continue
+        if c in " \t\r":
+            i += 1
+            continue
+        if line_start and c == "#":
+            # Preprocessor directive, including backslash continuations
+            while i < n and code[i] != "\n":
+                i += 2 if code[i] == "\\" else 1
+            yield min(i, n), "#"
+            continue
+        line_start = False
+        if code.startswith("//", i):
+            end = code.find("\n", i)
+            i = n if end < 0 else end
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif c == '"' and i > 0 and code[i - 1] == "R":
+            # Raw string R"delim( ... )delim"
+            open_paren = code.find("(", i)
+            delim = code[i + 1:open_paren]
+            end = code.find(f"){delim}\"", open_paren)
+            i = n if open_paren < 0 or end < 0 else end + len(delim) + 2
+        elif c in "\"'":
+            i += 1
+            while i < n and code[i] != c and code[i] != "\n":
+                i += 2 if code[i] == "\\" else 1
+            i += 1
+        else:
+            if c in "{};":
+                yield i, c
+            i += 1
+
+
+def _classify(text: str, code_head: str) -> Declaration:
+    """`code_head` is the declaration's code up to its first top-level '{' (or all of it)."""
+    if _NAMESPACE_HEAD.match(code_head):
+        return Declaration("namespace", code_head.split("{")[0].split()[-1] if "{" in code_head else "", text)
+    class_match = _CLASS_HEAD.match(code_head + "{")
+    if class_match and text.rstrip().endswith(";") and "(" not in code_head.split(class_match.group(1), 1)[1]:
+        return Declaration("class", class_match.group(1), text)
+    if text.rstrip().endswith("}") and "(" in code_head:
+        signature = code_head[:code_head.rfind(")") + 1] if ")" in code_head else code_head
+        name_match = _FUNCTION_NAME.search(signature[:signature.find("(") + 1])
+        if name_match:
+            owner = name_match.group(1).rstrip(":").split("::")[-1]
+            return Declaration("function", name_match.group(2), text, owner=owner)
+    return Declaration("preamble", "", text)
+
+
+def scan_declarations(code: str) -> list[Declaration]:
+    """
+    Splits C++ source into top-level declarations by tracking brace depth. Comments and
+    literals are skipped; a declaration ends at a top-level ';' or at the '}' closing its
+    body (a following ';', as after a class, is included).
+    """
+    declarations = []
+    depth = 0
+    start = 0
+    head_end = None
+    chars = list(structural_chars(code))
+    index = 0
+    while index < len(chars):
+        pos, c = chars[index]
+        end = None
+        if c == "#" and depth == 0:
+            end = pos
+        elif c == "{":
+            if depth == 0 and head_end is None:
+                head_end = pos
+            depth += 1
+        elif c == "}":
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                end = pos + 1
+                head = _strip_comments(code[start:head_end])
+                is_type = _CLASS_HEAD.match(head + "{") and "(" not in head
+                if is_type and index + 1 < len(chars) and chars[index + 1][1] == ";":
+                    # class X { ... } [instances];
+                    index += 1
+                    end = chars[index][0] + 1
+        elif c == ";" and depth == 0:
+            end = pos + 1
+        if end is not None:
+            text = code[start:end].strip()
+            if text:
+                head = code[start:head_end] if head_end is not None else code[start:end]
+                declarations.append(_classify(text, _strip_comments(head).strip()))
+            start, head_end = end, None
+        index += 1
+    rest = code[start:].strip()
+    if rest:
+        declarations.append(Declaration("preamble", "", rest))
+    return declarations
+
+
+def _strip_comments(text: str) -> str:
+    return re.sub(r"//[^\n]*|/\*.*?\*/", " ", text, flags=re.DOTALL)
+
+
+def elide_bodies(text: str, keep_depth: int) -> str:
+    """Replaces every brace block nested deeper than `keep_depth` with ';' (function bodies → prototypes)."""
+    out, depth, last = [], 0, 0
+    for pos, c in structural_chars(text):
+        if c == "{":
+            depth += 1
+            if depth == keep_depth + 1:
+                out.append(text[last:pos].rstrip())
+                out.append(";")
+        elif c == "}":
+            depth -= 1
+            if depth == keep_depth:
+                last = pos + 1
+                # Skip the ';' that may follow a nested class body
+                while last < len(text) and text[last] in " \t;":
+                    last += 1
+    if depth <= keep_depth:
+        out.append(text[last:])
+    return "".join(out)
+
+
+def signature_summary(declarations: list[Declaration]) -> str:
+    """Class outlines and function prototypes of the whole unit, shared as context with every chunk."""
+    lines = []
+    for decl in declarations:
+        if decl.kind == "class":
+            lines.append(elide_bodies(decl.text, keep_depth=1).strip())
+        elif decl.kind == "function":
+            lines.append(elide_bodies(decl.text, keep_depth=0).strip())
+        elif decl.kind == "namespace":
+            lines.append(elide_bodies(decl.text, keep_depth=2).strip())
+    return "\n".join(lines)
+
+
+def plan_chunks(declarations: list[Declaration], max_chunk_tokens: int, estimate) -> list[Chunk]:
+    """
+    Groups declarations into chunks of roughly `max_chunk_tokens` (measured with `estimate`).
+    A class and its out-of-line member definitions always land in the same chunk; free functions
+    and small classes are packed together in source order. Preamble declarations are not chunked.
+    """
+    groups = {}
+    for index, decl in enumerate(declarations):
+        if decl.kind == "preamble":
+            continue
+        key = decl.name if decl.kind == "class" else decl.owner or f"#{index}"
+        groups.setdefault(key, []).append(decl)
+
+    chunks = []
+    current, current_tokens = Chunk(), 0
+    for group in groups.values():
+        tokens = sum(estimate(d.text) for d in group)
+        if current.declarations and current_tokens + tokens > max_chunk_tokens:
+            chunks.append(current)
+            current, current_tokens = Chunk(), 0
+        current.declarations.extend(group)
+        current_tokens += tokens
+    if current.declarations:
+        chunks.append(current)
+    return chunks
+
+
+def preamble_text(declarations: list[Declaration]) -> str:
+    return "\n".join(d.text for d in declarations if d.kind == "preamble")
+
+
+def _class_body(code: str) -> tuple[str, str]:
+    """
+    Splits a translated chunk into the members inside its first public class and the code
+    around that class (other top-level types the model wrote). Without a public class the
+    whole chunk counts as members.
+    """
+    head = _PUBLIC_CLASS.search(code)
+    if not head:
+        return code, ""
+    depth = 0
+    for pos, c in structural_chars(code[head.end() - 1:]):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                end = head.end() - 1 + pos
+                return code[head.end():end], code[:head.start()] + "\n" + code[end + 1:]
+    return code[head.end():], code[:head.start()]
+
+
+def _top_level_types(code: str) -> list[tuple[str, str]]:
+    """Returns [(name, text)] of the top-level types in `code`; text between them (comments, stray ';') goes with the next type."""
+    types, depth, start = [], 0, 0
+    for pos, c in structural_chars(code):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                text = code[start:pos + 1].strip()
+                match = _TYPE_HEAD.search(text)
+                if match:
+                    types.append((match.group(1), text))
+                start = pos + 1
+    return types
+
+
+def stitch(class_name: str, pieces: list[str]) -> str:
+    """
+    Joins translated chunks into one public class, merging and de-duplicating their imports.
+    Other top-level types of the chunks follow the class, once per name, so they stay
+    top-level (as inner classes they could not be created from static methods).
+    Raises ValueError if a chunk has no members, as the class would compile without them.
+    """
+    imports, bodies, types = [], [], {}
+    for index, piece in enumerate(pieces, start=1):
+        members, outside = [], []
+        body, around = _class_body(piece)
+        for target, text in ((members, body), (outside, around)):
+            for line in text.splitlines():
+                match = _IMPORT_OR_PACKAGE.match(line)
+                if match:
+                    if match.group(1) == "import" and line.strip() not in imports:
+                        imports.append(line.strip())
+                    continue
+                target.append(line)
+        body = "\n".join(members).strip("\n")
+        siblings = _top_level_types("\n".join(outside))
+        if not body.strip() and not siblings:
+            raise ValueError(f"chunk {index}/{len(pieces)} has no members")
+        if body.strip():
+            bodies.append(body)
+        for name, text in siblings:
+            types.setdefault(name, text)
+    header = "\n".join(imports) + ("\n\n" if imports else "")
+    body = "\n\n".join(bodies)
+    trailer = "".join(f"\n{text}\n" for text in types.values())
+    return f"{header}public class {class_name} {{\n\n{body}\n}}\n{trailer}"
@@ -0,0 +1,69 @@
+##################################################################
+### Memo cache for compile results, keyed by normalized source ###
+##################################################################
+
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+# Stands in for the job-specific file path inside cached diagnostics
+PATH_PLACEHOLDER = "\0JAVA_FILE\0"
+
+
+def normalize_source(code: str, keep_leading_lines: bool = False) -> str:
+    """
+    Normalizes line endings, trailing whitespace and surrounding blank lines, which never change javac's verdict.
+    With `keep_leading_lines`, leading blank lines stay, as they shift the line numbers in javac's diagnostics.
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    normalized = "\n".join(line.rstrip() for line in lines)
+    return normalized.rstrip("\n") if keep_leading_lines else normalized.strip("\n")
+
+
+def source_hash(code: str, keep_leading_lines: bool = False) -> str:
+    """SHA-256 of the normalized source."""
+    return hashlib.sha256(normalize_source(code, keep_leading_lines).encode("utf-8")).hexdigest()
+
+
+class CompileCache:
+    """
+    Thread-safe LRU cache of (success, log) results keyed by source hash plus tool flags.
+
+    Diagnostics contain the path of the compiled file, which differs per job, so the
+    path is stored as a placeholder and filled in with the caller's path on lookup.
+    """
+
+    def __init__(self, flags, max_entries: int = 2048):
+        self.flags = tuple(flags)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, code: str) -> str:
+        # Cached diagnostics carry line numbers, so sources differing in leading blank lines get different keys
+        return hashlib.sha256(("\0".join(self.flags) + "\0" + source_hash(code, keep_leading_lines=True)).encode("utf-8")).hexdigest()
+
+    def get(self, code: str, java_file_path: str):
+        """Returns the cached (success, log) for this source, or None."""
+        key = self.key(code)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        success, log = entry
+        return success, log.replace(PATH_PLACEHOLDER, java_file_path)
+
+    def put(self, code: str, java_file_path: str, success: bool, log: str):
+        key = self.key(code)
+        entry = (success, (log or "").replace(java_file_path, PATH_PLACEHOLDER))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
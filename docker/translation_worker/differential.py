@@ -0,0 +1,189 @@
+###########################################################################
+### Differential testing: original C++ binary vs. translated Java class ###
+###########################################################################
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+
+NUMBER = re.compile(r"[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?")
+WHITESPACE = re.compile(r"\s+")
+OUTPUT_SUBDIR = "output" # The evaluation programs write their result files here
+
+
+@dataclass
+class DiffResult:
+    """Outcome of running one argument set through both programs."""
+    args: list
+    matched: bool
+    cpp_returncode: int = None
+    java_returncode: int = None
+    mismatches: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def values_match(expected: str, actual: str, rel_tol: float, abs_tol: float, ignore=None) -> bool:
+    """Compares two output lines: text must be equal up to whitespace, numbers up to the tolerance.
+    Parts matching `ignore` (e.g. timestamps) are masked on both sides first."""
+    if ignore is not None:
+        expected, actual = ignore.sub("<ignored>", expected), ignore.sub("<ignored>", actual)
+    expected_parts = NUMBER.split(WHITESPACE.sub(" ", expected.strip()))
+    actual_parts = NUMBER.split(WHITESPACE.sub(" ", actual.strip()))
+    expected_numbers = NUMBER.findall(expected)
+    actual_numbers = NUMBER.findall(actual)
+    if expected_parts != actual_parts or len(expected_numbers) != len(actual_numbers):
+        return False
+    return all(
+        math.isclose(float(e), float(a), rel_tol=rel_tol, abs_tol=abs_tol)
+        for e, a in zip(expected_numbers, actual_numbers)
+    )
+
+
+def compare_streams(label, expected_path, actual_path, rel_tol, abs_tol, max_mismatches, ignore=None):
+    """Streams both files line by line and returns the first `max_mismatches` differences."""
+    mismatches = []
+    with open(expected_path, "r", encoding="utf-8", errors="replace") as expected, \
+         open(actual_path, "r", encoding="utf-8", errors="replace") as actual:
+        for number, (e, a) in enumerate(itertools.zip_longest(expected, actual), start=1):
+            if e is None or a is None or not values_match(e, a, rel_tol, abs_tol, ignore):
+                mismatches.append(f"{label}:{number}: expected {e.rstrip() if e is not None else '<EOF>'!r}, "
+                                  f"got {a.rstrip() if a is not None else '<EOF>'!r}")
+                if len(mismatches) >= max_mismatches:
+                    break
+    return mismatches
+
+
+def output_files(run_dir):
+    """Files written below run_dir/output, sorted. Names often carry timestamps, so pairs are matched by order."""
+    root = os.path.join(run_dir, OUTPUT_SUBDIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(root) for name in names)
+
+
+class DifferentialChecker:
+    """
+    Runs the original C++ program and the translated Java program on the same inputs and compares
+    their stdout, exit codes and written output files.
+
+    Every argument set runs both programs concurrently on a shared pool. The C++ binary is built once
+    per source hash, and its reference outputs are cached by source, inputs and arguments, so
+    repeated translations of the same file only run the Java side.
+    """
+
+    def __init__(self, cache_dir, workers=None, rel_tol=1e-6, abs_tol=1e-9, run_timeout=30, max_mismatches=20, ignore_pattern=None):
+        self.cache_dir = cache_dir
+        self.ignore = re.compile(ignore_pattern) if ignore_pattern else None
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.run_timeout = run_timeout
+        self.max_mismatches = max_mismatches
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2, thread_name_prefix="diff")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def build_reference(self, cpp_filename, cpp_code, headers) -> str:
+        """Builds (or reuses) the C++ binary for this source and its headers; returns the binary path."""
+        source_key = self._hash(cpp_code, *itertools.chain.from_iterable(sorted(headers.items())))
+        binary = os.path.join(self.cache_dir, "bin", source_key)
+        if os.path.exists(binary):
+            return binary
+        os.makedirs(os.path.dirname(binary), exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as build_dir:
+            for name, content in headers.items():
+                with open(os.path.join(build_dir, os.path.basename(name)), "w", encoding="utf-8") as f:
+                    f.write(content)
+            source_path = os.path.join(build_dir, os.path.basename(cpp_filename))
+            with open(source_path, "w", encoding="utf-8") as f:
+                f.write(cpp_code)
+            built = os.path.join(build_dir, "reference")
+            result = subprocess.run(
+                ["g++", "-std=c++17", "-O2", "-o", built, source_path],
+                capture_output=True, text=True, timeout=120,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"C++ reference build failed:\n{result.stderr[-2000:]}")
+            os.replace(built, binary)
+        return binary
+
+    def _run(self, command, run_dir, input_files):
+        """Runs one program in a fresh directory holding the input files; stdout goes to a file."""
+        os.makedirs(os.path.join(run_dir, OUTPUT_SUBDIR), exist_ok=True)
+        for name, path in input_files.items():
+            shutil.copy(path, os.path.join(run_dir, os.path.basename(name)))
+        with open(os.path.join(run_dir, "stdout.txt"), "w", encoding="utf-8") as stdout:
+            try:
+                return subprocess.run(command, cwd=run_dir, stdout=stdout, stderr=subprocess.DEVNULL,
+                                      stdin=subprocess.DEVNULL, timeout=self.run_timeout).returncode
+            except subprocess.TimeoutExpired:
+                return None
+
+    def _reference_run(self, binary, input_files, args):
+        """Returns the directory with the cached C++ reference run for these inputs and arguments."""
+        input_hashes = []
+        for name, path in sorted(input_files.items()):
+            with open(path, "rb") as f:
+                input_hashes.append(self._hash(name, f.read()))
+        key = self._hash(os.path.basename(binary), *input_hashes, json.dumps(args))
+        ref_dir = os.path.join(self.cache_dir, "ref", key)
+        if os.path.exists(os.path.join(ref_dir, "returncode")):
+            return ref_dir
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        returncode = self._run([binary, *args], tmp_dir, input_files)
+        with open(os.path.join(tmp_dir, "returncode"), "w") as f:
+            f.write(str(returncode))
+        shutil.rmtree(ref_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(ref_dir), exist_ok=True)
+        os.replace(tmp_dir, ref_dir)
+        return ref_dir
+
+    def _compare(self, args, ref_dir, java_dir, java_returncode):
+        with open(os.path.join(ref_dir, "returncode")) as f:
+            raw = f.read().strip()
+        cpp_returncode = None if raw == "None" else int(raw)
+        mismatches = []
+        if cpp_returncode != java_returncode:
+            mismatches.append(f"exit code: expected {cpp_returncode}, got {java_returncode}")
+        mismatches += compare_streams("stdout", os.path.join(ref_dir, "stdout.txt"), os.path.join(java_dir, "stdout.txt"),
+                                      self.rel_tol, self.abs_tol, self.max_mismatches, self.ignore)
+        expected_files, actual_files = output_files(ref_dir), output_files(java_dir)
+        if len(expected_files) != len(actual_files):
+            mismatches.append(f"output files: expected {len(expected_files)}, got {len(actual_files)}")
+        for expected, actual in zip(expected_files, actual_files):
+            label = os.path.relpath(expected, ref_dir)
+            mismatches += compare_streams(label, expected, actual, self.rel_tol, self.abs_tol, self.max_mismatches, self.ignore)
+        return DiffResult(args=args, matched=not mismatches, cpp_returncode=cpp_returncode,
+                          java_returncode=java_returncode, mismatches=mismatches[:self.max_mismatches])
+
+    def check(self, cpp_filename, cpp_code, headers, java_classpath, java_main_class, input_files, cases):
+        """
+        Runs every argument set in `cases` through both programs and returns a DiffResult per case.
+        `input_files` ({name: path}) are copied into each run's working directory.
+        """
+        binary = self.build_reference(cpp_filename, cpp_code, headers)
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as java_root:
+            runs = []
+            for index, args in enumerate(cases):
+                java_dir = os.path.join(java_root, str(index))
+                reference = self._pool.submit(self._reference_run, binary, input_files, args)
+                java = self._pool.submit(self._run, ["java", "-cp", java_classpath, java_main_class, *args], java_dir, input_files)
+                runs.append((args, reference, java_dir, java))
+            return [self._compare(args, reference.result(), java_dir, java.result()) for args, reference, java_dir, java in runs]
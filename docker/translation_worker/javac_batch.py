@@ -0,0 +1,217 @@
+#######################################################################
+### Batching javac: compile many pending sources in one invocation ###
+#######################################################################
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+JAVAC_FLAGS = ["-Xlint:all", "--release", "17"]
+
+# Keep attributing and flow-analysing every file even after errors in another one,
+# and never cap the number of reported diagnostics across the batch
+BATCH_ONLY_FLAGS = ["-XDshould-stop.ifError=FLOW", "-Xmaxerrs", "100000", "-Xmaxwarns", "100000"]
+
+DIAGNOSTIC_START = re.compile(r"^(?P<path>.+?\.java):(?P<line>\d+): (?P<kind>error|warning): ")
+SUMMARY_LINE = re.compile(r"^\d+ (?:error|warning)s?$")
+# "error: invalid flag: ...", "Other.java:3: error: ..." or an "N errors" summary; not a path that contains "error"
+UNATTRIBUTED_ERROR = re.compile(r"^(?:error: |.+?:\d+: error: |\d+ errors?$)", re.MULTILINE)
+PACKAGE_DECLARATION = re.compile(r"^\s*package\s+([a-zA-Z0-9_.]+)\s*;", re.MULTILINE)
+
+
+def run_javac(java_file_paths: list[str], output_dir: str, extra_flags=(), timeout: int = 30) -> tuple[int, str]:
+    """Runs one javac process over all given files. Returns (return code, diagnostics output)."""
+    os.makedirs(output_dir, exist_ok=True)
+    compile_command = ["javac", *JAVAC_FLAGS, *extra_flags, "-d", output_dir, *java_file_paths]
+    logging.debug(f"Running compilation command: {' '.join(compile_command)}")
+    result = subprocess.run(compile_command, capture_output=True, text=True, check=False, timeout=timeout)
+    return result.returncode, result.stderr if result.stderr else result.stdout
+
+
+def split_diagnostics(output: str, java_file_paths: list[str]) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    Demultiplexes javac output into per-file diagnostic blocks.
+    Returns ({path: [diagnostic, ...]}, [diagnostics not attributable to any file]).
+    """
+    per_file = {path: [] for path in java_file_paths}
+    unattributed = []
+    current = None
+    for line in output.splitlines():
+        if SUMMARY_LINE.match(line.strip()):
+            current = None
+            continue
+        start = DIAGNOSTIC_START.match(line)
+        if start and start.group("path") in per_file:
+            current = [line]
+            per_file[start.group("path")].append(current)
+        elif current is not None and (line.startswith(" ") or not line.strip()):
+            current.append(line) # Source excerpt and caret lines belong to the diagnostic above
+        else:
+            current = [line]
+            unattributed.append(current)
+    return (
+        {path: ["\n".join(block) for block in blocks] for path, blocks in per_file.items()},
+        ["\n".join(block) for block in unattributed],
+    )
+
+
+def diagnostic_kind(diagnostic: str) -> str:
+    """Returns 'error' or 'warning' for a file diagnostic, '' for anything else."""
+    match = DIAGNOSTIC_START.match(diagnostic)
+    return match.group("kind") if match else ""
+
+
+def format_file_log(diagnostics: list[str]) -> str:
+    """Rebuilds a javac-style log for one file, including the error/warning summary lines."""
+    if not diagnostics:
+        return ""
+    errors = sum(1 for d in diagnostics if diagnostic_kind(d) == "error")
+    warnings = sum(1 for d in diagnostics if diagnostic_kind(d) == "warning")
+    summary = []
+    if errors:
+        summary.append(f"{errors} error{'s' if errors != 1 else ''}")
+    if warnings:
+        summary.append(f"{warnings} warning{'s' if warnings != 1 else ''}")
+    return "\n".join(diagnostics + summary) + "\n"
+
+
+def source_package(java_file_path: str) -> str:
+    """Returns the package declared in a Java source file ('' for the default package)."""
+    try:
+        with open(java_file_path, "r", encoding="utf-8") as f:
+            match = PACKAGE_DECLARATION.search(f.read())
+    except OSError:
+        return ""
+    return match.group(1) if match else ""
+
+
+def compile_batch(java_file_paths: list[str], work_root: str) -> dict[str, tuple[bool, str]]:
+    """
+    Compiles all files in a single javac invocation and returns {path: (success, log)}.
+    Each file has to live in its own package (see add_language_declaration), so classes never clash.
+    Falls back to per-file compilation if javac reports errors it cannot attribute to a file.
+    """
+    output_dir = tempfile.mkdtemp(prefix="batch_", dir=work_root)
+    try:
+        returncode, output = run_javac(java_file_paths, output_dir, BATCH_ONLY_FLAGS, timeout=30 + 2 * len(java_file_paths))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    per_file, unattributed = split_diagnostics(output, java_file_paths)
+    global_errors = [d for d in unattributed if UNATTRIBUTED_ERROR.search(d)]
+    files_with_errors = {path for path, blocks in per_file.items() if any(diagnostic_kind(b) == "error" for b in blocks)}
+
+    if global_errors or (returncode != 0 and not files_with_errors):
+        logging.warning(f"javac batch of {len(java_file_paths)} reported unattributed errors, compiling files separately.")
+        results = {}
+        for path in java_file_paths:
+            single_dir = tempfile.mkdtemp(prefix="single_", dir=work_root)
+            try:
+                rc, log = run_javac([path], single_dir)
+            finally:
+                shutil.rmtree(single_dir, ignore_errors=True)
+            results[path] = (rc == 0, log)
+        return results
+
+    # Notes such as "Note: /.../X.java uses unchecked or unsafe operations." go to the file they name;
+    # the rest concerns the batch as a whole and must not end up in another job's log
+    for note in unattributed:
+        named = [path for path in java_file_paths if path in note]
+        if len(named) == 1:
+            per_file[named[0]].append(note)
+        elif note.strip():
+            logging.debug(f"Dropping unattributed javac output of a batch: {note}")
+    return {
+        path: (path not in files_with_errors, format_file_log(per_file[path]))
+        for path in java_file_paths
+    }
+
+
+class _Pending:
+    def __init__(self, java_file_path):
+        self.java_file_path = java_file_path
+        self.package = source_package(java_file_path)
+        self.done = threading.Event()
+        self.result = (False, "Compilation did not run")
+
+
+class BatchCompiler:
+    """
+    Collects compile requests from the compile-stage threads for a short window and
+    compiles them together, so several jobs share one JVM start-up.
+
+    The first caller of a window becomes the leader: it waits until the window closes
+    (or the batch is full), runs javac once and hands every caller its own result.
+    """
+
+    def __init__(self, work_root: str, window_seconds: float = 0.05, max_batch_size: int = 32):
+        self.work_root = work_root
+        self.window_seconds = window_seconds
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending = []
+        self._condition = threading.Condition()
+
+    def compile(self, java_file_path: str) -> tuple[bool, str]:
+        """Blocks until the file has been compiled as part of a batch. Returns (success, log)."""
+        request = _Pending(os.path.abspath(java_file_path))
+        with self._condition:
+            self._pending.append(request)
+            is_leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify_all()
+            if is_leader:
+                deadline = time.monotonic() + self.window_seconds
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._pending = self._take_batch()
+
+        while is_leader and batch:
+            self._run(batch)
+            # Requests left over by _take_batch (package clashes, overflow) go in the next batch
+            with self._condition:
+                batch, self._pending = self._take_batch()
+        request.done.wait()
+        return request.result
+
+    def _take_batch(self):
+        """Splits off up to max_batch_size requests with distinct packages; the rest wait for the next batch."""
+        batch, rest, packages = [], [], set()
+        for request in self._pending:
+            if len(batch) < self.max_batch_size and request.package not in packages:
+                packages.add(request.package)
+                batch.append(request)
+            else:
+                rest.append(request)
+        return batch, rest
+
+    def _run(self, batch):
+        try:
+            os.makedirs(self.work_root, exist_ok=True)
+            started = time.monotonic()
+            results = compile_batch([r.java_file_path for r in batch], self.work_root)
+            logging.info(f"Compiled batch of {len(batch)} file(s) in {time.monotonic() - started:.2f}s.")
+            for request in batch:
+                request.result = results.get(request.java_file_path, request.result)
+        except subprocess.TimeoutExpired:
+            logging.error(f"Batch compilation of {len(batch)} file(s) timed out.")
+            for request in batch:
+                request.result = (False, "Compilation timed out")
+        except FileNotFoundError:
+            logging.error("Error: 'javac' command not found. Make sure JDK 17+ is installed and in PATH.")
+            for request in batch:
+                request.result = (False, "'javac' command not found.")
+        except Exception as e:
+            logging.error(f"Unexpected error during batch compilation: {e}", exc_info=True)
+            for request in batch:
+                request.result = (False, f"Unexpected compilation error: {str(e)}")
+        finally:
+            for request in batch:
+                request.done.set()
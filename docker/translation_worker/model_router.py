@@ -0,0 +1,149 @@
+##########################################################
+### Model routing by job size, difficulty and history ###
+##########################################################
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+from dataclasses import dataclass
+
+
+@dataclass
+class Route:
+    """Model and context size chosen for a job. `tier` indexes ModelRouter.tiers (small → large)."""
+    model: str
+    tier: int
+    num_ctx: int
+
+
+class AttemptHistory:
+    """
+    Per-file record of past attempt counts in SQLite, so it survives restarts.
+    Every record is a single upsert, so worker replicas sharing the state dir add up
+    instead of overwriting each other's snapshot.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS attempts ("
+            " name TEXT PRIMARY KEY,"
+            " jobs INTEGER NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " failures INTEGER NOT NULL)"
+        )
+        self._import_json(os.path.splitext(path)[0] + ".json")
+
+    def _import_json(self, legacy_path: str):
+        """Takes over the records of the former JSON file once; it is renamed afterwards."""
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not read attempt history {legacy_path}: {e}. Not importing it.")
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if os.path.exists(legacy_path): # Another replica may have imported it meanwhile
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO attempts (name, jobs, attempts, failures) VALUES (?, ?, ?, ?)",
+                        [(name, r.get("jobs", 0), r.get("attempts", 0), r.get("failures", 0)) for name, r in records.items()],
+                    )
+                    os.replace(legacy_path, f"{legacy_path}.imported")
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        logging.info(f"Imported attempt history of {len(records)} file(s) from {legacy_path}.")
+
+    def mean_attempts(self, name: str):
+        """Average compile attempts of past jobs for this file, or None if it was never translated."""
+        with self._lock:
+            row = self._db.execute("SELECT jobs, attempts FROM attempts WHERE name = ?", (name,)).fetchone()
+        if not row or not row[0]:
+            return None
+        return row[1] / row[0]
+
+    def record(self, name: str, attempts: int, success: bool):
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT INTO attempts (name, jobs, attempts, failures) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET jobs = jobs + 1, attempts = attempts + excluded.attempts, "
+                    "failures = failures + excluded.failures",
+                    (name, attempts, 0 if success else 1),
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not persist attempt history to {self.path}: {e}")
+
+
+class ModelRouter:
+    """
+    Picks a model and context size per job from cheap features.
+
+    Tiers run from small to large; unset tiers are skipped. Jobs start on the default
+    model, go down to the small one when they are short, have few headers, few special
+    C++ constructs and no history of needing retries, and go up to the large one when
+    earlier jobs for the same file needed many attempts. A running job moves one tier
+    up after `escalate_after` failed fixes on its current tier.
+    """
+
+    def __init__(self, default_model, small_model=None, large_model=None, max_ctx=32768, ctx_bucket=2048,
+                 small_max_tokens=4000, small_max_headers=1, small_max_patterns=1, large_min_history_attempts=4.0,
+                 escalate_after=3, history: AttemptHistory = None):
+        if not default_model:
+            raise ValueError("LLM_MODEL is not set: the router needs a default model (LLM_MODEL_SMALL and LLM_MODEL_LARGE are optional).")
+        self.tiers = [m for m in (small_model, default_model, large_model) if m]
+        self.default_tier = self.tiers.index(default_model)
+        self.max_ctx = max_ctx
+        self.ctx_bucket = ctx_bucket
+        self.small_max_tokens = small_max_tokens
+        self.small_max_headers = small_max_headers
+        self.small_max_patterns = small_max_patterns
+        self.large_min_history_attempts = large_min_history_attempts
+        self.escalate_after = escalate_after
+        self.history = history
+
+    def context_size(self, estimated_tokens: int) -> int:
+        """Rounds the estimate up to a bucket, so Ollama reuses a loaded runner instead of reloading for every size."""
+        buckets = max(1, math.ceil(estimated_tokens / self.ctx_bucket))
+        return min(buckets * self.ctx_bucket, self.max_ctx)
+
+    def route(self, name: str, estimated_tokens: int, header_count: int, pattern_count: int) -> Route:
+        tier = self.default_tier
+        past_attempts = self.history.mean_attempts(name) if self.history else None
+        has_small = self.default_tier > 0
+        has_large = self.default_tier < len(self.tiers) - 1
+
+        if has_large and past_attempts is not None and past_attempts >= self.large_min_history_attempts:
+            tier = self.default_tier + 1
+        elif (has_small
+              and estimated_tokens <= self.small_max_tokens
+              and header_count <= self.small_max_headers
+              and pattern_count <= self.small_max_patterns
+              and (past_attempts is None or past_attempts <= 1.5)):
+            tier = self.default_tier - 1
+
+        route = Route(model=self.tiers[tier], tier=tier, num_ctx=self.context_size(estimated_tokens))
+        logging.info(
+            f"Routing {name}: ~{estimated_tokens} tokens, {header_count} header(s), {pattern_count} hard C++ construct(s), "
+            f"past attempts {past_attempts if past_attempts is not None else 'n/a'} → {route.model} (num_ctx={route.num_ctx})"
+        )
+        return route
+
+    def escalate(self, tier: int, failed_fixes: int):
+        """Returns the next tier once `failed_fixes` on the current tier reach the threshold, else None."""
+        if failed_fixes >= self.escalate_after and tier < len(self.tiers) - 1:
+            return tier + 1
+        return None
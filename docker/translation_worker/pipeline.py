@@ -0,0 +1,151 @@
+######################################################################
+### Stage pipeline: LLM generation, javac compilation, fix requests ###
+######################################################################
+
+import itertools
+import logging
+import queue
+import threading
+
+# Stage names returned by stage handlers to route a job onwards
+GENERATE = "generate"
+COMPILE = "compile"
+FIX = "fix"
+DONE = "done"
+
+# Generation queue priorities: fix requests go first so jobs already in flight
+# finish before new ones take a GPU slot
+PRIORITY_FIX = 0
+PRIORITY_INITIAL = 1
+_PRIORITY_SHRINK = -1 # Scale-down takes effect at the next free slot, not after the backlog
+_PRIORITY_STOP = 99   # Shutdown lets the queued jobs finish first
+
+
+class StagePipeline:
+    """
+    Runs jobs through stages connected by queues, each stage with its own worker pool.
+
+    Every handler takes a job, mutates its attempt state and returns the name of the
+    next stage (GENERATE, COMPILE, FIX or DONE). While one job is compiling, another
+    job's prompt is already waiting in the generation queue, so the GPU and the CPU
+    work in parallel instead of taking turns.
+    """
+
+    def __init__(self, generate, compile, fix, finish, llm_workers=1, compile_workers=2, fix_workers=1, on_transition=None):
+        self._handlers = {GENERATE: generate, COMPILE: compile, FIX: fix}
+        self._finish = finish
+        self._on_transition = on_transition # Called with (job, next_stage) after every stage, e.g. to checkpoint
+        self._sequence = itertools.count()  # FIFO tie-breaker within a priority
+        self._generation_queue = queue.PriorityQueue()
+        self._compile_queue = queue.Queue()
+        self._fix_queue = queue.Queue()
+        self._pool_sizes = {GENERATE: llm_workers, COMPILE: compile_workers, FIX: fix_workers}
+        self._threads = []
+        self._thread_numbers = {stage: itertools.count() for stage in self._pool_sizes}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker threads of all stages."""
+        for stage, size in self._pool_sizes.items():
+            for _ in range(max(1, size)):
+                self._start_thread(stage)
+        logging.info(
+            f"Pipeline started: {self._pool_sizes[GENERATE]} LLM slot(s), "
+            f"{self._pool_sizes[COMPILE]} compile worker(s), {self._pool_sizes[FIX]} fix worker(s)."
+        )
+
+    def _start_thread(self, stage):
+        thread = threading.Thread(target=self._run_stage, args=(stage,),
+                                  name=f"{stage}-{next(self._thread_numbers[stage])}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _stop_one(self, stage, priority=_PRIORITY_STOP):
+        if stage == GENERATE:
+            self._generation_queue.put((priority, next(self._sequence), None))
+        elif stage == COMPILE:
+            self._compile_queue.put(None)
+        else:
+            self._fix_queue.put(None)
+
+    def stop(self):
+        """Signals all stage workers to exit after their current job."""
+        for stage, size in self._pool_sizes.items():
+            for _ in range(max(1, size)):
+                self._stop_one(stage)
+
+    def resize(self, stage, size):
+        """
+        Changes the worker count of a running stage. Extra workers start at once; surplus
+        LLM workers exit when they finish their current job, ahead of any queued job.
+        Compile and fix workers exit once the jobs queued ahead of them are taken.
+        """
+        size = max(1, size)
+        with self._lock:
+            current, self._pool_sizes[stage] = self._pool_sizes[stage], size
+        for _ in range(size - current):
+            self._start_thread(stage)
+        for _ in range(current - size):
+            self._stop_one(stage, _PRIORITY_SHRINK)
+
+    def size(self, stage) -> int:
+        with self._lock:
+            return self._pool_sizes[stage]
+
+    def submit(self, job, stage=GENERATE):
+        """Admits a new job into the pipeline at the given stage."""
+        with self._lock:
+            self._in_flight += 1
+        self._route(job, stage)
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def _route(self, job, stage):
+        if stage == GENERATE:
+            priority = PRIORITY_FIX if job.attempt > 0 else PRIORITY_INITIAL
+            self._generation_queue.put((priority, next(self._sequence), job))
+        elif stage == COMPILE:
+            self._compile_queue.put(job)
+        elif stage == FIX:
+            self._fix_queue.put(job)
+        else:
+            self._complete(job)
+
+    def _next_job(self, stage):
+        if stage == GENERATE:
+            return self._generation_queue.get()[2]
+        if stage == COMPILE:
+            return self._compile_queue.get()
+        return self._fix_queue.get()
+
+    def _run_stage(self, stage):
+        handler = self._handlers[stage]
+        while True:
+            job = self._next_job(stage)
+            if job is None:
+                break
+            try:
+                next_stage = handler(job)
+            except Exception as e:
+                logging.exception(f"Unhandled error in {stage} stage for job {getattr(job, 'file_id', '?')}: {e}")
+                job.error = e
+                next_stage = DONE
+            if self._on_transition:
+                try:
+                    self._on_transition(job, next_stage)
+                except Exception as e:
+                    logging.warning(f"Stage transition hook failed for job {getattr(job, 'file_id', '?')}: {e}")
+            self._route(job, next_stage)
+
+    def _complete(self, job):
+        try:
+            self._finish(job)
+        except Exception as e:
+            logging.exception(f"Error finalizing job {getattr(job, 'file_id', '?')}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
@@ -0,0 +1,129 @@
+############################################################
+### PMD static analysis next to javac, cached per source ###
+############################################################
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .compile_cache import source_hash
+
+
+@dataclass(frozen=True)
+class PmdResult:
+    findings: tuple      # "line N: [Rule] description", high severity only
+    seconds: float       # Time PMD ran, 0 for cache hits
+    cached: bool = False
+
+    def as_prompt(self) -> str:
+        return "\n".join(self.findings)
+
+
+def parse_report(report: str, max_priority: int) -> tuple:
+    """High-severity findings (priority 1 = highest) from PMD's JSON report, ordered by line."""
+    data = json.loads(report or "{}")
+    findings = []
+    for file in data.get("files", []):
+        for violation in file.get("violations", []):
+            if int(violation.get("priority", 5)) <= max_priority:
+                findings.append((int(violation.get("beginline", 0)), violation.get("rule", "?"),
+                                 " ".join(str(violation.get("description", "")).split())))
+    return tuple(f"line {line}: [{rule}] {description}" for line, rule, description in sorted(findings))
+
+
+class PmdAnalyzer:
+    """
+    Runs `pmd check` on translated sources and keeps the high-severity findings.
+
+    Results are memoized by source hash, so repeated code and recurring translations never
+    run PMD again. Each concurrent run owns one of `workers` slots: a work dir the source is
+    copied into (so a job's cleanup never pulls the file from under PMD) and an
+    incremental-analysis cache file (PMD's `--cache` is not safe for concurrent writers).
+    Submitted from the compile stage, PMD runs while javac compiles; only the time the
+    stage still waits for it afterwards is added latency.
+    """
+
+    def __init__(self, cache_dir: str, ruleset: str, max_priority: int = 2, timeout: float = 30,
+                 workers: int = 1, max_entries: int = 2048):
+        self.ruleset = ruleset
+        self.max_priority = max_priority
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._slots = queue.Queue()
+        for i in range(max(1, workers)):
+            os.makedirs(os.path.join(cache_dir, f"work-{i}"), exist_ok=True)
+            self._slots.put((os.path.join(cache_dir, f"work-{i}"), os.path.join(cache_dir, f"pmd-{i}.cache")))
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.hits = 0
+        self.run_seconds = 0.0
+        self.waited_seconds = 0.0
+        self.waits = 0
+
+    def analyze(self, code: str, filename: str):
+        """Returns a PmdResult for the source, or None if PMD could not analyze it (never cached)."""
+        key = source_hash(code)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return PmdResult(cached, 0.0, cached=True)
+
+        work_dir, cache_file = self._slots.get()
+        java_file_path = os.path.join(work_dir, filename)
+        started = time.perf_counter()
+        try:
+            with open(java_file_path, "w", encoding="utf-8") as f:
+                f.write(code)
+            result = subprocess.run(
+                ["pmd", "check", "--no-progress", "--no-fail-on-violation",
+                 "--cache", cache_file, "-R", self.ruleset, "-f", "json", "-d", java_file_path],
+                capture_output=True, text=True, timeout=self.timeout,
+            )
+            findings = parse_report(result.stdout, self.max_priority) if result.returncode == 0 else None
+            if findings is None:
+                logging.warning(f"PMD failed on {filename} (exit {result.returncode}): {result.stderr.strip()[:500]}")
+        except subprocess.TimeoutExpired:
+            logging.warning(f"PMD analysis of {filename} timed out after {self.timeout}s.")
+            findings = None
+        except (OSError, ValueError) as e:
+            logging.warning(f"PMD analysis of {filename} failed: {e}")
+            findings = None
+        finally:
+            try:
+                os.remove(java_file_path)
+            except OSError:
+                pass
+            self._slots.put((work_dir, cache_file))
+        seconds = time.perf_counter() - started
+
+        with self._lock:
+            self.runs += 1
+            self.run_seconds += seconds
+            if findings is not None:
+                self._results[key] = findings
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return PmdResult(findings, seconds) if findings is not None else None
+
+    def record_wait(self, seconds: float):
+        """Time a compile stage spent waiting for PMD after javac returned."""
+        with self._lock:
+            self.waits += 1
+            self.waited_seconds += seconds
+
+    def summary(self) -> str:
+        with self._lock:
+            mean_run = self.run_seconds / self.runs if self.runs else 0.0
+            mean_wait = self.waited_seconds / self.waits if self.waits else 0.0
+            return (f"{self.runs} run(s) at {mean_run:.2f}s, {self.hits} cache hit(s), "
+                    f"{mean_wait:.2f}s added per failed attempt on average")
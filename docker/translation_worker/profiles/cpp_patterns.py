@@ -1,18 +1,299 @@
+import hashlib
 import re
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# --- Tokenizer ---
+# One master pattern, applied once over the source. Comments are dropped, string and
+# character literals collapse to placeholder tokens, so no rule can match inside them.
+# Whitespace stops after the last newline of a run, so a directive is seen at the start of
+# its line even when indented ("  #include <vector>").
+_TOKEN = re.compile(r"""
+    (?P<directive>^[ \t]*\#[ \t]*(?P<dname>\w+)(?P<drest>(?:[^\n\\]|\\.|\\\n)*))
+  | (?P<ws>\s*\n|[ \t\f\v\r]+)
+  | (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*(?:[^*]|\*(?!/))*(?:\*/)?)
+  | (?P<raw_string>(?:u8|u|U|L)?R"(?P<delim>[^()\\\s]{0,16})\((?:.|\n)*?\)(?P=delim)")
+  | (?P<string>(?:u8|u|U|L)?"(?:[^"\\\n]|\\.)*"?)
+  | (?P<char>(?:u8|u|U|L)?'(?:[^'\\\n]|\\.)*'?)
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.'])*)
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<op>::|->|\+\+|--|<<=|>>=|\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<|>>|<=|>=|==|!=|&&|\|\||\.\.\.|[-+*/%&|^!~=<>?:;,.(){}\[\]\#])
+  | (?P<other>.)
+""", re.VERBOSE | re.MULTILINE)
+
+_INCLUDE_TARGET = re.compile(r"[<\"]([^>\"]+)[>\"]")
+
+STRING_TOKEN = '""'
+CHAR_TOKEN = "''"
+
+
+def tokenize(cpp_code: str) -> list[str]:
+    """
+    Splits C++ source into tokens in a single linear scan.
+    Preprocessor directives become '#name' (an '#include' is followed by a '<header>' token).
+    """
+    tokens = []
+    append = tokens.append
+    for match in _TOKEN.finditer(cpp_code):
+        kind = match.lastgroup
+        if kind in ("ws", "line_comment", "block_comment"):
+            continue
+        if kind in ("string", "raw_string"):
+            append(STRING_TOKEN)
+        elif kind == "char":
+            append(CHAR_TOKEN)
+        elif kind == "directive":
+            name = match.group("dname")
+            append("#" + name)
+            if name == "include":
+                target = _INCLUDE_TARGET.search(match.group("drest"))
+                if target:
+                    append(f"<{target.group(1)}>")
+        else:
+            append(match.group())
+    return tokens
+
+
+# --- Rule Registry ---
+@dataclass(frozen=True)
+class Rule:
+    """A C++ construct to look for. `triggers` are the tokens at which `matches(tokens, i)` is evaluated."""
+    name: str
+    triggers: tuple
+    hints: tuple = ()
+    hard: bool = False  # Constructs without a direct Java equivalent, used as difficulty feature
+    matches: object = None
+
+    def applies(self, tokens, i) -> bool:
+        return self.matches is None or self.matches(tokens, i)
+
+
+def _next_is(*expected):
+    return lambda tokens, i: tokens[i + 1:i + 1 + len(expected)] == list(expected)
+
+def _next_in(options):
+    return lambda tokens, i: i + 1 < len(tokens) and tokens[i + 1] in options
+
+def _prev_is(expected):
+    return lambda tokens, i: i > 0 and tokens[i - 1] == expected
+
+def _is_cli_main(tokens, i):
+    # main ( int argc , char * argv [ ] )  or  main ( int argc , char * * argv )
+    window = tokens[i + 1:i + 11]
+    return window[:4] == ["(", "int", "argc", ","] and (
+        window[4:10] == ["char", "*", "argv", "[", "]", ")"] or window[4:9] == ["char", "*", "*", "argv", ")"]
+    )
+
+def _is_destructor(tokens, i):
+    return i + 2 < len(tokens) and tokens[i + 1].isidentifier() and tokens[i + 2] == "("
+
+_TYPE_KEYWORDS = {"void", "bool", "char", "char8_t", "char16_t", "char32_t", "wchar_t", "short", "int", "long",
+                  "float", "double", "signed", "unsigned", "auto"}
+_DECLARATION_KEYWORDS = _TYPE_KEYWORDS | {"const", "volatile", "static", "extern", "mutable", "inline", "constexpr",
+                                          "struct", "class", "union", "enum", "typename", "virtual", "explicit", "friend",
+                                          "register", "thread_local"}
+_KEYWORDS = _DECLARATION_KEYWORDS | {
+    "alignas", "alignof", "and", "asm", "break", "case", "catch", "co_await", "co_return", "co_yield", "concept",
+    "const_cast", "consteval", "constinit", "continue", "decltype", "default", "delete", "do", "dynamic_cast", "else",
+    "export", "false", "for", "goto", "if", "namespace", "new", "noexcept", "not", "nullptr", "operator", "or",
+    "private", "protected", "public", "reinterpret_cast", "requires", "return", "sizeof", "static_assert",
+    "static_cast", "switch", "template", "this", "throw", "true", "try", "typedef", "typeid", "using", "while",
+}
+_STATEMENT_START = {";", "{", "}"}
+_ACCESS_SPECIFIERS = {"public", "private", "protected"}
+
+
+def _is_type_name(token) -> bool:
+    return token == ">" or (token.isidentifier() and (token not in _KEYWORDS or token in _TYPE_KEYWORDS))
+
+def _opens_parameter_list(tokens, p) -> bool:
+    # name ( ...  preceded by a return type:  Type name (  /  Type Class :: name (  /  explicit Name (
+    if p < 2 or not tokens[p - 1].isidentifier() or tokens[p - 1] in _KEYWORDS:
+        return False
+    before = tokens[p - 2]
+    if before == "::":
+        return p >= 4 and (_is_type_name(tokens[p - 4]) or tokens[p - 4] in ("*", "&"))
+    return _is_type_name(before) or before in ("*", "&", "explicit", "inline", "virtual", "static", "constexpr")
+
+def _opening_bracket(tokens, i) -> int:
+    # Walks back from the ',' at i to the bracket that opened the list, -1 if there is none in this statement
+    depth = 0
+    for p in range(i - 1, max(-1, i - 200), -1):
+        token = tokens[p]
+        if token in (")", ">"):
+            depth += 1
+        elif token in ("(", "<"):
+            if depth == 0:
+                return p
+            depth -= 1
+        elif token in _STATEMENT_START:
+            return -1
+    return -1
+
+def _is_main_argv(tokens, i, opener) -> bool:
+    # main's char* argv[] / char** argv is covered by cli_main
+    p = i + 1
+    while p < len(tokens) and tokens[p] in ("*", "const"):
+        p += 1
+    return p < len(tokens) and tokens[p] == "argv" and opener >= 1 and tokens[opener - 1] == "main"
+
+def _is_pointer_declaration(tokens, i):
+    # Type * name  /  Type * const name  /  f(Type * name, ...), but not the multiplication a * b inside expressions
+    if i == 0 or i + 1 >= len(tokens):
+        return False
+    before, after = tokens[i - 1], tokens[i + 1]
+    if not _is_type_name(before):
+        return False
+    context = tokens[i - 2] if i >= 2 else ";"
+    opener = i - 2 if context in ("(", "<") else _opening_bracket(tokens, i - 2) if context == "," else -1
+    if after in (">", ","):
+        # Template argument, e.g. vector<Node*> or map<int, Node*>; a comparison i < n * m has a name after the '*'
+        return opener >= 0 and tokens[opener] == "<"
+    if not (after in ("*", "const") or (after.isidentifier() and after not in _KEYWORDS)):
+        return False
+    if context in _STATEMENT_START or context in _DECLARATION_KEYWORDS or context == "::":
+        return True
+    if context == ":":
+        return i >= 3 and tokens[i - 3] in _ACCESS_SPECIFIERS
+    if context in ("(", ","):
+        if opener < 0 or tokens[opener] != "(" or not _opens_parameter_list(tokens, opener):
+            return False
+        return not _is_main_argv(tokens, i, opener)
+    # Two names in a row only start a declaration when the first is a type, e.g. std::string * s is caught by "::"
+    return context.isidentifier() and context not in _KEYWORDS
+
+_OPERATOR_SYMBOLS = {"+", "-", "*", "/", "%", "==", "!=", "<", ">", "<=", ">=", "<<", ">>", "=", "[", "(", "++", "--",
+                     "+=", "-=", "&&", "||", "!", "->", "bool", "double", "int"}
+_CONTAINERS = ("vector", "map", "unordered_map", "set", "unordered_set", "list", "deque", "array", "pair", "stack", "queue", "priority_queue", "tuple")
+_SMART_POINTERS = ("unique_ptr", "shared_ptr", "weak_ptr", "make_unique", "make_shared", "lock_guard", "unique_lock", "scoped_lock")
+
+RULES = (
+    Rule(
+        name="cli_main",
+        triggers=("main",),
+        matches=_is_cli_main,
+        hints=(
+            "- The program uses 'main(int argc, char* argv[])'. Make it possible to use CLI arguments similiarly in Java.",
+            "- Preserve the original CLI flag parsing logic, including default values and usage fallback behavior.",
+        ),
+    ),
+    Rule(
+        name="templates",
+        triggers=("template",),
+        matches=_next_is("<"),
+        hard=True,
+        hints=("- The code uses templates. Translate function templates using method overloading or generic methods, and class templates using Java generics.",),
+    ),
+    Rule(
+        name="operator_overloading",
+        triggers=("operator",),
+        matches=_next_in(_OPERATOR_SYMBOLS),
+        hard=True,
+        hints=("- The code overloads operators. Replace them with named methods (e.g. add, equals, compareTo, toString) and update every call site.",),
+    ),
+    Rule(
+        name="raw_pointers",
+        triggers=("new", "delete", "*", "nullptr", "NULL"), # Not '->': iterators and smart pointers use it too
+        matches=lambda tokens, i: tokens[i] != "*" or _is_pointer_declaration(tokens, i),
+        hard=True,
+        hints=("- The code uses raw pointers or new/delete. Use object references, rely on garbage collection and represent null pointers with null.",),
+    ),
+    Rule(
+        name="raii",
+        triggers=("~",) + _SMART_POINTERS,
+        matches=lambda tokens, i: tokens[i] != "~" or _is_destructor(tokens, i),
+        hard=True,
+        hints=("- The code relies on destructors or RAII wrappers for cleanup. Use try-with-resources with AutoCloseable, or explicit close methods.",),
+    ),
+    Rule(
+        name="iostream",
+        triggers=("<iostream>", "cout", "cerr", "cin", "endl"),
+        hints=("- The code uses std::cout/std::cerr/std::cin. Use System.out, System.err and a Scanner or BufferedReader, producing identical output text.",),
+    ),
+    Rule(
+        name="iomanip",
+        triggers=("<iomanip>", "setprecision", "setw", "fixed"),
+        matches=lambda tokens, i: tokens[i] != "fixed" or _prev_is("<<")(tokens, i) or _prev_is("::")(tokens, i),
+        hints=("- The code formats numbers with iomanip (setprecision, setw, fixed). Reproduce the exact formatting with String.format or printf.",),
+    ),
+    Rule(
+        name="fstream",
+        triggers=("<fstream>", "ifstream", "ofstream", "fstream"),
+        hints=("- The code reads or writes files with fstream. Use java.nio.file.Files, BufferedReader or BufferedWriter and keep the same behaviour when a file cannot be opened.",),
+    ),
+    Rule(
+        name="stl_containers",
+        triggers=_CONTAINERS,
+        matches=lambda tokens, i: _prev_is("::")(tokens, i) or _next_is("<")(tokens, i),
+        hints=("- The code uses STL containers. Map std::vector to ArrayList, std::map to TreeMap (keeps key order), std::unordered_map to HashMap, std::set to TreeSet and std::pair to a small record or class.",),
+    ),
+    Rule(
+        name="macros",
+        triggers=("#define",),
+        hard=True,
+        hints=("- The code defines preprocessor macros. Turn constant macros into static final fields and function-like macros into static methods.",),
+    ),
+)
+
+# Token → rules evaluated at that token, so one pass over the tokens serves every rule
+_DISPATCH = {}
+for _rule in RULES:
+    for _trigger in _rule.triggers:
+        _DISPATCH.setdefault(_trigger, []).append(_rule)
+
+
+def _analyze(cpp_code: str) -> dict[str, int]:
+    tokens = tokenize(cpp_code)
+    counts = {rule.name: 0 for rule in RULES}
+    dispatch = _DISPATCH
+    for i, token in enumerate(tokens):
+        rules = dispatch.get(token)
+        if rules:
+            for rule in rules:
+                if rule.applies(tokens, i):
+                    counts[rule.name] += 1
+    counts["tokens"] = len(tokens)
+    counts["lines"] = cpp_code.count("\n") + 1
+    counts["hard_constructs"] = sum(1 for rule in RULES if rule.hard and counts[rule.name])
+    return counts
+
+
+# --- Memoization by source hash ---
+_CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def extract_cpp_features(cpp_code: str) -> dict[str, int]:
+    """
+    Numeric features of the C++ source: occurrence count per rule, token and line counts and
+    'hard_constructs' (how many constructs without a direct Java equivalent appear).
+    Results are memoized by source hash.
+    """
+    key = hashlib.sha256(cpp_code.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        features = _cache.get(key)
+        if features is not None:
+            _cache.move_to_end(key)
+            return dict(features)
+    features = _analyze(cpp_code)
+    with _cache_lock:
+        _cache[key] = features
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dict(features)
+
 
 def detect_cpp_patterns(cpp_code: str) -> list[str]:
     """
     Provides C++ hints for idiomatic Java 17+ translation.
     """
+    features = extract_cpp_features(cpp_code)
     hints = []
-    
-    # Detect use of classic CLI signature
-    if re.search(r'main\s*\(\s*int\s+argc\s*,\s*char\s*\*\s*argv\s*\[\s*\]\s*\)', cpp_code):
-        hints.append(
-            "- The program uses 'main(int argc, char* argv[])'. Make it possible to use CLI arguments similiarly in Java."
-        )
-        hints.append(
-            "- Preserve the original CLI flag parsing logic, including default values and usage fallback behavior."
-        )
-        
+    for rule in RULES:
+        if features[rule.name]:
+            hints.extend(rule.hints)
     return hints
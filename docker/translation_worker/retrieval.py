@@ -0,0 +1,222 @@
+#####################################################################
+### Few-shot retrieval: BM25 over past successful C++ → Java pairs ###
+#####################################################################
+
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+
+from common.postprocessing import leading_comment
+
+from .profiles.cpp_patterns import tokenize
+
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# Multi-character operators say more about a program's style than its punctuation
+_OPERATOR_TERMS = {"<<", ">>", "::", "->", "++", "--", "&&", "||", "==", "!=", "<=", ">="}
+
+
+def terms(cpp_code: str) -> Counter:
+    """
+    Normalized C++ terms for lexical similarity: identifiers and keywords (also split into
+    lowercase camelCase/snake_case parts, so `interestRate` meets `interest_rate`), headers,
+    directives and multi-character operators. Comments and literal contents are ignored.
+    """
+    counts = Counter()
+    for token in tokenize(cpp_code):
+        first = token[0]
+        if first.isalpha() or first == "_":
+            lowered = token.lower()
+            counts[lowered] += 1
+            parts = _SUBWORD.findall(token)
+            if len(parts) > 1:
+                counts.update(part.lower() for part in parts)
+        elif first in "#<" and len(token) > 1 and token not in _OPERATOR_TERMS:
+            counts[token] += 1 # '#define', '<vector>'
+        elif token in _OPERATOR_TERMS:
+            counts[token] += 1
+    return counts
+
+
+def compact(code: str) -> str:
+    """
+    Drops comment-only and blank lines and trailing whitespace, so examples cost fewer tokens.
+    Block comments are tracked across lines, so a line starting with `*` is only a comment
+    inside one (`    * b;` and `*p = 3;` are code).
+    """
+    kept = []
+    in_comment = False
+    for line in code.splitlines():
+        if in_comment or "/" in line:
+            _, rest, in_comment = leading_comment(line, in_comment)
+        else:
+            rest = line
+        if rest.strip():
+            kept.append(line.rstrip())
+    return "\n".join(kept)
+
+
+def example_hash(cpp_code: str) -> str:
+    """Key of a pair: hash of the compacted C++ source, so comment-only edits map to the same pair."""
+    return hashlib.sha256(compact(cpp_code).encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Example:
+    source_hash: str
+    name: str
+    cpp_code: str
+    java_code: str
+    attempts: int
+    score: float = 0.0
+
+
+class ExampleIndex:
+    """
+    BM25 index of C++ → Java pairs that compiled, persisted in SQLite.
+
+    The inverted index lives in memory (rebuilt from SQLite at start-up, updated on every
+    `add`), so a lookup is a pass over the postings of the query's terms, no GPU or network.
+    Pairs are stored compacted and keyed by the hash of the C++ source; a re-translation of
+    the same source replaces its pair when it needed fewer attempts.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, path: str, max_examples: int = 5000):
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            " source_hash TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " cpp_code TEXT NOT NULL,"
+            " java_code TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " terms TEXT NOT NULL,"
+            " added_at REAL NOT NULL)"
+        )
+        self._examples = {}   # source_hash -> Example
+        self._lengths = {}    # source_hash -> number of terms
+        self._postings = {}   # term -> {source_hash: term frequency}
+        self._total_length = 0
+        for source_hash, name, cpp_code, java_code, attempts, term_counts in self._db.execute(
+            "SELECT source_hash, name, cpp_code, java_code, attempts, terms FROM examples"
+        ):
+            self._index(Example(source_hash, name, cpp_code, java_code, attempts), Counter(json.loads(term_counts)))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._examples)
+
+    def _index(self, example: Example, term_counts: Counter):
+        self._examples[example.source_hash] = example
+        length = sum(term_counts.values())
+        self._lengths[example.source_hash] = length
+        self._total_length += length
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[example.source_hash] = count
+
+    def _unindex(self, source_hash: str):
+        example = self._examples.pop(source_hash)
+        self._total_length -= self._lengths.pop(source_hash)
+        for term in terms(example.cpp_code):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(source_hash, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, name: str, cpp_code: str, java_code: str, attempts: int) -> bool:
+        """Adds a pair that compiled. Returns False if an equal or better pair of the same source exists."""
+        source_hash = example_hash(cpp_code)
+        cpp_code, java_code = compact(cpp_code), compact(java_code)
+        term_counts = terms(cpp_code)
+        if not term_counts:
+            return False
+        with self._lock:
+            existing = self._examples.get(source_hash)
+            if existing is not None:
+                if existing.attempts <= attempts:
+                    return False
+                self._unindex(source_hash)
+            self._db.execute(
+                "INSERT OR REPLACE INTO examples (source_hash, name, cpp_code, java_code, attempts, terms, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source_hash, name, cpp_code, java_code, attempts, json.dumps(term_counts), time.time()),
+            )
+            self._index(Example(source_hash, name, cpp_code, java_code, attempts), term_counts)
+            if len(self._examples) > self.max_examples:
+                self._evict_oldest()
+        return True
+
+    def _evict_oldest(self):
+        rows = self._db.execute(
+            "SELECT source_hash FROM examples ORDER BY added_at LIMIT ?", (len(self._examples) - self.max_examples,)
+        ).fetchall()
+        for (source_hash,) in rows:
+            self._db.execute("DELETE FROM examples WHERE source_hash = ?", (source_hash,))
+            if source_hash in self._examples:
+                self._unindex(source_hash)
+
+    def search(self, cpp_code: str, k: int = 3, exclude: frozenset = frozenset()) -> list:
+        """Top-k pairs by BM25 score against the C++ source, best first. `exclude` holds source hashes to skip."""
+        query = terms(cpp_code)
+        with self._lock:
+            count = len(self._examples)
+            if not count or not query:
+                return []
+            average_length = self._total_length / count
+            scores = Counter()
+            for term in query:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for source_hash, frequency in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._lengths[source_hash] / average_length)
+                    scores[source_hash] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+            ranked = [(h, s) for h, s in scores.most_common() if h not in exclude][:k]
+            return [replace(self._examples[h], score=round(s, 3)) for h, s in ranked]
+
+    def select(self, cpp_code: str, k: int, token_budget: int, estimate, min_score: float = 0.0,
+               exclude: frozenset = frozenset()) -> list:
+        """
+        The most similar pairs (at most k) that fit into `token_budget`, measured with `estimate`
+        on their prompt text. Pairs too large for the remaining budget are skipped, not truncated.
+        """
+        selected, used = [], 0
+        for example in self.search(cpp_code, k=k * 3, exclude=exclude):
+            if len(selected) == k or example.score < min_score:
+                break
+            cost = estimate(_example_text(len(selected) + 1, example))
+            if used + cost > token_budget:
+                continue
+            selected.append(example)
+            used += cost
+        return selected
+
+
+def _example_text(number: int, example: Example) -> str:
+    return f"\n--- Example {number}: {example.name} ---\nC++:\n{example.cpp_code}\n\nJava:\n{example.java_code}\n"
+
+
+def few_shot_section(examples: list) -> str:
+    """Prompt section presenting the selected pairs, empty without examples."""
+    if not examples:
+        return ""
+    return (
+        "\n\n===== EXAMPLES OF EARLIER TRANSLATIONS THAT COMPILED =====\n"
+        "Similar C++ files and their working Java translations. Follow the same conventions "
+        "(library replacements, I/O, class layout), but translate only the C++ source file above.\n"
+        + "".join(_example_text(number, example) for number, example in enumerate(examples, start=1))
+    )
+
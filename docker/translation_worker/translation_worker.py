@@ -7,16 +7,38 @@ import json
 import subprocess
 import logging
 import shutil
-import stringcase
-import wordninja
-import sys
+import socket
+import threading
 
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Optional
 from dotenv import load_dotenv
 
+from common.readiness import wait_for_model_ready
+from common.startup import StartupTimer
+from common.postprocessing import extract_code, normalize_java
+from common.queues import TRANSLATION_QUEUE, declare_retry_topology, publish_retry, park, describe
+from common.output_store import OutputStore, ResultRecord, content_hash
+from common.scaling import read_scaling
+from common.profiling import start_profiling_server
+from .pipeline import StagePipeline, GENERATE, COMPILE, FIX, DONE
+from .javac_batch import BatchCompiler, JAVAC_FLAGS
+from .compile_cache import CompileCache, source_hash
+from .model_router import ModelRouter, AttemptHistory
+from .differential import DifferentialChecker
+from .chunking import scan_declarations, plan_chunks, signature_summary, preamble_text, stitch
+from .profiles.cpp_patterns import detect_cpp_patterns, extract_cpp_features
+from .checkpoints import CheckpointStore
+from .retrieval import ExampleIndex, few_shot_section
+from .pmd_analysis import PmdAnalyzer
+
 load_dotenv()
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+startup = StartupTimer("translation_worker")
 
 # --- Configuration ---
 SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT")
@@ -24,16 +46,56 @@ MODEL_NAME = os.getenv("LLM_MODEL")
 MAX_RETRIES = int(os.getenv("MAX_TRANSLATION_RETRIES", 5))
 UNLOAD_AFTER_JOBS = int(os.getenv("UNLOAD_AFTER_JOBS", 5))
 MAX_ALLOWED_TOKENS = int(os.getenv("MAX_ALLOWED_TOKENS"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", 1))                              # Concurrent LLM requests, match OLLAMA_NUM_PARALLEL
+COMPILE_WORKERS = int(os.getenv("COMPILE_WORKERS", os.cpu_count() or 2))   # Concurrent javac processes
+MAX_INFLIGHT_JOBS = int(os.getenv("MAX_INFLIGHT_JOBS", LLM_WORKERS * 2))   # Jobs taken from the queue at once, keeps the GPU busy
+COMPILE_BATCH_SIZE = int(os.getenv("COMPILE_BATCH_SIZE", 32))              # Max sources per javac invocation, 1 disables batching
+COMPILE_BATCH_WINDOW_MS = int(os.getenv("COMPILE_BATCH_WINDOW_MS", 50))     # How long a batch waits for more sources
+COMPILE_CACHE_SIZE = int(os.getenv("COMPILE_CACHE_SIZE", 2048))             # Memoized compile results, 0 disables the cache
+MAX_REPEAT_ESCALATIONS = int(os.getenv("MAX_REPEAT_ESCALATIONS", 2))       # Re-requests at a higher temperature when the LLM repeats itself
+TEMPERATURE_STEP = float(os.getenv("TEMPERATURE_STEP", 0.3))
+MODEL_READY_TIMEOUT = int(os.getenv("MODEL_READY_TIMEOUT", 900))           # Seconds to wait for the preloader before consuming
+SMALL_MODEL_NAME = os.getenv("LLM_MODEL_SMALL")                             # Optional, used for short and simple jobs
+LARGE_MODEL_NAME = os.getenv("LLM_MODEL_LARGE")                             # Optional, used for hard jobs and escalation
+ROUTER_SMALL_MAX_TOKENS = int(os.getenv("ROUTER_SMALL_MAX_TOKENS", 4000))  # Largest prompt still routed to the small model
+ROUTER_ESCALATE_AFTER = int(os.getenv("ROUTER_ESCALATE_AFTER", 3))         # Failed fixes on one model before moving to a larger one
+DIFF_TESTING_ENABLED = os.getenv("DIFF_TESTING_ENABLED", "true").lower() == "true" # Compare C++ and Java behaviour when inputs are sent
+DIFF_REL_TOLERANCE = float(os.getenv("DIFF_REL_TOLERANCE", 1e-6))
+DIFF_ABS_TOLERANCE = float(os.getenv("DIFF_ABS_TOLERANCE", 1e-9))
+DIFF_IGNORE_PATTERN = os.getenv("DIFF_IGNORE_PATTERN", r"\d{8}_\d{4}_\d+")  # Masked before comparing, default: output file timestamps
+CHUNKING_ENABLED = os.getenv("CHUNKING_ENABLED", "true").lower() == "true" # Translate large files in parts by top-level declaration
+CHUNK_THRESHOLD_TOKENS = int(os.getenv("CHUNK_THRESHOLD_TOKENS", 12000))   # Prompts above this estimate are chunked
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 4000))                # Target C++ size of one chunk
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", LLM_WORKERS))               # Chunks of one job translated concurrently
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", 72)) # Checkpoints of jobs never redelivered are pruned after this
+RETRY_DELAYS_MS = [int(d) for d in os.getenv("RETRY_DELAYS_MS", "10000,60000,300000").split(",") if d.strip()] # Backoff per retry of a transient failure
+OUTPUT_KEEP_VERSIONS = int(os.getenv("OUTPUT_KEEP_VERSIONS", 20))          # Result versions kept per class name, 0 keeps all
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true" # Add similar past translations to the prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 2))                     # Examples per prompt
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 3000))     # Max estimated tokens spent on examples
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", 0))           # BM25 score below which an example is not used
+PMD_ENABLED = os.getenv("PMD_ENABLED", "false").lower() == "true"          # Needs an image built with INSTALL_PMD=true
+PMD_RULESET = os.getenv("PMD_RULESET", "rulesets/java/quickstart.xml")
+PMD_MAX_PRIORITY = int(os.getenv("PMD_MAX_PRIORITY", 2))                    # Findings up to this priority reach the fix prompt (1 = highest)
+PMD_TIMEOUT = float(os.getenv("PMD_TIMEOUT", 30))                           # Seconds per PMD run
+PMD_WORKERS = int(os.getenv("PMD_WORKERS", 1))                              # Concurrent PMD processes
+PMD_MAX_FINDINGS = int(os.getenv("PMD_MAX_FINDINGS", 10))                   # Findings per fix prompt
+WORKER_ID = os.getenv("WORKER_ID") or socket.gethostname()                  # Separates the temp dirs of replicas sharing the volume
+SCALING_POLL_SECONDS = float(os.getenv("SCALING_POLL_SECONDS", 10))        # How often the autoscaler's LLM slot setting is checked
 
 UPLOAD_DIR = "/fastapi/uploads/"
-TEMP_DIR = "/translation_worker/temp/"
+TEMP_ROOT = "/translation_worker/temp/"
+TEMP_DIR = os.path.join(TEMP_ROOT, WORKER_ID, "")
+STATE_DIR = "/translation_worker/state/"
 TRANSLATED_DIR = "/output/"
 OLLAMA_URL = "http://ollama:11434/api/generate"
+PROMPT_OVERHEAD_TOKENS = 1500 # Guidelines and hints around the source in the initial prompt
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(TRANSLATED_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
+os.makedirs(STATE_DIR, exist_ok=True)
 
 def connect_to_rabbitmq():
     """Connects to RabbitMQ with retries."""
@@ -51,349 +113,674 @@ def connect_to_rabbitmq():
     logging.error("Failed to connect to RabbitMQ after multiple retries.")
     raise Exception("Failed to connect to RabbitMQ after multiple retries.")
 
-# --- Core Translation Logic ---
-def translate_code(file_id, original_filename, custom_prompt=None, headers=None, cpp_test_file=None):
-    headers = headers or {}
-    """ Translates a C++ file to Java, attempting compilation and using an LLM
-    to iteratively fix errors up to MAX_RETRIES times. Notifies test worker
-    on completion (success or failure). """
+# --- Job State ---
+@dataclass
+class TranslationJob:
+    """Attempt state of one translation job, carried from stage to stage through the pipeline."""
+    file_id: str
+    original_filename: str
+    custom_prompt: Optional[str] = None
+    headers: dict = field(default_factory=dict)
+    cpp_test_file: Optional[str] = None
+    input_files: dict = field(default_factory=dict)  # Uploaded program inputs {name: path} for differential testing
+    diff_cases: list = field(default_factory=list)   # Argument lists to run both programs with
+    on_done: Optional[Callable[["TranslationJob"], None]] = None # Called once the job has been finalized (e.g. to ACK)
+
+    pascal_case_name: str = ""
+    cpp_file_path: str = ""                          # Sent by the API as cpp_path, in the job's own upload dir
+    work_dir: str = ""                  # Per-job temp dir, so concurrent jobs never share files
+    cpp_code: str = ""
+    prompt: str = ""                    # Pending prompt for the generation stage
+    chunk_prompts: list = field(default_factory=list) # Initial translation split into parts, [(prompt, num_ctx)]
+    estimated_tokens: int = 0
+    model: str = ""
+    tier: int = 0                       # Index into router.tiers
+    tier_started_attempt: int = 1       # First attempt compiled with code from the current model
+    num_ctx: int = 0
+    attempt: int = 0                    # Number of compilation attempts made so far
+    current_java_code: str = ""
+    code_with_declaration: str = ""
+    sanitized_log: str = ""
+    pmd_findings: str = ""              # High-severity PMD findings of the last compiled code
+    previous_sanitized_log: str = ""
+    temperature: float = 0.0
+    seen_code_hashes: set = field(default_factory=set) # Hashes of every code version the LLM returned for this job
+    repeat_escalations: int = 0
+    success: bool = False
+    output_file_path: Optional[str] = None
+    error: Optional[Exception] = None
+    diff_results: list = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    examples: list = field(default_factory=list) # Names of the past translations shown in the prompt
+    resumed_from: Optional[str] = None  # Stage the job resumed at from its checkpoint after a redelivery
+    retry_reason: Optional[str] = None  # Set on transient failures (LLM backend down or overloaded); the job is retried later
+
+    @property
+    def temp_java_file_path(self) -> str:
+        return os.path.join(self.work_dir, f"{self.pascal_case_name}.java")
+
+    @property
+    def translated_folder_path(self) -> str:
+        return os.path.join(TRANSLATED_DIR, self.pascal_case_name)
 
-    cpp_file_path = os.path.join(UPLOAD_DIR, original_filename)
-    base_name = os.path.splitext(original_filename)[0]
-    pascal_case_name = to_pascal_case(base_name)
 
-    translated_folder_path = os.path.join(TRANSLATED_DIR, pascal_case_name)
-    os.makedirs(translated_folder_path, exist_ok=True)
+# --- Core Translation Logic ---
+def prepare_job(job: TranslationJob) -> str:
+    """ Reads the C++ source and builds the initial translation prompt.
+    Returns the first pipeline stage for the job (GENERATE, or DONE if it cannot start). """
+    # Messages queued before uploads moved to per-job directories carry no cpp_path
+    job.cpp_file_path = job.cpp_file_path or os.path.join(UPLOAD_DIR, job.original_filename)
+    base_name = os.path.splitext(job.original_filename)[0]
+    job.pascal_case_name = to_pascal_case(base_name)
+    job.work_dir = os.path.join(TEMP_DIR, job.file_id)
+
+    os.makedirs(job.work_dir, exist_ok=True)
+
+    # A redelivered job continues after its last completed stage instead of starting over
+    resume_stage = checkpoints.restore(job)
+    if resume_stage is not None:
+        job.resumed_from = resume_stage
+        logging.info(f"♻️ Resuming job {job.file_id} ({job.pascal_case_name}.java) at stage '{resume_stage}' "
+                     f"after {job.attempt} attempt(s) from its checkpoint.")
+        return resume_stage
+
+    if not os.path.exists(job.cpp_file_path):
+        logging.error(f"C++ source file {job.cpp_file_path} not found for job {job.file_id}!")
+        job.error = FileNotFoundError(f"🛑 Cannot find .cpp file to translate: {job.cpp_file_path}")
+        return DONE
+
+    logging.info(f"Processing {job.original_filename} -> {job.pascal_case_name}.java (Job ID: {job.file_id})")
+
+    with open(job.cpp_file_path, "r", encoding='utf-8') as file: # Specify encoding
+        job.cpp_code = file.read()
+
+    # Create header block for context (if any)
+    header_snippets = ""
+    if job.headers:
+        header_snippets = "\n===== INCLUDED HEADER FILES (.h) =====\n" + "\n\n".join(
+            f"// HEADER: {name}\n{content}" for name, content in job.headers.items()
+        )
 
-    temp_java_file_path = os.path.join(TEMP_DIR, f"{pascal_case_name}.java")
-    final_java_file_path = os.path.join(translated_folder_path, f"{pascal_case_name}.java")
-    failed_java_file_path = os.path.join(translated_folder_path, f"{pascal_case_name}_failed.java")
+    # Custom user prompt gets added at the end as clarification
+    custom_prompt_section = ""
+    if job.custom_prompt:
+        custom_prompt_section = (
+            "\n\nAdditional instructions for this translation:\n"
+            f"{job.custom_prompt.strip()}"
+        )
 
-    # Initialize status variables
-    success = False
-    final_status = "failed" # Assume failure initially
-    output_file_path = None # Path to send in notification
-    job_counter = 0
+    cpp_hints = extract_cpp_hints(job.cpp_code)
+    examples_section = retrieve_examples(job, header_snippets)
+
+    job.prompt = (
+            f"Translate the following C++ source file into idiomatic, fully compilable Java 17 code."
+            f"{header_snippets}\n\n"
+            f"===== C++ SOURCE FILE =====\n{job.cpp_code}\n\n"
+            f"{examples_section}"
+            f"Translation Guidelines:\n"
+            f"- Translate all logic, including edge cases, input validation, branching conditions, and error handling, with strict one-to-one functional fidelity.\n"
+            f"- Do not simplify, rephrase, or restructure any control flow or behavior. The resulting Java code must behave identically in all runtime scenarios, including edge cases and error states.\n"
+            f"- The main public class must be named exactly \"{job.pascal_case_name}\".\n"
+            f"- Maintain function and method signatures semantically equivalent to the original C++ version, including return types, parameters, optional arguments, and any method overloading.\n"
+            f"- Preserve original variable and method names where possible to maintain structural traceability between C++ and Java versions. This helps in matching logic and simplifies validation.\n"
+            f"- Avoid any form of refactoring, optimization, or code simplification. The priority is a direct, functionally equivalent translation, not idiomatic refinement.\n\n"
+            f"After outputting the Java file, double-check that:\n"
+            f"- All branches, loops, and conditionals from the C++ file are represented.\n"
+            f"- The behavior of all functions remain precisely the same as the original C++ implementation.\n"
+            f"- No logic has been omitted, reordered, or reinterpreted.\n"
+            f"{cpp_hints}\n\n"
+            f"{custom_prompt_section}\n"
+    )
+
+    job.estimated_tokens = estimate_token_count(job.prompt)
+    cpp_features = extract_cpp_features(job.cpp_code)
+    route = router.route(job.pascal_case_name, job.estimated_tokens, len(job.headers), cpp_features.get("hard_constructs", 0))
+    job.model, job.tier, job.num_ctx = route.model, route.tier, route.num_ctx
+    logging.info(f"Estimated token usage: {job.estimated_tokens} → Using num_ctx={job.num_ctx}")
+
+    if CHUNKING_ENABLED and job.estimated_tokens > CHUNK_THRESHOLD_TOKENS:
+        job.chunk_prompts = build_chunk_prompts(job, cpp_hints, custom_prompt_section)
+    if not job.chunk_prompts and job.estimated_tokens > MAX_ALLOWED_TOKENS:
+        logging.warning(f"Prompt for {job.pascal_case_name}.java (~{job.estimated_tokens} tokens) exceeds MAX_ALLOWED_TOKENS={MAX_ALLOWED_TOKENS}. "
+                        f"The model will see a truncated prompt.")
+    return GENERATE
+
+
+def retrieve_examples(job: TranslationJob, header_snippets: str) -> str:
+    """ Few-shot section with the most similar past translations that compiled, within the
+    token budget left next to the source (large files that get chunked get none). """
+    if example_index is None:
+        return ""
+    source_tokens = estimate_token_count(job.cpp_code + header_snippets)
+    if CHUNKING_ENABLED and source_tokens > CHUNK_THRESHOLD_TOKENS:
+        return ""
+    budget = min(RETRIEVAL_TOKEN_BUDGET, MAX_ALLOWED_TOKENS - source_tokens - PROMPT_OVERHEAD_TOKENS)
+    if budget <= 0:
+        return ""
+    examples = example_index.select(job.cpp_code, RETRIEVAL_TOP_K, budget, estimate_token_count, min_score=RETRIEVAL_MIN_SCORE)
+    job.examples = [example.name for example in examples]
+    if examples:
+        logging.info(f"Adding {len(examples)} past translation(s) as examples for {job.pascal_case_name}.java: "
+                     + ", ".join(f"{example.name} (score {example.score})" for example in examples))
+    return few_shot_section(examples) + ("\n\n" if examples else "")
+
+
+def build_chunk_prompts(job: TranslationJob, cpp_hints: str, custom_prompt_section: str) -> list:
+    """ Splits the translation unit (headers + source) into chunks of top-level declarations and
+    builds one prompt per chunk. Every prompt carries the shared preamble and the signatures of the
+    whole unit, so chunks can call each other. Returns [] when the file does not split. """
+    declarations = []
+    for code in [*job.headers.values(), job.cpp_code]:
+        declarations.extend(scan_declarations(code))
+    chunks = plan_chunks(declarations, CHUNK_MAX_TOKENS, estimate_token_count)
+    if len(chunks) < 2:
+        logging.info(f"{job.pascal_case_name}.java does not split into several chunks. Translating it in one request.")
+        return []
+
+    preamble = preamble_text(declarations)
+    summary = signature_summary(declarations)
+    prompts = []
+    for index, chunk in enumerate(chunks, start=1):
+        globals_rule = (
+            "- Also translate the global variables and constants from the shared declarations into static fields.\n"
+            if index == 1 else
+            "- Global variables and constants from the shared declarations are translated by another part. Use them by name, do not declare them.\n"
+        )
+        prompt = (
+            f"Translate PART {index} of {len(chunks)} of a large C++ program into Java 17. The parts are translated separately "
+            f"and then joined into one Java file with a single public class named \"{job.pascal_case_name}\".\n\n"
+            f"===== SHARED DECLARATIONS (includes, usings, globals) =====\n{preamble}\n\n"
+            f"===== SIGNATURES OF THE WHOLE PROGRAM =====\n{summary}\n\n"
+            f"===== C++ CODE OF THIS PART ({', '.join(chunk.names)}) =====\n{chunk.text}\n\n"
+            f"Rules for this part:\n"
+            f"- Output only the Java members that go inside 'public class {job.pascal_case_name} {{ ... }}': fields, methods and static nested classes. "
+            f"Do not write the enclosing class or a package declaration.\n"
+            f"- Translate every C++ class or struct of this part, including its out-of-line member definitions, into a static nested class with the same name.\n"
+            f"- Translate free functions into static methods and 'main' into 'public static void main(String[] args)'.\n"
+            f"{globals_rule}"
+            f"- Code of other parts exists with the signatures listed above. Call it, but do not re-implement it.\n"
+            f"- Put the import statements this part needs at the top.\n"
+            f"- Translate all logic with strict one-to-one functional fidelity and preserve variable and method names.\n"
+            f"{cpp_hints}\n\n"
+            f"{custom_prompt_section}\n"
+        )
+        prompts.append((prompt, router.context_size(estimate_token_count(prompt))))
+    logging.info(f"Splitting {job.pascal_case_name}.java into {len(chunks)} chunks: "
+                 + "; ".join(", ".join(chunk.names) for chunk in chunks))
+    return prompts
+
+
+def generate_stage(job: TranslationJob) -> str:
+    """ LLM stage: sends the pending prompt (initial translation or fix request) to Ollama
+    and stores the extracted Java code on the job. """
+    is_retry = job.attempt > 0
+    if not is_retry:
+        logging.info(f"Starting initial translation for {job.pascal_case_name}.java")
+    else:
+        logging.info(f"Sending correction request to Ollama (Attempt {job.attempt + 1} incoming)...")
 
     try:
-        if not os.path.exists(cpp_file_path):
-            logging.error(f"C++ source file {cpp_file_path} not found for job {file_id}!")
-            raise FileNotFoundError(f"🛑 Cannot find .cpp file to translate: {cpp_file_path}")
-
-        logging.info(f"Processing {original_filename} -> {pascal_case_name}.java (Job ID: {file_id})")
-
-        with open(cpp_file_path, "r", encoding='utf-8') as file: # Specify encoding
-             cpp_code = file.read()
-
-        ###########################
-        ### INITIAL TRANSLATION ###
-        ###########################
-        logging.info(f"Starting initial translation for {pascal_case_name}.java")
-        
-        # Create header block for context (if any)
-        header_snippets = ""
-        if headers:
-            header_snippets = "\n===== INCLUDED HEADER FILES (.h) =====\n" + "\n\n".join(
-                f"// HEADER: {name}\n{content}" for name, content in headers.items()
-            )
-            
-        # Custom user prompt gets added at the end as clarification
-        custom_prompt_section = ""
-        if custom_prompt:
-            custom_prompt_section = (
-                "\n\nAdditional instructions for this translation:\n"
-                f"{custom_prompt.strip()}"
-            )
-        
-        cpp_hints = extract_cpp_hints(cpp_code)
-        
-        full_prompt = (
-                f"Translate the following C++ source file into idiomatic, fully compilable Java 17 code."
-                f"{header_snippets}\n\n"
-                f"===== C++ SOURCE FILE =====\n{cpp_code}\n\n"
-                f"Translation Guidelines:\n"
-                f"- Translate all logic, including edge cases, input validation, branching conditions, and error handling, with strict one-to-one functional fidelity.\n"
-                f"- Do not simplify, rephrase, or restructure any control flow or behavior. The resulting Java code must behave identically in all runtime scenarios, including edge cases and error states.\n"       
-                f"- The main public class must be named exactly \"{pascal_case_name}\".\n"
-                f"- Maintain function and method signatures semantically equivalent to the original C++ version, including return types, parameters, optional arguments, and any method overloading.\n"
-                f"- Preserve original variable and method names where possible to maintain structural traceability between C++ and Java versions. This helps in matching logic and simplifies validation.\n"
-                f"- Avoid any form of refactoring, optimization, or code simplification. The priority is a direct, functionally equivalent translation, not idiomatic refinement.\n\n"
-                f"After outputting the Java file, double-check that:\n"
-                f"- All branches, loops, and conditionals from the C++ file are represented.\n"
-                f"- The behavior of all functions remain precisely the same as the original C++ implementation.\n"
-                f"- No logic has been omitted, reordered, or reinterpreted.\n"
-                f"{cpp_hints}\n\n"
-                f"{custom_prompt_section}\n"
+        if not is_retry and job.chunk_prompts:
+            generated_code = translate_chunks(job)
+        else:
+            num_ctx = router.context_size(job.estimated_tokens + 200) if is_retry else job.num_ctx
+            full_response = request_generation(job.model, job.prompt, job.temperature, num_ctx, timeout=600 if is_retry else 1000) # Increased timeout
+            generated_code = extract_code(full_response)
+    except requests.exceptions.RequestException as e:
+        if is_transient_error(e):
+            # Ollama is restarting or overloaded: hand the job back to RabbitMQ for a delayed retry
+            logging.warning(f"Transient LLM error for {job.pascal_case_name}.java: {e}. The job will be retried later.")
+            job.retry_reason = f"{type(e).__name__}: {e}"
+            return DONE
+        if not is_retry:
+            logging.exception(f"HTTP request failed during initial translation for {job.pascal_case_name}.java: {e}")
+            return DONE # Exit if initial translation fails
+        logging.error(f"Error during LLM retry request for {job.pascal_case_name}.java: {e}")
+        logging.error("Aborting retries due to LLM request error.")
+        # Save the code *before* the failed LLM call attempt (which failed compilation)
+        save_failed_attempt(job)
+        return DONE
+
+    if not generated_code:
+        if not is_retry:
+            logging.error("Initial translation returned empty code. Aborting.")
+            return DONE
+        logging.warning(f"LLM correction attempt {job.attempt} returned empty code. Re-using previous code for next attempt.")
+        # Keep previous_sanitized_log as is and recompile the previous code
+        return COMPILE
+
+    if is_retry:
+        # Force the public class name
+        generated_code = normalize_java(generated_code, class_name=job.pascal_case_name)
+
+    code_hash = source_hash(generated_code)
+    if is_retry and code_hash in job.seen_code_hashes and job.repeat_escalations < MAX_REPEAT_ESCALATIONS:
+        # Compiling it again would only reproduce known errors, so ask again less deterministically
+        job.repeat_escalations += 1
+        job.temperature = min(job.temperature + TEMPERATURE_STEP, 1.0)
+        logging.warning(f"LLM repeated a previous version of {job.pascal_case_name}.java. Retrying with temperature={job.temperature:.1f} "
+                        f"({job.repeat_escalations}/{MAX_REPEAT_ESCALATIONS}) without spending an attempt.")
+        return GENERATE
+    job.seen_code_hashes.add(code_hash)
+
+    if is_retry:
+        logging.info(f"Received corrected code from LLM for attempt {job.attempt + 1}.")
+        # Store the errors from the failed attempt for the NEXT retry
+        job.previous_sanitized_log = job.sanitized_log
+
+    job.current_java_code = generated_code
+    return COMPILE
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Connection errors, timeouts, 429 and 5xx answers from the LLM backend go away on their own."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+def request_generation(model: str, prompt: str, temperature: float, num_ctx: int, timeout: int) -> str:
+    """Sends one non-streaming generation request to Ollama and returns the response text."""
+    payload = {
+        "model": model,
+        "system": SYSTEM_PROMPT,
+        "prompt": prompt,
+        "options": {
+            "temperature": temperature,
+            "num_ctx": num_ctx,     # max context window size, default 2048 tokens, qwen2.5-coder limit 32,768
+            "num_predict": -1       # -1 means no limit on output length
+        },
+        "stream": False,
+    }
+    response = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("response", "").strip()
+
+
+def translate_chunks(job: TranslationJob) -> str:
+    """ Translates all chunks of a large job concurrently and stitches them into one class.
+    Wall-clock time is roughly that of the largest chunk. """
+    logging.info(f"Translating {len(job.chunk_prompts)} chunks of {job.pascal_case_name}.java ({CHUNK_WORKERS} at a time)...")
+    futures = [
+        chunk_pool.submit(request_generation, job.model, prompt, job.temperature, num_ctx, 1000)
+        for prompt, num_ctx in job.chunk_prompts
+    ]
+    pieces = [extract_code(future.result()) for future in futures]
+    try:
+        code = stitch(job.pascal_case_name, pieces)
+    except ValueError as e:
+        # A missing chunk would still compile, just without its members: fail like an empty translation
+        logging.error(f"Translation of {job.pascal_case_name}.java is incomplete: {e}.")
+        return ""
+    job.chunk_prompts = [] # Fixes work on the stitched file
+    return code
+
+
+def compile_stage(job: TranslationJob) -> str:
+    """ Compilation stage: writes the current code to the job's temp dir and runs javac.
+    Finishes the job on success or when retries are exhausted, otherwise requests a fix. """
+    job.attempt += 1
+    logging.info(f"--- Attempt {job.attempt}/{MAX_RETRIES + 1} for {job.pascal_case_name}.java ---")
+
+    # Ensure current_java_code is valid
+    if not isinstance(job.current_java_code, str) or not job.current_java_code.strip():
+        logging.error(f"Invalid or empty Java code content detected on attempt {job.attempt}. Aborting.")
+        return DONE
+
+    job.code_with_declaration = add_language_declaration(job.current_java_code, "java", job.pascal_case_name)
+    try:
+        with open(job.temp_java_file_path, "w", encoding='utf-8') as output_file:
+            output_file.write(job.code_with_declaration)
+    except IOError as e:
+        logging.error(f"Failed to write temporary file {job.temp_java_file_path}: {e}")
+        return DONE # Cannot proceed if writing fails
+
+    # PMD analyzes the same code while javac runs; only failed attempts wait for its findings
+    pmd_future = pmd_pool.submit(pmd.analyze, job.code_with_declaration, f"{job.pascal_case_name}.java") if pmd else None
+
+    cached = compile_cache.get(job.code_with_declaration, job.temp_java_file_path) if compile_cache else None
+    if cached:
+        logging.info(f"Using memoized compile result for {job.temp_java_file_path}.")
+        compile_success, compile_log = cached
+    else:
+        logging.info(f"Compiling {job.temp_java_file_path}...")
+        if batch_compiler:
+            compile_success, compile_log = batch_compiler.compile(job.temp_java_file_path)
+        else:
+            compile_success, compile_log = compile_java_file(job.temp_java_file_path, job.work_dir)
+        if compile_cache and is_cacheable_compile_log(compile_log):
+            compile_cache.put(job.code_with_declaration, job.temp_java_file_path, compile_success, compile_log)
+    job.sanitized_log = sanitize_log(compile_log)
+
+    if compile_success:
+        logging.info(f"Compilation successful on attempt {job.attempt}.")
+        job.success = True # The compiled code is stored with the result when the job finishes
+        if DIFF_TESTING_ENABLED and job.diff_cases:
+            run_differential_check(job)
+        return DONE
+
+    # --- Compilation Failed ---
+    logging.warning(f"Compilation failed on attempt {job.attempt}.")
+    logging.info(f"Current Compilation Errors (Sanitized):\n{job.sanitized_log}")
+    job.pmd_findings = collect_pmd_findings(job, pmd_future) if pmd_future else ""
+
+    if job.attempt > MAX_RETRIES:
+        logging.error(f"Maximum retries ({MAX_RETRIES}) reached for {job.pascal_case_name}.java. Saving last failed attempt.")
+        save_failed_attempt(job)
+        return DONE
+
+    next_tier = router.escalate(job.tier, job.attempt - job.tier_started_attempt)
+    if next_tier is not None:
+        logging.info(f"Escalating {job.pascal_case_name}.java from {job.model} to {router.tiers[next_tier]} after {job.attempt - job.tier_started_attempt} failed fixes.")
+        job.tier, job.model = next_tier, router.tiers[next_tier]
+        job.tier_started_attempt = job.attempt
+    return FIX
+
+
+def collect_pmd_findings(job: TranslationJob, pmd_future) -> str:
+    """Waits for the PMD run started next to javac and returns its findings for the fix prompt.
+    Logs how long the attempt waited for PMD after javac returned (its added latency)."""
+    waited_from = time.perf_counter()
+    try:
+        result = pmd_future.result(timeout=PMD_TIMEOUT + 5)
+    except Exception as e:
+        logging.warning(f"No PMD findings for {job.pascal_case_name}.java: {e}")
+        return ""
+    waited = time.perf_counter() - waited_from
+    pmd.record_wait(waited)
+    if result is None:
+        return ""
+    source = "cached" if result.cached else f"ran {result.seconds:.2f}s"
+    logging.info(f"PMD: {len(result.findings)} high-severity finding(s) for {job.pascal_case_name}.java "
+                 f"({source}, +{waited:.2f}s on this attempt). Totals: {pmd.summary()}")
+    return "\n".join(result.findings[:PMD_MAX_FINDINGS])
+
+
+def run_differential_check(job: TranslationJob):
+    """Runs the original C++ program and the compiled translation on the uploaded inputs.
+    The comparison is stored as <Name>_diff.json with the result."""
+    classes_dir = os.path.join(job.work_dir, "classes")
+    compiled, compile_log = compile_java_file(job.temp_java_file_path, classes_dir)
+    if not compiled:
+        logging.warning(f"Could not compile {job.pascal_case_name}.java for differential testing: {compile_log}")
+        return
+    try:
+        results = diff_checker.check(
+            job.original_filename, job.cpp_code, job.headers,
+            classes_dir, f"{job.pascal_case_name}.{job.pascal_case_name}",
+            job.input_files, job.diff_cases,
         )
-        
-        estimated_tokens = estimate_token_count(full_prompt)
-        num_ctx = min(estimated_tokens, MAX_ALLOWED_TOKENS)
-        logging.info(f"Estimated token usage: {estimated_tokens} → Using num_ctx={num_ctx}")
-        
-        initial_payload = {
-            "model": MODEL_NAME,
-            "system": SYSTEM_PROMPT,
-            "prompt": full_prompt,
-            "temperature": 0.0,
-            "options": {            
-                "num_ctx": num_ctx,       # max context window size, default 2048 tokens, qwen2.5-coder limit 32,768
-                "num_predict": -1         # -1 means no limit on output length
-            },
-            "stream": False,
-        }
-
+    except Exception as e:
+        logging.warning(f"Differential testing failed for {job.pascal_case_name}.java: {e}")
+        return
+    job.diff_results = [r.to_dict() for r in results]
+    matched = sum(1 for r in results if r.matched)
+    log = logging.info if matched == len(results) else logging.warning
+    log(f"Differential test for {job.pascal_case_name}.java: {matched}/{len(results)} case(s) match the C++ program.")
+
+
+def fix_stage(job: TranslationJob) -> str:
+    """ Fix-request stage: turns the latest compilation errors into a correction prompt
+    and queues the job for the LLM again (ahead of new jobs). """
+    logging.info(f"Attempting LLM correction (Retry {job.attempt}/{MAX_RETRIES}).")
+
+    # *** CONSTRUCT RETRY PROMPT WITH HISTORY ***
+    retry_prompt_parts = [
+         f"The following Java code, intended to be saved as \"{job.pascal_case_name}.java\", failed compilation on attempt {job.attempt}.",
+         f"\n\n===== CURRENT JAVA CODE (Attempt {job.attempt}) =====\n{job.current_java_code}", # Send code *without* package decl
+         f"\n\n===== CURRENT COMPILATION ERRORS (Attempt {job.attempt}) =====\n{job.sanitized_log}"
+    ]
+    if job.previous_sanitized_log:
+         retry_prompt_parts.append(f"\n\n===== PREVIOUS COMPILATION ERRORS (Attempt {job.attempt - 1}) =====\n{job.previous_sanitized_log}")
+         retry_prompt_parts.append(
+             "\n\nYour previous attempt resulted in the errors shown above ('PREVIOUS COMPILATION ERRORS'). "
+             "Analyze BOTH the 'CURRENT' and 'PREVIOUS' errors carefully and fix all errors. "
+             "DO NOT repeat the same mistakes. Identify the root cause and provide a significantly improved version."
+         )
+    else:
+         retry_prompt_parts.append("\n\nThis is the first attempt to fix the initial translation.")
+    if job.pmd_findings:
+         retry_prompt_parts.append(
+             f"\n\n===== STATIC ANALYSIS FINDINGS (PMD, high severity) =====\n{job.pmd_findings}\n"
+             "Fix these as well where they point to real defects, but the compilation errors come first."
+         )
+
+    retry_prompt_parts.append(
+         f"\n\nPlease correct the code to fix all current compilation errors. Strictly follow these rules:\n"
+         f"1. Ensure the file contains exactly one top-level public class named \"{job.pascal_case_name}\".\n"
+         f"2. If symbol errors occur, e.g. 'cannot find symbol' (missing methods, types, variables, incorrect references), resolve them by adding all necessary import statements and implementing the methods and logic from the original C++ code.\n"
+         f"3. Adjust access modifiers (public, private, protected) correctly.\n"
+         f"4. Fix invalid method declarations, constructors, and return types.\n"
+         f"5. Ensure helper classes are defined correctly (top-level non-public or properly nested).\n"
+         f"6. Adhere strictly to Java 17 syntax and conventions.\n"
+         f"7. Focus on fixing the root causes identified in the compilation error log, ensuring issues from the *previous* log (if any) are also resolved.\n\n"
+         f"Output *only* the corrected, complete Java source code. Do not include explanations, comments outside the code, or markdown formatting."
+    )
+    job.prompt = "".join(retry_prompt_parts)
+    # *** END RETRY PROMPT CONSTRUCTION ***
+    return GENERATE
+
+
+def save_failed_attempt(job: TranslationJob):
+    """Marks the job as failed; its last compiled code is stored as <Name>_failed.java with the result."""
+    job.success = False
+    logging.info(f"Last failing code of {job.pascal_case_name}.java will be stored as {job.pascal_case_name}_failed.java.")
+
+
+def store_result(job: TranslationJob, status: str):
+    """Writes the job's artifacts to the output store and indexes the result. Sets the
+    output path of the published file (None if a newer result of the same name exists)."""
+    artifacts = {}
+    if job.code_with_declaration:
+        # The code that was actually compiled (with declaration)
+        suffix = "" if job.success else "_failed"
+        artifacts[f"{job.pascal_case_name}{suffix}.java"] = job.code_with_declaration
+    if job.diff_results:
+        artifacts[f"{job.pascal_case_name}_diff.json"] = json.dumps(job.diff_results, indent=2)
+    record = ResultRecord(
+        file_id=job.file_id,
+        name=job.pascal_case_name,
+        source_hash=content_hash(job.cpp_code.encode("utf-8")),
+        status=status,
+        attempts=job.attempt,
+        model=job.model,
+        started_at=job.started_at,
+        finished_at=time.time(),
+        error=str(job.error) if job.error is not None else None,
+    )
+    try:
+        published = output_store.save(record, artifacts)
+    except Exception as e:
+        logging.error(f"Failed to store the result of job {job.file_id} ({job.pascal_case_name}.java): {e}")
+        return status if status != "success" else "failed"
+    java_files = [name for name in record.artifacts if name.endswith(".java")]
+    if published and java_files:
+        job.output_file_path = os.path.join(job.translated_folder_path, java_files[0])
+        logging.info(f"Result saved to {job.output_file_path} (version {record.version_dir})")
+    else:
+        job.output_file_path = None
+        if not published:
+            logging.info(f"Result of job {job.file_id} stored as {record.version_dir}; a newer result of {job.pascal_case_name} stays current.")
+    return status
+
+
+_jobs_since_unload = 0
+_unload_lock = threading.Lock()
+
+# Jobs in the pipeline by file_id. After a reconnect RabbitMQ redelivers unacknowledged messages
+# whose jobs may still be running here; those take over the new delivery tag instead of running twice.
+_active_jobs = {}
+_active_lock = threading.Lock()
+
+def finish_job(job: TranslationJob):
+    """ Final stage: reports the outcome, cleans up and hands the job back to the consumer.
+    Notifies test worker on completion (success or failure). """
+    ################################
+    ### NOTIFICATION AND CLEANUP ###
+    ################################
+    global _jobs_since_unload
+
+    if job.retry_reason:
+        logging.warning(f"--- Job {job.file_id} ({job.pascal_case_name or job.original_filename}) handed back for a retry: {job.retry_reason} ---")
+        if job.work_dir:
+            cleanup_temp_and_class_files(job.pascal_case_name, job.work_dir)
+        hand_back(job)
+        return
+
+    final_status = "success" if job.success else "failed"
+    name = job.pascal_case_name or job.original_filename
+    if job.error is not None:
+        logging.error(f"Job {job.file_id} ({job.original_filename}) ended with error: {job.error}")
+    if job.pascal_case_name:
+        if job.error is not None and not job.code_with_declaration:
+            final_status = "error" # Nothing was translated
+        final_status = store_result(job, final_status)
+    logging.info(f"--- Translation process finished for {name}.java ---")
+    logging.info(f"Final status: {final_status.upper()}")
+
+    # *** Send notification regardless of success/failure ***
+    #notify_test_generation_worker(job.pascal_case_name, final_status, job.output_file_path, job.cpp_test_file)
+
+    # Cleanup this job's temporary Java and class files
+    if job.work_dir:
+        cleanup_temp_and_class_files(job.pascal_case_name, job.work_dir)
+
+    if job.attempt > 0 and job.resumed_from != DONE: # Already recorded before the redelivery
+        router.history.record(job.pascal_case_name, job.attempt, job.success)
+
+    if example_index is not None and final_status == "success" and all(r.get("matched") for r in job.diff_results):
         try:
-            response = requests.post(OLLAMA_URL, json=initial_payload, timeout=1000) # Increased timeout
-            response.raise_for_status()
-            response_json = response.json()
-            full_response = response_json.get("response", "").strip()
-
-            # Extract code, removing potential markdown fences
-            match = re.search(r"```(?:java)?\s*(.*?)```", full_response, re.DOTALL | re.IGNORECASE)
-            current_java_code = match.group(1).strip() if match else full_response
-
-            if not current_java_code:
-                 logging.error("Initial translation returned empty code. Aborting.")
-                 # success remains False, finally block will notify failure
-                 return
-
-        except requests.exceptions.RequestException as e:
-            logging.exception(f"HTTP request failed during initial translation for {pascal_case_name}.java: {e}")
-            # success remains False, finally block will notify failure
-            return # Exit if initial translation fails
-
-        ##################################
-        ### COMPILATION AND RETRY LOOP ###
-        ##################################
-        compile_log = ""
-        previous_sanitized_log = ""
-
-        for attempt in range(MAX_RETRIES + 1): # +1 for initial attempt + MAX_RETRIES retries
-            logging.info(f"--- Attempt {attempt + 1}/{MAX_RETRIES + 1} for {pascal_case_name}.java ---")
-
-            # Ensure current_java_code is valid
-            if not isinstance(current_java_code, str) or not current_java_code.strip():
-                logging.error(f"Invalid or empty Java code content detected on attempt {attempt + 1}. Aborting.")
-                success = False
-                break # Exit loop if code is invalid
-
-            code_with_declaration = add_language_declaration(current_java_code, "java", pascal_case_name)
+            java_code = normalize_java(job.code_with_declaration, package="")
+            if example_index.add(job.pascal_case_name, job.cpp_code, java_code, job.attempt):
+                logging.info(f"Added {job.pascal_case_name} to the example index ({len(example_index)} pair(s)).")
+        except Exception as e:
+            logging.warning(f"Could not add {job.pascal_case_name} to the example index: {e}")
+
+    processing_time = time.time() - job.started_at
+    logging.info(f"Finished job for {job.original_filename} in {processing_time:.2f} seconds.")
+
+    hand_back(job)
+
+    with _unload_lock:
+        _jobs_since_unload += 1
+        unload_due = _jobs_since_unload >= UNLOAD_AFTER_JOBS and pipeline.in_flight <= 1 # Never unload under another job's feet
+        unload_due = unload_due and read_scaling().get("allow_unload", True) # With several replicas the autoscaler unloads
+        if unload_due:
+            _jobs_since_unload = 0
+    if unload_due:
+        logging.info("🧹 Cleaning up Ollama session after multiple jobs...")
+        for model in router.tiers:
             try:
-                with open(temp_java_file_path, "w", encoding='utf-8') as output_file:
-                    output_file.write(code_with_declaration)
-            except IOError as e:
-                logging.error(f"Failed to write temporary file {temp_java_file_path}: {e}")
-                success = False
-                break # Cannot proceed if writing fails
-
-            logging.info(f"Compiling {temp_java_file_path}...")
-            compile_success, compile_log = compile_java_file(temp_java_file_path)
-            sanitized_log = sanitize_log(compile_log)
-
-            if compile_success:
-                logging.info(f"Compilation successful on attempt {attempt + 1}.")
-                try:
-                    shutil.copy(temp_java_file_path, final_java_file_path)
-                    logging.info(f"Successfully compiled code copied to {final_java_file_path}")
-                    if os.path.exists(failed_java_file_path):
-                        try:
-                            os.remove(failed_java_file_path)
-                            logging.info(f"Removed previous failed file marker: {failed_java_file_path}")
-                        except OSError as rm_err:
-                            logging.warning(f"Could not remove previous failed file {failed_java_file_path}: {rm_err}")
-                    success = True # Set success to True
-                    output_file_path = final_java_file_path # Set the path for notification
-                    break # Exit loop on success
-                except Exception as e:
-                    logging.error(f"Failed to copy successful file from {temp_java_file_path} to {final_java_file_path}: {e}")
-                    success = False # Mark as failed if copy fails
-                    output_file_path = None # No valid final file
-                    break # Exit loop
-
-            # --- Compilation Failed ---
-            logging.warning(f"Compilation failed on attempt {attempt + 1}.")
-            logging.info(f"Current Compilation Errors (Sanitized):\n{sanitized_log}")
-
-            if attempt >= MAX_RETRIES:
-                logging.error(f"Maximum retries ({MAX_RETRIES}) reached for {pascal_case_name}.java. Saving last failed attempt.")
-                success = False # Explicitly ensure failure
-                try:
-                    # Use the code that was actually compiled (with declaration)
-                    with open(failed_java_file_path, "w", encoding='utf-8') as failed_file:
-                        failed_file.write(code_with_declaration)
-                    logging.info(f"Last failing code saved to {failed_java_file_path}")
-                    output_file_path = failed_java_file_path # Set failed path for notification
-                    if os.path.exists(final_java_file_path):
-                        try:
-                            os.remove(final_java_file_path)
-                            logging.info(f"Removed existing final file: {final_java_file_path}")
-                        except OSError as rm_err:
-                             logging.warning(f"Could not remove final file {final_java_file_path} after max retries: {rm_err}")
-                except IOError as e:
-                     logging.error(f"Failed to write final (failed) file {failed_java_file_path}: {e}")
-                     output_file_path = None # Failed to save, no path to notify
-                break # Exit loop after max retries
-
-            # --- Prepare for Retry ---
-            logging.info(f"Attempting LLM correction (Retry {attempt + 1}/{MAX_RETRIES}).")
-            # pmd_log = run_pmd_analysis(temp_java_file_path) # Optional
-
-            # *** CONSTRUCT RETRY PROMPT WITH HISTORY ***
-            retry_prompt_parts = [
-                 f"The following Java code, intended to be saved as \"{pascal_case_name}.java\", failed compilation on attempt {attempt + 1}.",
-                 f"\n\n===== CURRENT JAVA CODE (Attempt {attempt + 1}) =====\n{current_java_code}", # Send code *without* package decl
-                 f"\n\n===== CURRENT COMPILATION ERRORS (Attempt {attempt + 1}) =====\n{sanitized_log}"
-            ]
-            if previous_sanitized_log:
-                 retry_prompt_parts.append(f"\n\n===== PREVIOUS COMPILATION ERRORS (Attempt {attempt}) =====\n{previous_sanitized_log}")
-                 retry_prompt_parts.append(
-                     "\n\nYour previous attempt resulted in the errors shown above ('PREVIOUS COMPILATION ERRORS'). "
-                     "Analyze BOTH the 'CURRENT' and 'PREVIOUS' errors carefully and fix all errors. "
-                     "DO NOT repeat the same mistakes. Identify the root cause and provide a significantly improved version."
-                 )
-            else:
-                 retry_prompt_parts.append("\n\nThis is the first attempt to fix the initial translation.")
-
-            retry_prompt_parts.append(
-                 f"\n\nPlease correct the code to fix all current compilation errors. Strictly follow these rules:\n"
-                 f"1. Ensure the file contains exactly one top-level public class named \"{pascal_case_name}\".\n"
-                 f"2. If symbol errors occur, e.g. 'cannot find symbol' (missing methods, types, variables, incorrect references), resolve them by adding all necessary import statements and implementing the methods and logic from the original C++ code.\n"
-                 f"3. Adjust access modifiers (public, private, protected) correctly.\n"
-                 f"4. Fix invalid method declarations, constructors, and return types.\n"
-                 f"5. Ensure helper classes are defined correctly (top-level non-public or properly nested).\n"
-                 f"6. Adhere strictly to Java 17 syntax and conventions.\n"
-                 f"7. Focus on fixing the root causes identified in the compilation error log, ensuring issues from the *previous* log (if any) are also resolved.\n\n"
-                 f"Output *only* the corrected, complete Java source code. Do not include explanations, comments outside the code, or markdown formatting."
-            )
-
-            retry_payload = {
-                "model": MODEL_NAME,
-                "system": SYSTEM_PROMPT,
-                "prompt": "".join(retry_prompt_parts),
-                "temperature": 0.0,
-                "options": {            
-                    "num_ctx": num_ctx + 200,         # max context window size, default 2048 tokens, qwen2.5-coder limit 32,768
-                    "num_predict": -1,             # -1 means no limit on output length
-                },
-                "stream": False,
-            }
-            # *** END RETRY PROMPT CONSTRUCTION ***
+                response = requests.post("http://ollama:11434/api/unload", json={"model": model}, timeout=10)
+                if response.status_code == 200:
+                    logging.info(f"✅ Ollama model {model} unloaded successfully.")
+                else:
+                    logging.warning(f"⚠️ Unload of {model} failed: {response.status_code} {response.text}")
+            except Exception as e:
+                logging.warning(f"⚠️ Failed to unload Ollama model {model}: {e}")
 
-            try:
-                logging.info(f"Sending correction request to Ollama (Attempt {attempt + 2} incoming)...")
-                retry_response = requests.post(OLLAMA_URL, json=retry_payload, timeout=600) # Increased timeout
-                retry_response.raise_for_status()
 
-                retry_result = retry_response.json().get("response", "").strip()
-                retry_match = re.search(r"```(?:java)?\s*(.*?)```", retry_result, re.DOTALL | re.IGNORECASE)
-                fixed_code = retry_match.group(1).strip() if retry_match else retry_result
+def hand_back(job: TranslationJob):
+    """Returns a finished job to the consumer for its ACK (or retry / parking).
+    Uploads and checkpoint are only released once the ACK went through; until then a
+    redelivered message still finds everything it needs."""
+    with _active_lock:
+        _active_jobs.pop(job.file_id, None)
+        on_done = job.on_done
+    if on_done:
+        on_done(job)
+    elif not job.retry_reason:
+        release_job(job)
 
-                if not fixed_code:
-                    logging.warning(f"LLM correction attempt {attempt + 1} returned empty code. Re-using previous code for next attempt.")
-                    # Keep previous_sanitized_log as is
-                    continue # Skip updating current_java_code and proceed to next attempt or max retries
 
-                # Force the public class name
-                fixed_code = re.sub(r'\bpublic\s+(?:final\s+|abstract\s+)?class\s+\w+\b', f'public class {pascal_case_name}', fixed_code, count=1)
+def checkpoint_job(job: TranslationJob, stage: str):
+    """Pipeline transition hook. A job handed back for a retry resumes at generation."""
+    checkpoints.save(job, GENERATE if job.retry_reason else stage)
 
-                current_java_code = fixed_code
-                logging.info(f"Received corrected code from LLM for attempt {attempt + 2}.")
 
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error during LLM retry request for {pascal_case_name}.java: {e}")
-                success = False
-                logging.error("Aborting retries due to LLM request error.")
-                try:
-                    # Save the code *before* the failed LLM call attempt (which failed compilation)
-                    with open(failed_java_file_path, "w", encoding='utf-8') as failed_file:
-                        failed_file.write(code_with_declaration) # Save the version that failed compilation
-                    logging.info(f"Last code that failed compilation before LLM error saved to {failed_java_file_path}")
-                    output_file_path = failed_java_file_path # Set path for notification
-                    if os.path.exists(final_java_file_path):
-                         try:
-                             os.remove(final_java_file_path)
-                             logging.info(f"Removed existing final file: {final_java_file_path}")
-                         except OSError as rm_err:
-                             logging.warning(f"Could not remove final file {final_java_file_path} after LLM error: {rm_err}")
-                except IOError as io_e:
-                    logging.error(f"Failed to write failed file {failed_java_file_path} after LLM error: {io_e}")
-                    output_file_path = None # Failed to save, no path
-                break # Exit loop on LLM error
-
-            # Store the errors from THIS failed attempt for the NEXT retry
-            previous_sanitized_log = sanitized_log
-
-        # --- Loop finished or broke ---
-        final_status = "success" if success else "failed"
-        logging.info(f"--- Translation process finished for {pascal_case_name}.java ---")
-        logging.info(f"Final status: {final_status.upper()}")
-        if not success and output_file_path is None and os.path.exists(failed_java_file_path):
-            # If loop finished due to some other reason but failed file exists
-             output_file_path = failed_java_file_path
-             logging.info(f"Using {failed_java_file_path} as output path for failure notification.")
-
-
-    except FileNotFoundError as e:
-         # This specific case is handled above, but catch again just in case.
-         logging.error(f"File not found error during translation process for {file_id}: {e}")
-         final_status = "failed"
-         output_file_path = None
+def release_job(job: TranslationJob):
+    """Removes the job's uploads (its upload directory with the .cpp, headers and program inputs) and its checkpoint."""
+    try:
+        if job.cpp_file_path and os.path.exists(job.cpp_file_path):
+            os.remove(job.cpp_file_path)
+            logging.info(f"🧹 Removed original .cpp file: {os.path.basename(job.cpp_file_path)}")
     except Exception as e:
-         # Catch any other unexpected errors during the whole process
-         logging.exception(f"Unhandled exception while translating {file_id} ({original_filename}): {e}")
-         final_status = "failed"
-         # Try to set failed path if it might exist, otherwise None
-         output_file_path = failed_java_file_path if os.path.exists(failed_java_file_path) else None
-
-    finally:
-        ################################
-        ### NOTIFICATION AND CLEANUP ###
-        ################################
-        logging.info(f"--- Finalizing job for {pascal_case_name}.java (Status: {final_status.upper()}) ---")
-
-        # Ensure output_file_path reflects reality if success=True but file is missing
-        if final_status == "success" and not os.path.exists(final_java_file_path):
-            logging.error(f"Status is 'success' but final file '{final_java_file_path}' not found! Reporting failure.")
-            final_status = "failed"
-            output_file_path = None
-
-        # Ensure output_file_path reflects reality if success=False but failed_file is missing
-        if final_status == "failed" and output_file_path == failed_java_file_path and not os.path.exists(failed_java_file_path):
-             logging.warning(f"Status is 'failed' and expected failed file '{failed_java_file_path}' not found. Sending notification without specific path.")
-             output_file_path = None
-
-        # *** Send notification regardless of success/failure ***
-        #notify_test_generation_worker(pascal_case_name, final_status, output_file_path, cpp_test_file)
-
-        # Cleanup temporary Java and class files
-        cleanup_temp_and_class_files(pascal_case_name)
-
-        # Remove original C++ file after processing
+        logging.warning(f"⚠️ Could not remove original .cpp file {job.cpp_file_path}: {e}")
+    for input_path in job.input_files.values():
         try:
-            if cpp_file_path and os.path.exists(cpp_file_path): # Check if cpp_file_path was defined
-                os.remove(cpp_file_path)
-                logging.info(f"🧹 Removed original .cpp file: {os.path.basename(cpp_file_path)}")
-        except NameError:
-             logging.warning("⚠️ Original C++ file path variable not defined, skipping removal.")
+            if os.path.exists(input_path):
+                os.remove(input_path)
         except Exception as e:
-            logging.warning(f"⚠️ Could not remove original .cpp file {cpp_file_path}: {e}")
-        
-        job_counter += 1
-        if job_counter >= UNLOAD_AFTER_JOBS:
-            logging.info("🧹 Cleaning up Ollama session after multiple jobs...")
-            try:
-                response = requests.post("http://ollama:11434/api/unload", json={"model": MODEL_NAME}, timeout=10)
-                if response.status_code == 200:
-                    logging.info("✅ Ollama model unloaded successfully.")
-                else:
-                    logging.warning(f"⚠️ Unload failed: {response.status_code} {response.text}")
-            except Exception as e:
-                logging.warning(f"⚠️ Failed to unload Ollama model: {e}")
-            job_counter = 0  # reset
+            logging.warning(f"⚠️ Could not remove input file {input_path}: {e}")
+    if job.file_id and os.path.basename(job.file_id) == job.file_id:
+        shutil.rmtree(os.path.join(UPLOAD_DIR, job.file_id), ignore_errors=True)
+    try:
+        checkpoints.delete(job.file_id)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not delete checkpoint of job {job.file_id}: {e}")
+
+
+# Versioned results and their index, shared with the FastAPI result endpoints
+output_store = OutputStore(TRANSLATED_DIR)
+
+# Past translations that compiled, shown as few-shot examples in new prompts
+example_index = ExampleIndex(os.path.join(STATE_DIR, "examples.sqlite")) if RETRIEVAL_ENABLED else None
+
+# Attempt state of every job after each stage, so redelivered jobs resume instead of restarting
+checkpoints = CheckpointStore(os.path.join(STATE_DIR, "checkpoints.sqlite"))
+
+diff_checker = DifferentialChecker(
+    os.path.join(STATE_DIR, "diff_cache"),
+    rel_tol=DIFF_REL_TOLERANCE,
+    abs_tol=DIFF_ABS_TOLERANCE,
+    ignore_pattern=DIFF_IGNORE_PATTERN or None,
+)
+
+router = ModelRouter(
+    MODEL_NAME,
+    small_model=SMALL_MODEL_NAME,
+    large_model=LARGE_MODEL_NAME,
+    max_ctx=MAX_ALLOWED_TOKENS,
+    small_max_tokens=ROUTER_SMALL_MAX_TOKENS,
+    escalate_after=ROUTER_ESCALATE_AFTER,
+    history=AttemptHistory(os.path.join(STATE_DIR, "attempt_history.sqlite")),
+)
+
+# Identical sources (repeated LLM output, re-used code after an empty answer, recurring translations) skip javac
+compile_cache = CompileCache(JAVAC_FLAGS, max_entries=COMPILE_CACHE_SIZE) if COMPILE_CACHE_SIZE > 0 else None
+
+# Several compile-stage threads share one javac invocation; each job compiles in its own package
+batch_compiler = BatchCompiler(
+    TEMP_DIR,
+    window_seconds=COMPILE_BATCH_WINDOW_MS / 1000,
+    max_batch_size=COMPILE_BATCH_SIZE,
+) if COMPILE_BATCH_SIZE > 1 else None
+
+# Optional PMD analysis next to javac
+pmd = None
+if PMD_ENABLED:
+    if shutil.which("pmd"):
+        pmd = PmdAnalyzer(os.path.join(STATE_DIR, "pmd", WORKER_ID), PMD_RULESET, max_priority=PMD_MAX_PRIORITY,
+                          timeout=PMD_TIMEOUT, workers=PMD_WORKERS)
+    else:
+        logging.warning("PMD_ENABLED=true, but 'pmd' is not on PATH (build the image with INSTALL_PMD=true). Running without PMD.")
+pmd_pool = ThreadPoolExecutor(max_workers=max(1, PMD_WORKERS), thread_name_prefix="pmd") if pmd else None
+
+# Chunks of large jobs are requested in parallel, next to the pipeline's own LLM workers
+chunk_pool = ThreadPoolExecutor(max_workers=max(1, CHUNK_WORKERS), thread_name_prefix="chunk")
+
+pipeline = StagePipeline(
+    generate=generate_stage,
+    compile=compile_stage,
+    fix=fix_stage,
+    finish=finish_job,
+    llm_workers=LLM_WORKERS,
+    compile_workers=COMPILE_WORKERS,
+    on_transition=checkpoint_job,
+)
 
 # --- Notification ---
-from typing import Optional
-
 def notify_test_generation_worker(pascal_case_name: str, status: str, file_path: Optional[str], cpp_test_file=None):
     """Sends a message to RabbitMQ to trigger test generation, including status."""
     try:
@@ -436,12 +823,12 @@ def notify_test_generation_worker(pascal_case_name: str, status: str, file_path:
 
 
 # --- Compilation ---
-def compile_java_file(java_file_path: str) -> tuple[bool, str]:
-    """Compiles the Java file and returns success status and log."""
-    # Ensure TEMP_DIR exists before compiling into it
-    os.makedirs(TEMP_DIR, exist_ok=True)
+def compile_java_file(java_file_path: str, output_dir: str = TEMP_DIR) -> tuple[bool, str]:
+    """Compiles the Java file into output_dir and returns success status and log."""
+    # Ensure the output dir exists before compiling into it
+    os.makedirs(output_dir, exist_ok=True)
 
-    compile_command = ["javac", "-Xlint:all", "--release", "17", "-d", TEMP_DIR, java_file_path] # Specify Java 17, output .class to TEMP_DIR
+    compile_command = ["javac", *JAVAC_FLAGS, "-d", output_dir, java_file_path] # Specify Java 17, output .class to output_dir
     logging.debug(f"Running compilation command: {' '.join(compile_command)}")
     try:
         result = subprocess.run(
@@ -475,19 +862,43 @@ def compile_java_file(java_file_path: str) -> tuple[bool, str]:
         return False, f"Unexpected compilation error: {str(e)}"
 
 
+def is_cacheable_compile_log(compile_log: str) -> bool:
+    """Infrastructure failures (timeouts, missing javac) say nothing about the source and must not be memoized."""
+    return not (compile_log or "").startswith((
+        "Compilation timed out",
+        "Compilation did not run",
+        "'javac' command not found",
+        "Unexpected compilation error",
+    ))
+
+
 # --- Cleanup ---
-def cleanup_temp_and_class_files(pascal_case_name=None):
+def cleanup_stale_replica_dirs(max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS):
+    """Removes temp dirs of replicas that are gone (not touched for longer than their jobs' checkpoints live)."""
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(TEMP_ROOT):
+        path = os.path.join(TEMP_ROOT, name)
+        try:
+            if name != WORKER_ID and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path)
+                logging.info(f"🧹 Removed temp dir of a former replica: {path}")
+        except OSError as e:
+            logging.warning(f"⚠️ Could not remove stale temp dir {path}: {e}")
+
+
+def cleanup_temp_and_class_files(pascal_case_name=None, temp_dir=TEMP_DIR):
     """
-    Cleans up ALL files and subdirectories within TEMP_DIR.
+    Cleans up ALL files and subdirectories within temp_dir (a job's work dir, or TEMP_DIR).
+    A job work dir below TEMP_DIR is removed as well.
     Cleans up .class files in the specific subfolder under TRANSLATED_DIR if pascal_case_name is provided.
     """
-    # --- Clean TEMP_DIR Thoroughly ---
-    logging.info(f"Attempting thorough cleanup of TEMP_DIR: {TEMP_DIR}")
-    if not os.path.isdir(TEMP_DIR):
-        logging.debug(f"TEMP_DIR {TEMP_DIR} does not exist or is not a directory. Skipping TEMP_DIR cleanup.")
+    # --- Clean temp_dir Thoroughly ---
+    logging.info(f"Attempting thorough cleanup of temp dir: {temp_dir}")
+    if not os.path.isdir(temp_dir):
+        logging.debug(f"Temp dir {temp_dir} does not exist or is not a directory. Skipping temp cleanup.")
     else:
-        for item_name in os.listdir(TEMP_DIR):
-            item_path = os.path.join(TEMP_DIR, item_name)
+        for item_name in os.listdir(temp_dir):
+            item_path = os.path.join(temp_dir, item_name)
             try:
                 if os.path.isfile(item_path) or os.path.islink(item_path):
                     os.remove(item_path)
@@ -497,14 +908,19 @@ def cleanup_temp_and_class_files(pascal_case_name=None):
                     #logging.debug(f"🧹 Removed temp directory: {item_path}")
             except FileNotFoundError:
                  # Item might have been removed by another concurrent process or already gone
-                 logging.debug(f"⚠️ File/directory not found during TEMP_DIR cleanup (might be okay): {item_path}")
+                 logging.debug(f"⚠️ File/directory not found during temp cleanup (might be okay): {item_path}")
             except PermissionError as pe:
                  logging.error(f"🚫 Permission error deleting temp item {item_path}: {pe}.")
             except OSError as oe:
                  logging.error(f"💥 OS error deleting temp item {item_path}: {oe}")
             except Exception as e:
                  logging.error(f"💥 Failed to delete temp item {item_path}: {e}", exc_info=True)
-        logging.info("Finished TEMP_DIR cleanup attempt.")
+        if os.path.normpath(temp_dir) != os.path.normpath(TEMP_DIR):
+            try:
+                os.rmdir(temp_dir)
+            except OSError as oe:
+                logging.warning(f"⚠️ Could not remove job temp dir {temp_dir}: {oe}")
+        logging.info("Finished temp dir cleanup attempt.")
 
 
     # --- Clean .class files in the specific TRANSLATED_DIR subfolder ---
@@ -535,102 +951,40 @@ def cleanup_temp_and_class_files(pascal_case_name=None):
              logging.debug(f"Translated folder {translated_subfolder_path} not found for .class cleanup.")
 
             
-# --- PMD Analysis (Optional) ---
-def run_pmd_analysis(java_file_path: str) -> str:
-    """Runs PMD analysis and returns filtered output."""
-    pmd_command = [
-        "pmd", "check",
-        "-d", java_file_path,
-        "-R", "rulesets/java/quickstart.xml", # Ensure this ruleset exists or use a default one
-        "-f", "text"
-    ]
-    logging.info(f"Running PMD command: {' '.join(pmd_command)}")
-    try:
-        result = subprocess.run(
-            pmd_command,
-            capture_output=True,
-            text=True,
-            check=True, # Let it fail if PMD itself fails
-            timeout=30 # PMD can be slower
-        )
-        output = result.stdout
-        # Filter out common noise lines from PMD output
-        processed_lines = [
-            line.strip() for line in output.splitlines()
-            if line.strip() and
-               "Progressbar" not in line and
-               "Incremental Analysis" not in line and
-               "Ruleset not found" not in line and # Example of another filter
-               "Deprecated ruleset" not in line
-        ]
-        final_output = "\n".join(processed_lines).strip()
-        logging.info(f"PMD Analysis completed for {java_file_path}.")
-        return final_output if final_output else "No PMD violations found."
-    except subprocess.CalledProcessError as e:
-        error_output = e.stderr if e.stderr else e.stdout
-        logging.warning(f"PMD command failed for {java_file_path}: {error_output}")
-        return f"PMD analysis failed:\n{error_output}"
-    except FileNotFoundError:
-         logging.error("Error: 'pmd' command not found. Make sure PMD is installed and in PATH.")
-         return "'pmd' command not found."
-    except subprocess.TimeoutExpired:
-        logging.warning(f"PMD analysis timed out for {java_file_path}")
-        return "PMD analysis timed out after 30 seconds"
-    except Exception as e:
-        logging.warning(f"PMD analysis encountered an unexpected error: {e}")
-        return f"PMD analysis error: {str(e)}"
-
-
 def add_language_declaration(code: str, language: str, identifier: str) -> str:
     """Ensures a Java package declaration matching `identifier` is present and correct."""
     if language.lower() != "java":
         return code  # only handle Java for now
 
-    # Remove any existing package declaration (assumes it's near the top)
-    code = re.sub(r'^\s*package\s+[a-zA-Z0-9_.]+;\s*\n', '', code, flags=re.MULTILINE)
-
-    lines = code.splitlines()
-    insert_pos = 0
+    return normalize_java(code, package=identifier)
 
-    # Find where to insert the package declaration (before imports or class/interface/annotation)
-    for i, line in enumerate(lines):
-        stripped_line = line.strip()
-        if stripped_line and not stripped_line.startswith(('//', '/*')):
-            if stripped_line.startswith(('import ', 'public ', 'class ', 'interface ', '@')):
-                insert_pos = i
-                break
-            insert_pos = i
-            break
-        elif not stripped_line:
-            insert_pos = i + 1
-
-    # Insert the new package declaration
-    lines.insert(insert_pos, f"package {identifier};")
-
-    # Add a blank line after if needed
-    if insert_pos + 1 >= len(lines) or lines[insert_pos + 1].strip():
-        lines.insert(insert_pos + 1, "")
-
-    return "\n".join(lines)
+_DELIMITERS = re.compile(r'[-_\s]+')
+_CASE_CHANGE = re.compile(r'[a-z][A-Z]')
+_CAPITALIZED = re.compile(r'[A-Z][a-z]')
+_CASE_WORDS = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?=[A-Z][a-z]|\d|\W|$)|\d+')
+_TRAILING_DIGITS = re.compile(r'^(.*?)(\d+)$')
+_INVALID_IDENTIFIER_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+_IDENTIFIER_START = re.compile(r'^[a-zA-Z_]')
 
+@lru_cache(maxsize=1024)
 def to_pascal_case(s: str) -> str:
     """Converts a string to PascalCase, handling various delimiters and splitting words."""
     if not s:
         return "DefaultClassName" # Handle empty input
 
     # Normalize delimiters to spaces first
-    s = re.sub(r'[-_\s]+', ' ', s).strip()
+    s = _DELIMITERS.sub(' ', s).strip()
 
     # If it looks like camelCase or already PascalCase, try splitting based on case changes
-    if not ' ' in s and (re.search(r'[a-z][A-Z]', s) or re.match(r'[A-Z][a-z]', s)):
-         words = re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?=[A-Z][a-z]|\d|\W|$)|\d+', s)
+    if not ' ' in s and (_CASE_CHANGE.search(s) or _CAPITALIZED.match(s)):
+         words = _CASE_WORDS.findall(s)
     # Otherwise, split by spaces (after normalization)
     elif ' ' in s:
         words = s.split(' ')
     # If it's just a single block (e.g., all lowercase, all uppercase, or with digits), use wordninja as fallback
     else:
          # Separate any trailing digits first to help wordninja
-        m = re.match(r'^(.*?)(\d+)$', s)
+        m = _TRAILING_DIGITS.match(s)
         if m:
             base = m.group(1)
             suffix = m.group(2)
@@ -638,7 +992,10 @@ def to_pascal_case(s: str) -> str:
             base = s
             suffix = ""
         # Use wordninja only if base is not empty
-        ninja_words = wordninja.split(base) if base else []
+        ninja_words = []
+        if base:
+            import wordninja # Loads its word model on import, so only pay for it when needed
+            ninja_words = wordninja.split(base)
         words = [word.capitalize() for word in ninja_words]
         return ''.join(words) + suffix
 
@@ -647,9 +1004,9 @@ def to_pascal_case(s: str) -> str:
 
     # Ensure the result starts with a letter and contains only valid Java identifier characters
     # Remove invalid characters
-    pascal_cased = re.sub(r'[^a-zA-Z0-9_]', '', pascal_cased)
+    pascal_cased = _INVALID_IDENTIFIER_CHARS.sub('', pascal_cased)
     # Ensure it starts with a letter or underscore
-    if not re.match(r'^[a-zA-Z_]', pascal_cased):
+    if not _IDENTIFIER_START.match(pascal_cased):
         pascal_cased = "Generated_" + pascal_cased
 
     return pascal_cased if pascal_cased else "DefaultClassName"
@@ -674,20 +1031,6 @@ def sanitize_log(log_text, max_lines=50, max_chars=5000):
     return limited_lines
 
 # --- C++ Hints Extraction ---
-try:
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    profiles_dir = os.path.join(script_dir, 'profiles')
-    sys.path.append(profiles_dir)
-    from profiles.cpp_patterns import detect_cpp_patterns
-    logging.info("Successfully imported 'detect_cpp_patterns'.")
-except ImportError:
-    logging.warning("Could not import 'detect_cpp_patterns'. C++ hints will be disabled.")
-    logging.warning(f"Looked for profiles directory at: {profiles_dir}")
-    def detect_cpp_patterns(code: str) -> list: return []
-except Exception as e:
-     logging.error(f"Error importing or setting up 'detect_cpp_patterns': {e}")
-     def detect_cpp_patterns(code: str) -> list: return []
-
 def extract_cpp_hints(cpp_code: str) -> str:
     """Extracts hints using the imported C++ pattern detector."""
     try:
@@ -705,61 +1048,153 @@ def extract_cpp_hints(cpp_code: str) -> str:
 ###############
 
 # --- Worker ---
+def prefetch_for(llm_slots: int) -> int:
+    """Jobs taken from the queue for a number of LLM slots, keeping the configured MAX_INFLIGHT_JOBS : LLM_WORKERS ratio."""
+    if llm_slots == LLM_WORKERS:
+        return MAX_INFLIGHT_JOBS
+    return max(llm_slots, round(llm_slots * MAX_INFLIGHT_JOBS / max(1, LLM_WORKERS)))
+
+
 def start_worker():
-    """Main worker loop connecting to RabbitMQ and processing tasks."""
+    """Main worker loop connecting to RabbitMQ and feeding jobs into the stage pipeline."""
     logging.info("Starting Translation Worker...")
+    startup.mark("imports done")
+    start_profiling_server("translation_worker")
+    # Leftovers from a previous run are never picked up again
+    cleanup_temp_and_class_files()
+    cleanup_stale_replica_dirs()
+    pruned = checkpoints.prune(CHECKPOINT_MAX_AGE_HOURS * 3600)
+    if pruned:
+        logging.info(f"🧹 Pruned {pruned} stale job checkpoint(s).")
+    if OUTPUT_KEEP_VERSIONS > 0:
+        pruned = output_store.prune(OUTPUT_KEEP_VERSIONS)
+        if pruned:
+            logging.info(f"🧹 Pruned {pruned} old result version(s).")
+    # Don't let the first jobs after a restart pay the model load inside their request timeout
+    wait_for_model_ready(router.tiers, timeout=MODEL_READY_TIMEOUT) # Every tier the router may pick, not just LLM_MODEL
+    startup.mark("model ready")
+    pipeline.start()
     while True:
         connection = None # Ensure connection is reset in loop
         try:
             connection = connect_to_rabbitmq()
             channel = connection.channel()
-            queue_name = "translation_queue"
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.basic_qos(prefetch_count=1) # Process one message at a time
+            queue_name = TRANSLATION_QUEUE
+            declare_retry_topology(channel, RETRY_DELAYS_MS)
+            # Retry and parking publishes must reach the broker before the original is ACKed
+            channel.confirm_delivery()
+            prefetch = {"count": None} # Set on this channel by apply_scaling before consuming
+
+            def apply_scaling():
+                """
+                Follows the LLM slots published by the autoscaler (runs on the connection thread).
+                More prefetch alone adds no concurrency, so the generation stage grows with it.
+                """
+                slots = int(read_scaling().get("llm_slots", LLM_WORKERS))
+                if slots > 0 and slots != pipeline.size(GENERATE):
+                    logging.info(f"📈 Autoscaler set LLM slots {pipeline.size(GENERATE)} → {slots}.")
+                    pipeline.resize(GENERATE, slots)
+                # Take enough jobs that the next prompt is ready whenever an LLM slot frees up
+                wanted = prefetch_for(pipeline.size(GENERATE))
+                if wanted != prefetch["count"]:
+                    # Channel-wide: a per-consumer limit would only apply to consumers created after this call
+                    channel.basic_qos(prefetch_count=wanted, global_qos=True)
+                    prefetch["count"] = wanted
+                connection.call_later(SCALING_POLL_SECONDS, apply_scaling)
+            apply_scaling()
+
+            def park_and_ack(ch, delivery_tag, body, properties, reason):
+                """Parks a poison message. If parking fails it stays unacknowledged and comes back after a reconnect."""
+                try:
+                    park(ch, body, properties, reason)
+                    ch.basic_ack(delivery_tag=delivery_tag)
+                    return True
+                except Exception as e:
+                    logging.error(f"Could not park message ({describe(body)}): {e}. Leaving it unacknowledged.")
+                    return False
+
+            def ack_when_done(ch, delivery_tag, body, properties):
+                """Builds the on_done callback; stage threads must hand the ACK to the connection thread."""
+                def on_done(job):
+                    def acknowledge():
+                        if job.retry_reason:
+                            # Uploads and checkpoint stay: the retry resumes from them
+                            try:
+                                if not publish_retry(ch, body, properties, RETRY_DELAYS_MS, job.retry_reason):
+                                    park(ch, body, properties, f"Retries exhausted: {job.retry_reason}")
+                                ch.basic_ack(delivery_tag=delivery_tag)
+                            except Exception as e:
+                                logging.error(f"Could not schedule retry for job {job.file_id}: {e}. Leaving it unacknowledged.")
+                            return
+                        if job.error is not None:
+                            # Cannot succeed as it is (e.g. upload missing, unexpected stage error); kept with its uploads for replay.
+                            # Until it is parked, the checkpoint keeps the error, so a redelivery is parked too instead of ACKed.
+                            if park_and_ack(ch, delivery_tag, body, properties, f"{type(job.error).__name__}: {job.error}"):
+                                checkpoints.delete(job.file_id) # A replay starts over
+                            return
+                        ch.basic_ack(delivery_tag=delivery_tag)
+                        release_job(job) # Only after a successful ACK, the message cannot come back now
+                    try:
+                        connection.add_callback_threadsafe(acknowledge)
+                        logging.info(f"Sending ACK for job {job.file_id}.")
+                    except Exception as e:
+                        # Connection is gone; RabbitMQ will redeliver the unacknowledged message
+                        logging.warning(f"Could not ACK job {job.file_id}: {e}")
+                return on_done
 
             def callback(ch, method, properties, body):
-                start_time = time.time()
+                startup.mark("first job received")
                 file_id = None
                 original_filename = None
                 try:
                     message = json.loads(body.decode())
                     file_id = message.get("file_id")
                     original_filename = message.get("cpp_filename")
-                    cpp_test_file = message.get("cpp_test_file")
-                    custom_prompt = message.get("custom_prompt")
-                    headers = message.get("headers", {})
 
                     if not file_id or not original_filename:
                          raise ValueError("Missing 'file_id' or 'filename' in message")
 
                     logging.info(f"Received job: file_id={file_id}, filename={original_filename}")
-                    # Optional short delay if needed, but usually processing starts immediately
-                    # time.sleep(1)
-                    translate_code(file_id, original_filename, custom_prompt, headers, cpp_test_file)
-                    processing_time = time.time() - start_time
-                    logging.info(f"Finished job for {original_filename} in {processing_time:.2f} seconds. Sending ACK.")
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-
-                except json.JSONDecodeError as json_err:
-                    logging.error(f"Failed to parse message body: {body.decode()} - Error: {json_err}")
-                    # Acknowledge the message even if parsing fails to prevent it from being redelivered indefinitely
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    with _active_lock:
+                        running = _active_jobs.get(file_id)
+                        if running:
+                            running.on_done = ack_when_done(ch, method.delivery_tag, body, properties)
+                    if running:
+                        logging.info(f"Job {file_id} is still running after a redelivery. It will ACK the new delivery.")
+                        return
+                    job = TranslationJob(
+                        file_id=file_id,
+                        original_filename=original_filename,
+                        custom_prompt=message.get("custom_prompt"),
+                        headers=message.get("headers") or {},
+                        cpp_test_file=message.get("cpp_test_file"),
+                        input_files=message.get("input_files") or {},
+                        cpp_file_path=message.get("cpp_path") or "",
+                        diff_cases=message.get("diff_cases") or [],
+                        on_done=ack_when_done(ch, method.delivery_tag, body, properties),
+                    )
+                    with _active_lock:
+                        _active_jobs[file_id] = job
+                    pipeline.submit(job, prepare_job(job))
+
+                except (json.JSONDecodeError, UnicodeDecodeError) as json_err:
+                    logging.error(f"Failed to parse message body ({describe(body)}) - Error: {json_err}")
+                    # Parked instead of requeued: it would fail the same way on every delivery
+                    park_and_ack(ch, method.delivery_tag, body, properties, f"Unparseable message: {json_err}")
                 except ValueError as val_err:
-                     logging.error(f"Invalid message content: {val_err} - Message: {body.decode()}")
-                     ch.basic_ack(delivery_tag=method.delivery_tag) # Ack invalid message
+                     logging.error(f"Invalid message content: {val_err} - {describe(body)}")
+                     park_and_ack(ch, method.delivery_tag, body, properties, f"Invalid message: {val_err}")
                 except Exception as process_err:
-                    processing_time = time.time() - start_time
-                    logging.exception(f"Error processing job for file_id={file_id}, filename={original_filename} after {processing_time:.2f}s: {process_err}")
-                    # Negative Acknowledge (NACK) and requeue=False (or True if you want RabbitMQ to retry)
-                    # NACKing without requeue sends it to a dead-letter queue if configured, otherwise drops it.
-                    # Choose carefully based on whether the error is likely temporary or permanent.
-                    # For now, let's ACK to avoid potential infinite loops if the error is persistent for this message.
-                    logging.warning("Acknowledging message despite processing error to avoid requeue loop.")
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    logging.exception(f"Error starting job for file_id={file_id}, filename={original_filename}: {process_err}")
+                    with _active_lock:
+                        _active_jobs.pop(file_id, None)
+                    # Parked to avoid a requeue loop if the error is persistent for this message
+                    park_and_ack(ch, method.delivery_tag, body, properties, f"{type(process_err).__name__}: {process_err}")
 
 
             channel.basic_consume(queue=queue_name, on_message_callback=callback)
             logging.info(f"Worker is waiting for tasks on queue '{queue_name}'...")
+            startup.mark("consuming")
             channel.start_consuming()
 
         except pika.exceptions.ConnectionClosedByBroker:
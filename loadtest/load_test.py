@@ -0,0 +1,489 @@
+"""
+Soak and load test of the full path: FastAPI → RabbitMQ → translation_worker → result index.
+
+Replays a weighted mix of evaluation/ programs against POST /translate/ with Poisson arrivals
+(open model: a slow server does not slow the arrivals down) and records
+
+  per request   POST latency and status                             → jobs.csv
+  per job       end-to-end latency (submitted → finished_at in the
+                result index), status and attempts                  → jobs.csv
+  every sample  queue depth, and per container RSS, open file
+                descriptors and files in the upload/temp dirs       → samples.csv
+
+report.json summarises latency percentiles, throughput, errors and the growth of RSS, file
+descriptors and leftover files per hour (least-squares slope over the run, so a slow leak
+shows up as a steady positive slope rather than a noisy last-minus-first difference).
+Pass --compare with the report of an earlier run to print the deltas.
+
+Run it against the stack with the Ollama stub (no GPU needed):
+
+    docker compose -f docker-compose.yml -f loadtest/docker-compose.loadtest.yml up --build -d
+    python loadtest/load_test.py --rate 0.5 --duration 4h --mix amortization=2,rwa=1 --out runs/soak-1
+    python loadtest/load_test.py --rate 0.5 --duration 4h --out runs/soak-2 --compare runs/soak-1/report.json
+
+Needs `requests` and, for the container samples, the docker CLI.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+import requests
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaluation")
+COMPOSE_FILES = ["docker-compose.yml", "loadtest/docker-compose.loadtest.yml"]
+WATCH_DIRS = ["/fastapi/uploads", "/translation_worker/temp"]  # Leftover files here mean a cleanup leak
+REPORT_VERSION = 1
+
+
+# --- Workload ---
+@dataclass
+class Program:
+    name: str
+    files: dict                             # upload filename → local path
+    diff_test: bool = False                 # Request the differential check (inputs were uploaded)
+
+
+def discover_programs(root: str, with_inputs: bool) -> dict:
+    """One program per .cpp of the corpus (tests excluded), with the headers of its directory."""
+    programs = {}
+    for cpp in sorted(glob.glob(os.path.join(root, "*", "*.cpp"))):
+        if os.path.basename(cpp).startswith("test_"):
+            continue
+        directory = os.path.dirname(cpp)
+        files = {os.path.basename(cpp): cpp}
+        for header in glob.glob(os.path.join(directory, "*.h")):
+            files[os.path.basename(header)] = header
+        if with_inputs:
+            for data in glob.glob(os.path.join(directory, "*.csv")):
+                files[os.path.basename(data)] = data
+        name = os.path.basename(directory)
+        if name in programs or len(glob.glob(os.path.join(directory, "*.cpp"))) > 1:
+            name = f"{name}/{os.path.splitext(os.path.basename(cpp))[0]}"
+        programs[name] = Program(name=name, files=files, diff_test=with_inputs)
+    return programs
+
+
+def parse_mix(spec: Optional[str], programs: dict) -> list:
+    """"amortization=3,rwa=1" → [(program, weight)]; without a spec every program weighs 1."""
+    if not spec:
+        return [(program, 1.0) for program in programs.values()]
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        matches = [p for key, p in programs.items() if key == name.strip() or key.startswith(name.strip() + "/")]
+        if not matches:
+            sys.exit(f"Unknown program '{name}'. Available: {', '.join(programs)}")
+        mix.extend((program, float(weight or 1) / len(matches)) for program in matches)
+    return mix
+
+
+def parse_duration(value: str) -> float:
+    """"90", "90s", "15m", "4h" → seconds."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+# --- Measurements ---
+@dataclass
+class JobRecord:
+    index: int
+    program: str
+    submitted_at: float                     # Epoch seconds, comparable with the result index
+    post_seconds: float = 0.0
+    http_status: int = 0
+    file_id: str = ""
+    request_error: str = ""
+    status: str = ""                        # success, failed, error; empty while unfinished
+    attempts: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def end_to_end(self) -> Optional[float]:
+        return self.finished_at - self.submitted_at if self.finished_at else None
+
+    @property
+    def queue_wait(self) -> Optional[float]:
+        return self.started_at - self.submitted_at if self.started_at else None
+
+
+@dataclass
+class ContainerSample:
+    rss_kb: Optional[int] = None
+    fds: Optional[int] = None
+    files: Optional[int] = None
+
+
+@dataclass
+class Sample:
+    at: float
+    queue_ready: Optional[int] = None
+    queue_unacked: Optional[int] = None
+    consumers: Optional[int] = None
+    submitted: int = 0
+    finished: int = 0
+    containers: dict = field(default_factory=dict)  # name → ContainerSample
+
+
+def submit(args, record: JobRecord, program: Program):
+    handles = []
+    try:
+        handles = [("files", (filename, open(path, "rb"))) for filename, path in program.files.items()]
+        start = time.perf_counter()
+        data = {"diff_test": "true"} if program.diff_test else None
+        response = requests.post(f"{args.api}/translate/", files=handles, data=data, timeout=args.request_timeout)
+        record.post_seconds = time.perf_counter() - start
+        record.http_status = response.status_code
+        body = response.json()
+        if response.ok and "error" not in body:
+            record.file_id = body.get("file_id", "")
+        else:
+            record.request_error = str(body.get("error", response.text))[:200]
+    except (requests.RequestException, ValueError) as e:
+        record.request_error = str(e)[:200]
+    finally:
+        for _, (_, handle) in handles:
+            handle.close()
+
+
+class ResultPoller:
+    """Picks up finished jobs from GET /results/?since=, paging through everything that finished since the last poll."""
+
+    def __init__(self, api: str, started_at: float):
+        self.api = api
+        self.cursor = started_at
+        self.etag = None
+
+    def poll(self, pending: dict) -> int:
+        """Fills in the records of finished jobs and removes them from `pending` (file_id → JobRecord)."""
+        found, offset, newest = 0, 0, self.cursor
+        while True:
+            headers = {"If-None-Match": self.etag} if offset == 0 and self.etag else {}
+            response = requests.get(f"{self.api}/results/", params={"since": self.cursor, "limit": 1000, "offset": offset},
+                                    headers=headers, timeout=30)
+            if response.status_code == 304:
+                return 0
+            response.raise_for_status()
+            if offset == 0:
+                self.etag = response.headers.get("ETag")
+            records = response.json().get("results", [])
+            for result in records:
+                newest = max(newest, result.get("finished_at") or 0)
+                record = pending.pop(result.get("file_id"), None)
+                if record:
+                    record.status = result.get("status", "")
+                    record.attempts = result.get("attempts") or 0
+                    record.started_at = result.get("started_at")
+                    record.finished_at = result.get("finished_at")
+                    found += 1
+            if len(records) < 1000:
+                break
+            offset += 1000
+        # Keep some overlap: jobs finishing concurrently can commit with a slightly older finished_at
+        self.cursor = max(self.cursor, newest - 60)
+        return found
+
+
+def sample_queue(args) -> dict:
+    url = f"{args.rabbitmq_api}/queues/{urllib.parse.quote('/', safe='')}/{urllib.parse.quote(args.queue, safe='')}"
+    response = requests.get(url, auth=(args.rabbitmq_user, args.rabbitmq_password), timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    return {"queue_ready": data.get("messages_ready"), "queue_unacked": data.get("messages_unacknowledged"),
+            "consumers": data.get("consumers")}
+
+
+def docker(*command, timeout=30) -> str:
+    return subprocess.run(["docker", *command], capture_output=True, text=True, timeout=timeout, check=True).stdout
+
+
+def list_containers(args) -> dict:
+    """name → id of every running container of the compose project, including autoscaled replicas."""
+    compose = [part for path in args.compose_file for part in ("-f", path)]
+    ids = docker("compose", *compose, "ps", "-q").split()
+    ids += docker("ps", "-q", "--filter", "label=autoscaler.managed").split()
+    containers = {}
+    for container_id in dict.fromkeys(ids):
+        name = docker("inspect", "--format", "{{.Name}}", container_id).strip().lstrip("/")
+        containers[name] = container_id
+    return containers
+
+
+PROBE = (
+    "grep VmRSS /proc/1/status | tr -s ' ' | cut -d' ' -f2; "
+    "ls /proc/1/fd | wc -l; "
+    "n=0; for d in {dirs}; do [ -d \"$d\" ] && n=$((n + $(find \"$d\" -type f | wc -l))); done; echo $n"
+)
+
+
+def sample_container(container_id: str, watch_dirs: list) -> ContainerSample:
+    """RSS and open file descriptors of the container's main process (PID 1), files left in the watched dirs."""
+    try:
+        out = docker("exec", container_id, "sh", "-c", PROBE.format(dirs=" ".join(watch_dirs)), timeout=20).split()
+    except (subprocess.SubprocessError, OSError):
+        return ContainerSample()
+    values = [int(v) if v.isdigit() else None for v in out] + [None] * 3
+    return ContainerSample(rss_kb=values[0], fds=values[1], files=values[2])
+
+
+# --- Report ---
+def percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def distribution(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else None,
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+def slope_per_hour(points: list) -> Optional[float]:
+    """Least-squares slope of (seconds, value) points, scaled to one hour."""
+    points = [(x, y) for x, y in points if y is not None]
+    if len(points) < 3:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance * 3600
+
+
+def build_report(args, jobs: list, samples: list, started_at: float, ended_at: float) -> dict:
+    accepted = [j for j in jobs if j.file_id]
+    finished = [j for j in accepted if j.finished_at]
+    per_program = {}
+    for program in sorted({j.program for j in jobs}):
+        of_program = [j for j in finished if j.program == program]
+        per_program[program] = {
+            "submitted": sum(1 for j in jobs if j.program == program),
+            "end_to_end_seconds": distribution([j.end_to_end for j in of_program]),
+        }
+
+    growth = {}
+    for name in sorted({name for s in samples for name in s.containers}):
+        series = [(s.at - started_at, s.containers.get(name)) for s in samples]
+        series = [(x, c) for x, c in series if c is not None]
+        rss = [c.rss_kb for _, c in series if c.rss_kb is not None]
+        growth[name] = {
+            "rss_kb_first": rss[0] if rss else None,
+            "rss_kb_last": rss[-1] if rss else None,
+            "rss_kb_max": max(rss) if rss else None,
+            "rss_kb_per_hour": slope_per_hour([(x, c.rss_kb) for x, c in series]),
+            "fds_last": series[-1][1].fds if series else None,
+            "fds_per_hour": slope_per_hour([(x, c.fds) for x, c in series]),
+            "files_last": series[-1][1].files if series else None,
+            "files_per_hour": slope_per_hour([(x, c.files) for x, c in series]),
+        }
+
+    depths = [s.queue_ready for s in samples if s.queue_ready is not None]
+    duration = ended_at - started_at
+    return {
+        "version": REPORT_VERSION,
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "rabbitmq_password")},
+        "started_at": started_at,
+        "duration_seconds": duration,
+        "submitted": len(jobs),
+        "accepted": len(accepted),
+        "request_errors": len(jobs) - len(accepted),
+        "http_status": {str(code): sum(1 for j in jobs if j.http_status == code) for code in sorted({j.http_status for j in jobs})},
+        "finished": len(finished),
+        "unfinished": len(accepted) - len(finished),
+        "job_status": {status: sum(1 for j in finished if j.status == status) for status in sorted({j.status for j in finished})},
+        "throughput_per_hour": len(finished) / duration * 3600 if duration else None,
+        "post_seconds": distribution([j.post_seconds for j in jobs if j.http_status]),
+        "queue_wait_seconds": distribution([j.queue_wait for j in finished if j.queue_wait is not None]),
+        "end_to_end_seconds": distribution([j.end_to_end for j in finished]),
+        "attempts": distribution([j.attempts for j in finished]),
+        "queue_depth": {"mean": statistics.fmean(depths) if depths else None, "max": max(depths) if depths else None,
+                        "per_hour": slope_per_hour([(s.at - started_at, s.queue_ready) for s in samples])},
+        "per_program": per_program,
+        "containers": growth,
+    }
+
+
+def flatten(data, prefix="") -> dict:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict) -> str:
+    """Side-by-side of every numeric metric both reports have (configs are shown, not compared)."""
+    current, previous = flatten(report), flatten(baseline)
+    lines = [f"{'metric':<58} {'baseline':>14} {'this run':>14} {'change':>9}"]
+    for key in sorted(current.keys() & previous.keys()):
+        if key.startswith(("config.", "started_at", "version")):
+            continue
+        old, new = previous[key], current[key]
+        change = f"{(new - old) / abs(old):+.1%}" if old else ""
+        lines.append(f"{key:<58} {old:>14.4g} {new:>14.4g} {change:>9}")
+    changed = {k for k in report["config"] if report["config"].get(k) != baseline.get("config", {}).get(k)}
+    if changed:
+        lines.append("Config differs in: " + ", ".join(sorted(changed)))
+    return "\n".join(lines)
+
+
+def write_outputs(args, jobs: list, samples: list, report: dict):
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "jobs.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        columns = list(asdict(jobs[0]).keys()) if jobs else []
+        writer.writerow(columns + ["end_to_end", "queue_wait"])
+        for job in jobs:
+            writer.writerow(list(asdict(job).values()) + [job.end_to_end, job.queue_wait])
+    names = sorted({name for s in samples for name in s.containers})
+    with open(os.path.join(args.out, "samples.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["at", "elapsed", "queue_ready", "queue_unacked", "consumers", "submitted", "finished"]
+                        + [f"{n}.{metric}" for n in names for metric in ("rss_kb", "fds", "files")])
+        for s in samples:
+            row = [s.at, s.at - samples[0].at, s.queue_ready, s.queue_unacked, s.consumers, s.submitted, s.finished]
+            for n in names:
+                c = s.containers.get(n, ContainerSample())
+                row += [c.rss_kb, c.fds, c.files]
+            writer.writerow(row)
+    with open(os.path.join(args.out, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+
+# --- Run ---
+def run(args):
+    programs = discover_programs(args.corpus, args.with_inputs)
+    mix = parse_mix(args.mix, programs)
+    rng = random.Random(args.seed)
+    jobs, samples, pending = [], [], {}
+    in_flight = [0]                         # Submissions still waiting for their POST response
+    lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=args.max_concurrent_requests)
+    poller = ResultPoller(args.api, time.time())
+
+    def submit_and_track(record: JobRecord, program: Program):
+        submit(args, record, program)
+        with lock:
+            in_flight[0] -= 1
+            if record.file_id:
+                pending[record.file_id] = record
+
+    started_at = time.time()
+    end_submit = started_at + args.duration
+    deadline = end_submit + args.drain
+    next_arrival = started_at + rng.expovariate(args.rate)
+    next_sample = started_at
+    print(f"Load test: {args.rate}/s for {args.duration:.0f}s over {len(mix)} program(s), writing to {args.out}", flush=True)
+    try:
+        while True:
+            now = time.time()
+            while now < end_submit and next_arrival <= now:
+                program = rng.choices([p for p, _ in mix], weights=[w for _, w in mix])[0]
+                record = JobRecord(index=len(jobs), program=program.name, submitted_at=time.time())
+                jobs.append(record)
+                with lock:
+                    in_flight[0] += 1
+                pool.submit(submit_and_track, record, program)
+                next_arrival += rng.expovariate(args.rate)
+            if now >= next_sample:
+                with lock:
+                    try:
+                        poller.poll(pending)
+                    except requests.RequestException as e:
+                        print(f"⚠️ Result poll failed: {e}", flush=True)
+                    outstanding = len(pending) + in_flight[0]
+                sample = Sample(at=now, submitted=len(jobs), finished=sum(1 for j in jobs if j.finished_at))
+                try:
+                    for key, value in sample_queue(args).items():
+                        setattr(sample, key, value)
+                except requests.RequestException as e:
+                    print(f"⚠️ Queue sample failed: {e}", flush=True)
+                if not args.no_containers:
+                    try:
+                        for name, container_id in list_containers(args).items():
+                            sample.containers[name] = sample_container(container_id, args.watch_dir)
+                    except (subprocess.SubprocessError, OSError) as e:
+                        print(f"⚠️ Container sample failed: {e}", flush=True)
+                samples.append(sample)
+                print(f"[{now - started_at:7.0f}s] submitted {sample.submitted}, finished {sample.finished}, "
+                      f"outstanding {outstanding}, queue {sample.queue_ready}", flush=True)
+                next_sample = now + args.sample_every
+                if now >= end_submit and (not outstanding or now >= deadline):
+                    break
+            time.sleep(max(0.0, min(next_arrival if now < end_submit else next_sample, next_sample) - time.time()))
+    except KeyboardInterrupt:
+        print("Interrupted, writing the report of the run so far.", flush=True)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    report = build_report(args, jobs, samples, started_at, time.time())
+    write_outputs(args, jobs, samples, report)
+    e2e = report["end_to_end_seconds"]
+    print(f"✅ {report['finished']}/{report['accepted']} jobs finished, end-to-end p50 {e2e['p50']}s p99 {e2e['p99']}s; "
+          f"report in {os.path.join(args.out, 'report.json')}", flush=True)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=0.2, help="mean job arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=parse_duration, default="10m", help="submission period, e.g. 600, 30m, 6h")
+    parser.add_argument("--drain", type=parse_duration, default="15m", help="how long to wait for outstanding jobs afterwards")
+    parser.add_argument("--mix", help='weighted programs, e.g. "amortization=3,rwa=1" (default: all, equal weight)')
+    parser.add_argument("--with-inputs", action="store_true", help="also upload the .csv inputs (enables the differential check)")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--seed", type=int, default=1, help="arrival and mix sequence, keep it fixed to compare runs")
+    parser.add_argument("--sample-every", type=float, default=30, help="seconds between queue/container samples and result polls")
+    parser.add_argument("--max-concurrent-requests", type=int, default=32)
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--rabbitmq-api", default="http://localhost:15672/api")
+    parser.add_argument("--rabbitmq-user", default="guest")
+    parser.add_argument("--rabbitmq-password", default="guest")
+    parser.add_argument("--queue", default="translation_queue")
+    parser.add_argument("--compose-file", action="append", help="compose files of the stack (default: base + load-test override)")
+    parser.add_argument("--watch-dir", action="append", help="container dirs whose file count is tracked (default: uploads and temp)")
+    parser.add_argument("--no-containers", action="store_true", help="skip the docker exec probes (remote stacks)")
+    parser.add_argument("--out", default=os.path.join("loadtest", "runs", time.strftime("%Y%m%d-%H%M%S")))
+    parser.add_argument("--compare", help="report.json of an earlier run")
+    args = parser.parse_args()
+    args.compose_file = args.compose_file or COMPOSE_FILES
+    args.watch_dir = args.watch_dir or WATCH_DIRS
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
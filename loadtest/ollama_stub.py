@@ -0,0 +1,151 @@
+"""
+Ollama stand-in for load tests: answers /api/generate with a compilable Java class after a
+tunable delay, so the FastAPI → RabbitMQ → worker chain can be driven without a GPU.
+
+The class name is taken from the prompt ('named exactly "Name"'), so the worker's javac step
+succeeds. Latency is lognormal around --latency-ms (spread --jitter); --broken-rate returns
+code that does not compile (exercises the fix loop), --error-rate answers 503 (exercises the
+retry queues). /api/ps, /api/tags and unloading behave like Ollama.
+
+    python ollama_stub.py [--port 11434] [--latency-ms 3000] [--jitter 0.3] [--broken-rate 0.2] [--error-rate 0]
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CLASS_NAME = re.compile(r'named (?:exactly )?\\?"(\w+)\\?"')
+
+JAVA = """import java.util.ArrayList;
+import java.util.List;
+
+public class {name} {{
+    private final List<Double> values = new ArrayList<>();
+
+    public void add(double value) {{
+        values.add(value);
+    }}
+
+    public static void main(String[] args) {{
+        {name} program = new {name}();
+        program.add(1.0);
+        System.out.println(program.values.size());
+    }}
+}}
+"""
+
+BROKEN = "public class {name} {{\n    public static void main(String[] args) {{\n        undefinedCall();\n    }}\n}}\n"
+
+
+class Stub:
+    def __init__(self, args):
+        self.args = args
+        self.loaded = set()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def delay(self) -> float:
+        if self.args.latency_ms <= 0:
+            return 0.0
+        sigma = self.args.jitter
+        # Lognormal with the configured mean
+        return random.lognormvariate(math.log(self.args.latency_ms / 1000) - sigma * sigma / 2, sigma)
+
+    def answer(self, prompt: str) -> str:
+        match = CLASS_NAME.search(prompt or "")
+        name = match.group(1) if match else "Stub"
+        code = BROKEN if random.random() < self.args.broken_rate else JAVA
+        return f"Here is the translation:\n\n```java\n{code.format(name=name)}```\n"
+
+
+def make_handler(stub: Stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/":
+                data = b"Ollama is running"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif self.path == "/api/ps":
+                with stub.lock:
+                    self._json(200, {"models": [{"name": m, "model": m} for m in sorted(stub.loaded)]})
+            elif self.path == "/api/tags":
+                with stub.lock:
+                    self._json(200, {"models": [{"name": m} for m in sorted(stub.loaded)]})
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                return self._json(400, {"error": "invalid JSON"})
+            model = body.get("model", "")
+            if self.path == "/api/unload" or (self.path == "/api/generate" and body.get("keep_alive") == 0):
+                with stub.lock:
+                    stub.loaded.discard(model)
+                return self._json(200, {"model": model, "done": True, "done_reason": "unload"})
+            if self.path != "/api/generate":
+                return self._json(404, {"error": "not found"})
+
+            with stub.lock:
+                stub.requests += 1
+                stub.loaded.add(model)
+            if random.random() < stub.args.error_rate:
+                return self._json(503, {"error": "server busy (stub)"})
+            time.sleep(stub.delay())
+            text = stub.answer(body.get("prompt", ""))
+            if body.get("stream", True):
+                chunks = [json.dumps({"model": model, "response": text, "done": False}),
+                          json.dumps({"model": model, "response": "", "done": True})]
+                data = "".join(f"{c}\n" for c in chunks).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._json(200, {"model": model, "response": text, "done": True})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=3000, help="mean generation latency")
+    parser.add_argument("--jitter", type=float, default=0.3, help="lognormal sigma of the latency")
+    parser.add_argument("--broken-rate", type=float, default=0.0, help="share of answers that do not compile")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(Stub(args)))
+    server.daemon_threads = True
+    print(f"Ollama stub on :{args.port} (latency {args.latency_ms:.0f}ms ±{args.jitter}, "
+          f"broken {args.broken_rate:.0%}, errors {args.error_rate:.0%})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()